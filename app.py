@@ -16,13 +16,19 @@ import numpy as np
 from collections import deque
 import queue
 import io
-import PyPDF2
 from pydub import AudioSegment
 from pydub.playback import play
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
 import logging
 
+from match_budget import MatchBudget
+from match_cache import MatchCache
+from pdf_loader import iter_pdf_lines
+from phrase_matcher import IncrementalPhraseMatcher
+from script_index import CandidateRanking, index_for, top_k_lines
+from script_stream import iter_speaker_blocks
+
 # Configure logging to external drive
 def setup_logging():
     """Setup logging to external drive"""
@@ -108,11 +114,15 @@ class ScriptFollower:
         self.recognizer = sr.Recognizer()
         self.microphone = sr.Microphone()
         self.script_data = {}
+        self.search_index = None
+        self.match_cache = MatchCache()
+        self.match_timings = deque(maxlen=100)
         self.is_listening = False
         self.audio_queue = queue.Queue()
         self.results_queue = queue.Queue()
         self.current_phrase = ""
         self.phrase_buffer = deque(maxlen=10)
+        self.phrase_matcher = IncrementalPhraseMatcher(self.phrase_buffer, self.extract_keywords)
         self.confidence_threshold = int(os.getenv('SPEECH_CONFIDENCE_THRESHOLD', 60))
         self.response_delay = float(os.getenv('SPEECH_RESPONSE_DELAY', 0.1))
         
@@ -171,21 +181,15 @@ class ScriptFollower:
     def load_script_from_pdf_file(self, pdf_path):
         """Load script from local PDF file"""
         try:
-            with open(pdf_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                text = ""
-                for page in pdf_reader.pages:
-                    text += page.extract_text() + "\n"
-                
-                script_data = self.parse_script_text(text)
-                
-                # Save parsed script to external drive
-                script_file = f"{self.data_path}/parsed_script.json"
-                with open(script_file, 'w') as f:
-                    json.dump(script_data, f, indent=2)
-                
-                logger.info(f"Script loaded and saved to {script_file}")
-                return script_data
+            script_data = self.parse_script_lines(iter_pdf_lines(pdf_path))
+            
+            # Save parsed script to external drive
+            script_file = f"{self.data_path}/parsed_script.json"
+            with open(script_file, 'w') as f:
+                json.dump(script_data, f, indent=2)
+            
+            logger.info(f"Script loaded and saved to {script_file}")
+            return script_data
                 
         except Exception as e:
             logger.error(f"Error loading PDF file: {e}")
@@ -194,12 +198,7 @@ class ScriptFollower:
     def load_script_from_pdf(self, pdf_file):
         """Load script from uploaded PDF file"""
         try:
-            pdf_reader = PyPDF2.PdfReader(pdf_file)
-            text = ""
-            for page in pdf_reader.pages:
-                text += page.extract_text() + "\n"
-            
-            script_data = self.parse_script_text(text)
+            script_data = self.parse_script_lines(iter_pdf_lines(pdf_file))
             
             # Save parsed script to external drive
             script_file = f"{self.data_path}/parsed_script.json"
@@ -227,37 +226,16 @@ class ScriptFollower:
     
     def parse_script_text(self, text):
         """Parse script text into structured format"""
+        return self.parse_script_lines(text.split('\n'))
+    
+    def parse_script_lines(self, lines):
+        """Parse script lines as they stream in (e.g. page by page from a PDF) into structured format"""
         script_data = {}
-        lines = text.split('\n')
-        
-        current_speaker = None
-        current_line = ""
-        
-        for line in lines:
-            line = line.strip()
-            if not line:
-                continue
-                
-            # Check if line starts with a speaker name (common patterns)
-            if re.match(r'^[A-Z][A-Z\s]+:', line) or re.match(r'^[A-Z][A-Z\s]+$', line):
-                if current_speaker and current_line:
-                    script_data[current_line.strip()] = {
-                        'speaker': current_speaker,
-                        'response': current_line,
-                        'keywords': self.extract_keywords(current_line),
-                        'timestamp': datetime.now().isoformat()
-                    }
-                current_speaker = line.replace(':', '').strip()
-                current_line = ""
-            else:
-                current_line += " " + line
-        
-        # Add the last line
-        if current_speaker and current_line:
-            script_data[current_line.strip()] = {
-                'speaker': current_speaker,
-                'response': current_line,
-                'keywords': self.extract_keywords(current_line),
+        for speaker, block, _ in iter_speaker_blocks(lines):
+            script_data[block.strip()] = {
+                'speaker': speaker,
+                'response': block,
+                'keywords': self.extract_keywords(block),
                 'timestamp': datetime.now().isoformat()
             }
         
@@ -270,32 +248,110 @@ class ScriptFollower:
         keywords = [word for word in words if word not in stop_words and len(word) > 2]
         return keywords
     
-    def find_best_match(self, spoken_text):
-        """Find the best matching script line using fuzzy matching"""
+    def get_search_index(self):
+        """Return the search index for the loaded script, rebuilding it when the script changes"""
+        self.search_index = index_for(self.script_data, self.search_index)
+        return self.search_index
+    
+    def find_best_match(self, spoken_text, phrase_state=None):
+        """Find the best matching script line using fuzzy matching; repeated phrases are answered from the match cache"""
         if not spoken_text or len(spoken_text.strip()) < 3:
             return None, 0
         
-        best_match = None
-        best_score = 0
+        search_index = self.get_search_index()
+        cache_key = (spoken_text.lower(), search_index.content_hash, self.confidence_threshold)
+        found, result = self.match_cache.lookup(cache_key)
+        if not found:
+            result = self.compute_best_match(spoken_text, phrase_state)
+            self.match_cache.store(cache_key, result)
+        return result
+    
+    def find_top_k(self, spoken_text, k=5, min_score=None):
+        """Return the k best candidate lines, ranked, with the score each matching pass gave them"""
+        if not spoken_text or len(spoken_text.strip()) < 3:
+            return []
         
-        # Try exact phrase matching first
-        for script_line, data in self.script_data.items():
-            score = fuzz.ratio(spoken_text.lower(), script_line.lower())
-            if score > best_score:
-                best_score = score
-                best_match = (script_line, data)
+        min_score = self.confidence_threshold if min_score is None else min_score
+        search_index = self.get_search_index()
+        cache_key = (spoken_text.lower(), search_index.content_hash, self.confidence_threshold, k, min_score)
+        found, result = self.match_cache.lookup(cache_key)
+        if not found:
+            result = self.rank_candidates(spoken_text, k, min_score)
+            self.match_cache.store(cache_key, result)
+        return result
+    
+    def find_best_match_timed(self, spoken_text, budget=None, phrase_state=None):
+        """Deadline-aware matching: passes run in cost order until the budget (default response_delay) runs out
+
+        Returns the match as (line, data) or (None, 0) with its score, a
+        partial flag set when a pass was cut by the budget, and per-pass
+        timings in milliseconds.
+        """
+        budget = MatchBudget(self.response_delay if budget is None else budget)
+        result = {'match': (None, 0), 'score': 0, 'pass': None}
+        if spoken_text and len(spoken_text.strip()) >= 3:
+            search_index = self.get_search_index()
+            cache_key = (spoken_text.lower(), search_index.content_hash, self.confidence_threshold, 1, self.confidence_threshold)
+            found, candidates = self.match_cache.lookup(cache_key)
+            if not found:
+                candidates = self.rank_candidates(spoken_text, 1, self.confidence_threshold, phrase_state, budget)
+                if not budget.partial:
+                    self.match_cache.store(cache_key, candidates)  # Cut-short results are not reusable
+            if candidates:
+                best = candidates[0]
+                result = {'match': (best['line'], best['data']), 'score': best['score'], 'pass': best['pass']}
+        result.update(budget.report())
+        self.match_timings.append(result)
+        return result
+    
+    def compute_best_match(self, spoken_text, phrase_state=None):
+        """Find the best matching script line using fuzzy matching (uncached)"""
+        candidates = self.rank_candidates(spoken_text, 1, self.confidence_threshold, phrase_state)
+        if not candidates:
+            return None, 0
+        return candidates[0]['line'], candidates[0]['data']
+    
+    def rank_candidates(self, spoken_text, k, min_score, phrase_state=None, budget=None):
+        """Run the matching passes once in cost order, keeping the k best lines of each pass (uncached)"""
+        ranking = CandidateRanking(('fuzzy', 'keyword'))
+        search_index = self.get_search_index()
+        budget = MatchBudget() if budget is None else budget
+        
+        # Try exact phrase matching first; lines whose length bound is below the
+        # kth best (or the threshold) could never be returned, so they are not scored
+        budget.start_pass('fuzzy', required=True)
+        for line_id, score in search_index.top_fuzzy_lines(spoken_text.lower(), k, min_score, budget):
+            ranking.add('fuzzy', line_id, score)
         
         # Try keyword matching if exact match is poor
-        if best_score < self.confidence_threshold:
-            spoken_keywords = self.extract_keywords(spoken_text)
-            for script_line, data in self.script_data.items():
-                script_keywords = data['keywords']
-                keyword_score = fuzz.token_set_ratio(spoken_keywords, script_keywords)
-                if keyword_score > best_score:
-                    best_score = keyword_score
-                    best_match = (script_line, data)
-        
-        return best_match if best_score >= self.confidence_threshold else (None, 0)
+        if ranking.best_score() < self.confidence_threshold and budget.start_pass('keyword'):
+            # The phrase buffer keeps keywords per utterance, so only new speech is tokenized
+            if phrase_state is not None and phrase_state.phrase == spoken_text:
+                spoken_keywords = phrase_state.keywords
+            else:
+                spoken_keywords = self.extract_keywords(spoken_text)
+            keyword_scores = np.zeros(len(search_index), dtype=np.int64)
+            for line_id, data in enumerate(self.script_data.values()):
+                if line_id % 256 == 0 and budget.expired():
+                    budget.interrupt()  # Lines not reached keep a zero score
+                    break
+                keyword_scores[line_id] = fuzz.token_set_ratio(spoken_keywords, data['keywords'])
+            for line_id in top_k_lines(keyword_scores, k):
+                ranking.add('keyword', int(line_id), int(keyword_scores[line_id]))
+        
+        budget.end_pass()
+        
+        candidates = []
+        for line_id, score, pass_name, pass_scores in ranking.top(k, min_score):
+            script_line, data = search_index.entry(line_id)
+            candidates.append({
+                'line': script_line,
+                'data': data,
+                'score': score,
+                'pass': pass_name,
+                'pass_scores': dict(pass_scores)
+            })
+        return candidates
     
     def log_interaction(self, spoken_text, match_result, confidence):
         """Log interaction to external drive"""
@@ -340,11 +396,15 @@ class ScriptFollower:
             text = self.recognizer.recognize_google(audio, language='en-US')
             
             if text:
-                self.phrase_buffer.append(text)
-                self.current_phrase = " ".join(list(self.phrase_buffer))
+                self.phrase_matcher.append(text, self.get_search_index())
+                self.current_phrase = self.phrase_matcher.phrase
                 
-                # Find best match
-                match, score = self.find_best_match(self.current_phrase)
+                # Find best match within the response-time budget
+                timed = self.find_best_match_timed(self.current_phrase, phrase_state=self.phrase_matcher)
+                match = timed['match'] if timed['match'][0] is not None else None
+                score = timed['score']
+                if timed['partial']:
+                    logger.info(f"Match cut short after {timed['elapsed_ms']:.1f}ms (cut: {', '.join(timed['cut_passes'])})")
                 
                 # Log interaction
                 self.log_interaction(self.current_phrase, match, score)
@@ -360,7 +420,7 @@ class ScriptFollower:
                     })
                     
                     # Clear buffer after successful match
-                    self.phrase_buffer.clear()
+                    self.phrase_matcher.clear()
                     self.current_phrase = ""
                 
         except sr.UnknownValueError:
@@ -12,11 +12,12 @@ import numpy as np
 from collections import deque
 import queue
 import io
-import PyPDF2
 import logging
 
 # Import the evangelism version
-from app_evangelism import EvangelismScriptFollower
+from app_evangelism import EvangelismScriptFollower, load_shared_script
+from pdf_loader import iter_pdf_lines
+from script_stream import iter_speaker_blocks
 
 # Configure logging
 def setup_logging():
@@ -102,12 +103,7 @@ class GitHubScriptManager:
     def load_script_from_pdf(self, pdf_file):
         """Load script from uploaded PDF file"""
         try:
-            pdf_reader = PyPDF2.PdfReader(pdf_file)
-            text = ""
-            for page in pdf_reader.pages:
-                text += page.extract_text() + "\n"
-            
-            script_data = self.parse_script_text(text)
+            script_data = self.parse_script_lines(iter_pdf_lines(pdf_file))
             
             # Save parsed script
             script_file = f"{self.data_path}/parsed_script.json"
@@ -135,37 +131,16 @@ class GitHubScriptManager:
     
     def parse_script_text(self, text):
         """Parse script text into structured format"""
+        return self.parse_script_lines(text.split('\n'))
+    
+    def parse_script_lines(self, lines):
+        """Parse script lines as they stream in (e.g. page by page from a PDF) into structured format"""
         script_data = {}
-        lines = text.split('\n')
-        
-        current_speaker = None
-        current_line = ""
-        
-        for line in lines:
-            line = line.strip()
-            if not line:
-                continue
-                
-            # Check if line starts with a speaker name (common patterns)
-            if re.match(r'^[A-Z][A-Z\s]+:', line) or re.match(r'^[A-Z][A-Z\s]+$', line):
-                if current_speaker and current_line:
-                    script_data[current_line.strip()] = {
-                        'speaker': current_speaker,
-                        'response': current_line,
-                        'keywords': self.extract_keywords(current_line),
-                        'timestamp': datetime.now().isoformat()
-                    }
-                current_speaker = line.replace(':', '').strip()
-                current_line = ""
-            else:
-                current_line += " " + line
-        
-        # Add the last line
-        if current_speaker and current_line:
-            script_data[current_line.strip()] = {
-                'speaker': current_speaker,
-                'response': current_line,
-                'keywords': self.extract_keywords(current_line),
+        for speaker, block, _ in iter_speaker_blocks(lines):
+            script_data[block.strip()] = {
+                'speaker': speaker,
+                'response': block,
+                'keywords': self.extract_keywords(block),
                 'timestamp': datetime.now().isoformat()
             }
         
@@ -348,6 +323,69 @@ def get_suggested_answers(question):
             "I'm not sure"
         ]
 
+def history_summary(response_history, limit=3):
+    """One line of the latest matches, oldest first, for the compact history panel"""
+    return " | ".join([f"Q{resp['question_number']}: {resp['matched_response']}" for resp in reversed(response_history.recent(limit))])
+
+
+class QuickAnswerTable:
+    """Suggested answers for every question of a loaded script, and the match each one leads to
+
+    Built once per compiled script and settings, so pressing a quick answer
+    replays a precomputed transition instead of fuzzy matching the answer.
+    """
+
+    def __init__(self, script_follower):
+        self.graph = script_follower.get_conversation_graph()
+        self.confidence_threshold = script_follower.confidence_threshold
+        self.question_window = script_follower.question_window
+        self.suggestions = [get_suggested_answers(node.question) for node in self.graph.nodes]
+        self.transitions = {}
+        for node_id, answers in enumerate(self.suggestions):
+            for answer in answers:
+                self.transitions[(node_id, answer)] = script_follower.preview_match(answer, node_id)
+
+    def is_current(self, script_follower):
+        """Whether the table still describes the follower's script and settings"""
+        return (self.graph is script_follower.get_conversation_graph()
+                and self.confidence_threshold == script_follower.confidence_threshold
+                and self.question_window == script_follower.question_window)
+
+    def answers_for(self, position):
+        """Suggested answers for the question at position"""
+        if 0 <= position < len(self.suggestions):
+            return self.suggestions[position]
+        return []
+
+
+def quick_answer_table(script_follower, *tables):
+    """The first of the given tables still current for the follower, otherwise a freshly built one"""
+    for table in tables:
+        if table is not None and table.is_current(script_follower):
+            return table
+    return QuickAnswerTable(script_follower)
+
+
+@st.cache_resource
+def shared_quick_answers(_script, flow_hash, confidence_threshold, question_window):
+    """Quick answers for the shared script at these settings, built once per process on a follower of its own"""
+    script_follower = EvangelismScriptFollower(_script)
+    script_follower.confidence_threshold = confidence_threshold
+    script_follower.question_window = question_window
+    return QuickAnswerTable(script_follower)
+
+
+def apply_quick_answer(script_follower, table, answer):
+    """Apply a quick answer from its precomputed transition, falling back to matching it"""
+    script_follower.speculation.cancel()
+    transition = table.transitions.get((script_follower.current_position, answer))
+    if transition is None:
+        return script_follower.process_audio_text(answer)
+    match, position = transition
+    script_follower.phrase_buffer.append(answer)
+    script_follower.current_position = position
+    return script_follower.record_match(answer, dict(match) if match else None)
+
 def main():
     st.set_page_config(
         page_title="Smart Script Follower",
@@ -360,11 +398,20 @@ def main():
     
     # Initialize session state with evangelism follower
     if 'script_follower' not in st.session_state:
-        st.session_state.script_follower = EvangelismScriptFollower()
+        st.session_state.script_follower = EvangelismScriptFollower(load_shared_script())
     
     if 'is_listening' not in st.session_state:
         st.session_state.is_listening = False
     
+    # Keep this session's quick answers while current, else take the table shared by sessions on the same script and settings
+    script_follower = st.session_state.script_follower
+    shared_script = load_shared_script()
+    st.session_state.quick_answers = quick_answer_table(
+        script_follower,
+        st.session_state.get('quick_answers'),
+        shared_quick_answers(shared_script, shared_script.flow_hash,
+                             script_follower.confidence_threshold, script_follower.question_window))
+    
     # Display script status
     if st.session_state.script_follower.conversation_flow:
         st.success(f"✅ **Script Loaded:** {len(st.session_state.script_follower.conversation_flow)} conversation points ready")
@@ -403,8 +450,7 @@ def main():
     # Show suggested answers based on current question (compact)
     current_pos = st.session_state.script_follower.current_position
     if current_pos < len(st.session_state.script_follower.conversation_flow):
-        current_question = st.session_state.script_follower.conversation_flow[current_pos]['question']
-        suggested_answers = get_suggested_answers(current_question)
+        suggested_answers = st.session_state.quick_answers.answers_for(current_pos)
         
         if suggested_answers:
             st.write("**💡 Quick answers:**")
@@ -414,7 +460,7 @@ def main():
                 with cols[i]:
                     if st.button(f"{answer}", key=f"suggest_{i}", use_container_width=True):
                         # Process the response
-                        response = st.session_state.script_follower.process_audio_text(answer)
+                        response = apply_quick_answer(st.session_state.script_follower, st.session_state.quick_answers, answer)
                         if response:
                             st.session_state.latest_response = response
                             # Debug: Show current position after processing
@@ -457,7 +503,7 @@ def main():
     # Conversation History (compact)
     if st.session_state.script_follower.response_history:
         st.markdown("**📚 History:**")
-        history_text = " | ".join([f"Q{resp['question_number']}: {resp['matched_response']}" for resp in list(st.session_state.script_follower.response_history)[-3:]])
+        history_text = history_summary(st.session_state.script_follower.response_history)
         st.write(history_text)
     
     # Settings (compact)
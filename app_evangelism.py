@@ -2,6 +2,7 @@ import streamlit as st
 import speech_recognition as sr
 import threading
 import time
+import copy
 import re
 import os
 import json
@@ -14,11 +15,19 @@ import pandas as pd
 import numpy as np
 from collections import deque
 import queue
-import io
-import PyPDF2
 import logging
 import streamlit.components.v1 as components
 
+from conversation_graph import DEFAULT_QUESTION_WINDOW, QuestionWindowStats, graph_for, guidance_directives
+from match_cache import FlowVersion, MatchCache
+from pdf_loader import extract_pdf_text
+from response_history import ResponseHistory
+from response_rules import QuestionRules, ResponsePlan, rule
+from script_index import ratio_upper_bounds
+from shared_script import SharedScript
+from speculation import SpeculativeWarmer
+from utterance import Utterance
+
 # Configure logging
 def setup_logging():
     """Setup logging for cloud deployment"""
@@ -36,24 +45,149 @@ def setup_logging():
 
 logger = setup_logging()
 
+# Answers the intelligent matcher recognises, per question; first firing rule wins
+BUILDING_ANALOGY_QUESTION = '2b. Building Analogy: "Would you agree that the building I\'m sitting in had a builder, or did it just appear by itself?"'
+RESPONSE_RULES = [
+    # Question 1: "What do you think happens to us after we die?"
+    QuestionRules('death', ["what do you think happens to us after we die"], [
+        rule('Heaven and hell', 'Do you think you will go to heaven and why?',
+             ['They believe in heaven and hell. Ask if they think they will go to heaven and why and SKIP question 2.'],
+             any_of=['heaven', 'hell', 'god', 'jesus', 'christ', 'afterlife']),
+        rule('Reincarnation', 2, ['They mentioned reincarnation. Go straight to the next question.'],
+             any_of=['reincarnation', 'rebirth', 'come back', 'born again']),
+        rule('Not sure', 2, ['They are not sure. Go straight to the next question (Q2).'], confidence=85)
+    ]),
+    # Follow-up question: "Do you think you will go to heaven and why?"
+    QuestionRules('heaven_why', ["do you think you will go to heaven and why"], [
+        rule('Because Jesus died for my sins',
+             'Based on how you\'ve lived your life, do you deserve to go to Heaven or Hell after you die?',
+             ['They said because Jesus died for my sins. Ask: "Based on how you\'ve lived your life, do you deserve to go to Heaven or Hell after you die?"'],
+             any_of=['jesus', 'christ', 'died for my sins', 'paid for my sins', 'because jesus']),
+        rule('Other reason', 3, ['They gave a reason other than Jesus. Proceed to question 3.'])
+    ]),
+    # Follow-up question: "Based on how you've lived your life, do you deserve to go to Heaven or Hell after you die?"
+    QuestionRules('deserve', ["based on how you've lived your life"], [
+        rule('Heaven', 4, ['They said Heaven. Proceed to question 4.'], any_of=['heaven', 'good', 'deserve heaven']),
+        rule('Hell', 17, ['They said Hell. Proceed to question 17.'], any_of=['hell', 'bad', 'deserve hell'])
+    ]),
+    # Question 2: "Do you believe there's a God?"
+    QuestionRules('god', ["do you believe there's a god"], [
+        rule('Yes', 3, ['They believe in God. Proceed to the next question.'],
+             any_of=['yes', 'yeah', 'yep', 'believe', 'god', 'creator', 'jesus', 'christ', 'heaven']),
+        rule('No', BUILDING_ANALOGY_QUESTION, [
+            'If they say no, ask: "Would you agree that the building I\'m sitting in had a builder, or did it just appear by itself?"',
+            'This building is evidence that it needed a builder. In the same way, the universe is evidence that it needed a Creator.',
+            'Wait for their answer, then if they still refuse to believe, go to Q5.'
+        ], any_of=['no', 'nope', 'nah', 'dont', "don't", 'not', 'believe']),
+        rule('Not sure', 3, ['They are not sure about God. Proceed to the next question.'],
+             any_of=['not sure', 'dont know', "don't know", 'unsure', 'maybe'])
+    ]),
+    # Question 2b: Building Analogy
+    QuestionRules('building_analogy', ["building analogy", "building i'm sitting in"], [
+        rule('Yes', 3, [
+            'If they agree, say: "This building is evidence that it needed a builder. In the same way, when we look at the universe we know it had a beginning therefore it had to have a creator for it. The universe is proof of a universe maker. Buildings need builders, creation needs a creator agree?"',
+            'Now proceed to Q3 since they understand the concept of a creator.'
+        ], any_of=['yes', 'yeah', 'yep', 'agree', 'builder', 'had a builder']),
+        rule('No', 5, [
+            'If they still refuse to believe, go to Q5.',
+            'They are not cooperating with the building analogy, so move on to other questions.'
+        ], any_of=['no', 'nope', 'nah', 'dont', "don't", 'not', 'disagree'])
+    ]),
+    # Question 3: "Since we know there is a God, it matters how we live. So, do you think you are a good person?"
+    QuestionRules('good_person', ["are a good person"], [
+        rule('Yes', 4, ['They think they are a good person. Proceed to question 4.'],
+             any_of=['yes', 'yeah', 'yep', 'good', 'decent', 'moral']),
+        rule('No', 7, ['They admit they are not a good person. Thank them for honesty and move to question 7.'],
+             any_of=['no', 'nope', 'nah', 'not', 'bad', 'sinner'])
+    ]),
+    # Question 4: "Have you ever told a lie?"
+    QuestionRules('lie', ["told a lie"], [
+        rule('Yes', 5, ['They admit to lying. What do you call someone who lies? A liar.'],
+             any_of=['yes', 'yeah', 'yep', 'lied', 'lie', 'lies']),
+        rule('No', 5, ['They say they never lied. You could say they are telling a lie right now.'],
+             any_of=['no', 'nope', 'nah', 'never', 'not'])
+    ]),
+    # Question 5: "Have you ever used bad language?"
+    QuestionRules('bad_language', ["used bad language"], [
+        rule('Yes', 6, ['They admit to using bad language. What do you call someone who uses bad language? A blasphemer.'],
+             any_of=['yes', 'yeah', 'yep', 'swear', 'curse', 'bad language']),
+        rule('No', 6, ['They say they never used bad language. Continue to question 6.'],
+             any_of=['no', 'nope', 'nah', 'never', 'not'])
+    ]),
+    # Question 6: "Have you ever been angry or disrespected someone?"
+    QuestionRules('anger', ["angry or disrespected"], [
+        rule('Yes', 7, ['They admit to being angry or disrespectful. What do you call someone who gets angry or disrespects others?'],
+             any_of=['yes', 'yeah', 'yep', 'angry', 'disrespected', 'mad']),
+        rule('No', 7, ['They say they never been angry or disrespectful. Continue to question 7.'],
+             any_of=['no', 'nope', 'nah', 'never', 'not'])
+    ]),
+    # Question 7: "... would you be innocent or guilty?"
+    QuestionRules('judgement', ["innocent or guilty"], [
+        rule('Guilty', 8, ['They admit they are guilty. Proceed to question 8.'], any_of=['guilty', 'guilt']),
+        rule('Innocent', 8, ['If they say innocent, give them the definition: Innocent means you\'ve never done anything wrong your whole life, and guilty means you\'ve done at least one bad thing - so which one would you be?'],
+             any_of=['innocent', 'not guilty'])
+    ]),
+    # Question 8: "So would we deserve a reward or punishment?"
+    QuestionRules('sentence', ["reward or punishment"], [
+        rule('Punishment', 9, ['They understand they deserve punishment. Proceed to question 9.'], any_of=['punishment', 'punish']),
+        rule('Reward', 9, ['If they say Reward (some do) ask, "Would a policeman give me a bunch of flowers for speeding OR a penalty notice?" If they say Reward, ask them what country would give flowers for speeding…'],
+             any_of=['reward', 'good things'])
+    ]),
+    # Question 9: "Does that sound like a place in Heaven or Hell?"
+    QuestionRules('destination', ["heaven or hell"], [
+        rule('Hell', 10, ['They understand it sounds like Hell. Proceed to question 10.'], any_of=['hell', 'bad place']),
+        rule('Heaven', 10, ['If they say Heaven, ask them "Does heaven sound like punishment or would it be hell?" You could also ask them if a Judge would send a criminal to Disneyland or Prison'],
+             any_of=['heaven', 'good place'])
+    ]),
+    # Question 10: "So how do you think you could avoid your Hell punishment?"
+    QuestionRules('avoid_punishment', ["avoid your hell punishment"], [
+        rule('Not sure', 11, ['They are not sure how to avoid Hell punishment. Proceed to question 11.'],
+             any_of=['not sure', 'dont know', "don't know", 'unsure']),
+        rule('Do good things', 11, ['If they answer do good things, "Imagine if you did 5 serious crimes today and then tomorrow you did no more crimes and instead did 10 good things, would the police ignore your crimes?"'],
+             any_of=['good things', 'good deeds', 'be good', 'do good']),
+        rule('Ask for forgiveness/prayer', 11, ['If they answer ask for forgiveness/prayer, "Imagine you break a serious law in society and standing before the judge you ask for forgiveness. Will the judge let you go free?" {wait for an answer}'],
+             any_of=['forgiveness', 'prayer', 'ask for forgiveness', 'pray']),
+        rule('Repent', 11, ['If they say Repent, ask them what they mean by repent. If they say: "Ask for forgiveness", refer to the analogy above.'],
+             any_of=['repent', 'repentance'])
+    ])
+]
+RESPONSE_PLAN = ResponsePlan(RESPONSE_RULES)
+
 class EvangelismScriptFollower:
-    def __init__(self):
+    def __init__(self, script=None):
         self.recognizer = sr.Recognizer()
         self.script_data = {}
         self.conversation_flow = []
         self.current_position = 0
+        self.match_cache = MatchCache()
+        self.flow_version = FlowVersion()
+        self.conversation_graph = None
+        self.question_window = DEFAULT_QUESTION_WINDOW
+        self.question_window_stats = QuestionWindowStats()
         self.is_listening = False
         self.results_queue = queue.Queue()
         self.current_phrase = ""
         self.phrase_buffer = deque(maxlen=10)
-        self.response_history = deque(maxlen=20)
+        self.response_history = ResponseHistory()
         self.confidence_threshold = 25  # Lowered for better matching
         self.response_delay = 0.02
+        # Guards the match cache, which the speculative warmer fills from its own thread
+        self.match_lock = threading.RLock()
+        self.speculation = SpeculativeWarmer(self)
 
-        # Load the evangelism script
-        self.load_evangelism_script()
+        # Load the evangelism script, unless the process already shares one
+        if script is None:
+            self.load_evangelism_script()
+        else:
+            self.use_shared_script(script)
         logger.info("EvangelismScriptFollower initialized")
 
+    def use_shared_script(self, script):
+        """Follow a script loaded once for the whole process instead of loading a private copy"""
+        self.conversation_flow = script.conversation_flow
+        self.conversation_graph = script.conversation_graph
+        self.flow_version = script.flow_version()
+
     def load_evangelism_script(self):
         """Load and parse the evangelism script"""
         try:
@@ -68,14 +202,10 @@ class EvangelismScriptFollower:
             script_file = "needgodscript.pdf"
             if os.path.exists(script_file):
                 with open(script_file, 'rb') as file:
-                    pdf_reader = PyPDF2.PdfReader(file)
-                    text = ""
-                    for page in pdf_reader.pages:
-                        text += page.extract_text() + "\n"
-                    
-                    self.conversation_flow = self.parse_evangelism_script(text)
-                    logger.info(f"Evangelism script loaded with {len(self.conversation_flow)} conversation points")
-                    return
+                    source = file.read()
+                self.conversation_flow = self.parse_evangelism_script(extract_pdf_text(source))
+                logger.info(f"Evangelism script loaded with {len(self.conversation_flow)} conversation points")
+                return
 
             # If local file fails, try GitHub
             script_content = self.load_script_from_github()
@@ -512,60 +642,138 @@ class EvangelismScriptFollower:
                     pdf_content = base64.b64decode(content)
                     
                     # Parse PDF content
-                    pdf_reader = PyPDF2.PdfReader(io.BytesIO(pdf_content))
-                    text = ""
-                    for page in pdf_reader.pages:
-                        text += page.extract_text() + "\n"
-                    return text
+                    return extract_pdf_text(pdf_content)
         except Exception as e:
             logger.error(f"Error loading from GitHub: {e}")
         return None
 
     def find_best_match(self, spoken_text):
-        """Find the best match in the conversation flow"""
+        """Find the best match in the conversation flow; repeated phrases are answered from the match cache"""
         if not self.conversation_flow:
             return None
         
-        spoken_lower = spoken_text.lower()
+        utterance = Utterance.of(spoken_text)
+        with self.match_lock:
+            cache_key = self.match_key(utterance.lower, self.current_position)
+            found, cached = self.match_cache.lookup(cache_key)
+            self.speculation.record_lookup(cache_key, found)
+            if found:
+                # Replay the position move the match made when it was first computed
+                match, self.current_position = cached
+                # Copies all the way down, so callers never change a cached match
+                return copy.deepcopy(match)
+            match = self.compute_best_match(utterance)
+            self.match_cache.store(cache_key, (copy.deepcopy(match), self.current_position))
+            return match
+
+    def match_key(self, spoken_lower, position):
+        """Match cache key of an utterance at a position under the current script and settings"""
+        return (spoken_lower, self.flow_version.of(self.conversation_flow),
+                self.confidence_threshold, position, self.question_window)
+
+    def preview_follower(self, position):
+        """Shallow copy of the follower placed at position, whose matching leaves the follower where it was"""
+        preview = copy.copy(self)
+        preview.current_position = position
+        preview.question_window_stats = QuestionWindowStats()
+        return preview
+
+    def preview_match(self, spoken_text, position):
+        """Match spoken_text as if at position, returning (match, new position) and leaving the follower where it was"""
+        preview = self.preview_follower(position)
+        match = preview.compute_best_match(Utterance.of(spoken_text))
+        return match, preview.current_position
+
+    def warm_question(self, node_id):
+        """Resolve a question's rules and window ahead of time and return its scripted answers"""
+        flow = self.conversation_flow
+        if node_id >= len(flow):
+            return []
+        RESPONSE_PLAN.question_for(flow[node_id]['question'])
+        self.get_conversation_graph().window_ids(node_id, self.question_window)
+        return list(flow[node_id]['responses'])
+
+    def warm_match(self, spoken_text, position, generation):
+        """Make sure the match for spoken_text at position is in the match cache
+
+        Returns (key, whether it was computed), or (None, False) when warming
+        run generation was superseded before the match could be stored.
+        """
+        spoken_lower = Utterance.of(spoken_text).lower
+        with self.match_lock:
+            cache_key = self.match_key(spoken_lower, position)
+            if cache_key in self.match_cache.entries:
+                return cache_key, False
+            preview = self.preview_follower(position)
+        # Match on the snapshot without the lock, so a new utterance never waits for warming
+        match = preview.compute_best_match(Utterance.of(spoken_text))
+        with self.match_lock:
+            if generation != self.speculation.generation:
+                return None, False
+            self.match_cache.store(cache_key, (match, preview.current_position))
+        return cache_key, True
+
+    def get_conversation_graph(self):
+        """Return the compiled conversation graph, recompiling it when the flow is replaced"""
+        self.conversation_graph = graph_for(self.conversation_flow, self.conversation_graph)
+        return self.conversation_graph
+
+    def find_asked_question(self, spoken_lower):
+        """Find the question being asked: the best question near the current position, else the first in the flow"""
+        graph = self.get_conversation_graph()
+        question_lowers = graph.question_lowers
+        threshold = self.confidence_threshold
+        window_ids = graph.window_ids(self.current_position, self.question_window)
+        scored = 0
+        
+        # Questions around the current position and the ones it leads to
+        best_id, best_ratio = None, threshold
+        for node_id in window_ids:
+            # Skip questions whose length alone rules out beating the best so far
+            if ratio_upper_bounds(len(spoken_lower), len(question_lowers[node_id])) <= best_ratio:
+                continue
+            scored += 1
+            ratio = fuzz.ratio(spoken_lower, question_lowers[node_id])
+            if ratio > best_ratio:
+                best_id, best_ratio = node_id, ratio
+        if best_id is not None:
+            self.question_window_stats.record('window', scored)
+            return best_id, best_ratio
+        
+        # Nothing nearby cleared the threshold: first question in the rest of the flow that does
+        in_window = set(window_ids)
+        for node_id, question_lower in enumerate(question_lowers):
+            if node_id in in_window:
+                continue
+            if ratio_upper_bounds(len(spoken_lower), len(question_lower)) <= threshold:
+                continue
+            scored += 1
+            ratio = fuzz.ratio(spoken_lower, question_lower)
+            if ratio > threshold:
+                self.question_window_stats.record('global', scored)
+                return node_id, ratio
+        self.question_window_stats.record(None, scored)
+        return None
+
+    def compute_best_match(self, spoken_text):
+        """Find the best match in the conversation flow (uncached)"""
+        utterance = Utterance.of(spoken_text)
+        spoken_lower = utterance.lower
         
         # FIRST: Use intelligence to analyze the response for specific questions
         if self.current_position < len(self.conversation_flow):
             current_item = self.conversation_flow[self.current_position]
-            intelligent_match = self.analyze_response_intelligence(spoken_text, current_item['question'])
+            intelligent_match = self.analyze_response_intelligence(utterance, current_item['question'])
             if intelligent_match:
                 logger.info(f"Intelligent match found: {intelligent_match}")
                 # Update current position based on intelligent match's next_question
                 next_q_text = intelligent_match['next_question']
                 if next_q_text and next_q_text != "End of script reached":
-                    # Try exact match first
-                    found = False
-                    for i, item in enumerate(self.conversation_flow):
-                        if item['question'] == next_q_text:
-                            logger.info(f"Position updated from {self.current_position} to {i}")
-                            self.current_position = i
-                            found = True
-                            break
-                    
-                    # If exact match fails, try fuzzy match for building analogy
-                    if not found and "building analogy" in next_q_text.lower():
-                        for i, item in enumerate(self.conversation_flow):
-                            if "building analogy" in item['question'].lower():
-                                self.current_position = i
-                                found = True
-                                break
-                    
-                    # If still not found, try to find by question number
-                    if not found:
-                        # Extract question number from next_q_text if possible
-                        import re
-                        q_match = re.search(r'q(\d+(?:\.\d+)?)', next_q_text.lower())
-                        if q_match:
-                            target_q_num = float(q_match.group(1))
-                            for i, item in enumerate(self.conversation_flow):
-                                if item.get('question_number') == target_q_num:
-                                    self.current_position = i
-                                    found = True
-                                    break
+                    # Exact text, then the building analogy, then a "qN" reference
+                    next_id = self.get_conversation_graph().resolve(next_q_text)
+                    if next_id is not None:
+                        logger.info(f"Position updated from {self.current_position} to {next_id}")
+                        self.current_position = next_id
                 return {
                     'type': 'response_match',
                     'question_number': current_item['question_number'],
@@ -607,6 +815,7 @@ class EvangelismScriptFollower:
                      any(word in spoken_lower for word in ['heaven', 'god', 'believe', 'creator', 'jesus', 'christ']))):
                     
                     # Move to next question after getting a response
+                    answered_position = self.current_position
                     self.current_position = min(self.current_position + 1, len(self.conversation_flow) - 1)
                     # Get the next question for guidance
                     next_q = self.get_next_question()
@@ -615,7 +824,8 @@ class EvangelismScriptFollower:
                     enhanced_guidance = current_item['guidance'].copy()
                     
                     # Parse the guidance to find specific next question instructions
-                    next_question = self.parse_next_question_from_guidance(current_item['guidance'], response)
+                    next_question = self.parse_next_question_from_guidance(current_item['guidance'], response,
+                                                                           question_id=answered_position)
                     
                     if next_question:
                         enhanced_guidance.append(f"NEXT QUESTION TO ASK: {next_question}")
@@ -642,20 +852,21 @@ class EvangelismScriptFollower:
         
         # SECOND: Check if this is a question being asked (person asking the question)
         # Only if no response match was found
-        for item in self.conversation_flow:
-            question_lower = item['question'].lower()
-            if fuzz.ratio(spoken_lower, question_lower) > self.confidence_threshold:
-                # This is a question being asked, update current position
-                self.current_position = item['question_number'] - 1
-                return {
-                    'type': 'question_asked',
-                    'question_number': item['question_number'],
-                    'question': item['question'],
-                    'matched_response': 'Question asked',
-                    'guidance': ['Waiting for response...'],
-                    'confidence': fuzz.ratio(spoken_lower, question_lower),
-                    'next_question': None
-                }
+        asked = self.find_asked_question(spoken_lower)
+        if asked is not None:
+            node_id, ratio = asked
+            item = self.conversation_flow[node_id]
+            # This is a question being asked, update current position
+            self.current_position = item['question_number'] - 1
+            return {
+                'type': 'question_asked',
+                'question_number': item['question_number'],
+                'question': item['question'],
+                'matched_response': 'Question asked',
+                'guidance': ['Waiting for response...'],
+                'confidence': ratio,
+                'next_question': None
+            }
         
         return None
 
@@ -665,36 +876,23 @@ class EvangelismScriptFollower:
             return self.conversation_flow[self.current_position + 1]['question']
         return "End of script reached"
 
-    def parse_next_question_from_guidance(self, guidance, response):
+    def parse_next_question_from_guidance(self, guidance, response, question_id=None):
         """Parse the guidance to find specific next question instructions"""
         if not guidance:
             return None
         
-        guidance_text = ' '.join(guidance).lower()
+        if question_id is not None:
+            # Directives were parsed when the flow was compiled
+            node = self.get_conversation_graph().nodes[question_id]
+            guidance_text = node.guidance_text
+            directives = node.directives
+        else:
+            guidance_text = ' '.join(guidance).lower()
+            directives = guidance_directives(guidance_text)
         response_lower = response.lower()
         
-        # Look for specific question references in the guidance
-        import re
-        
-        # Check for "proceed to Q4", "proceed to Q17", etc.
-        q_matches = re.findall(r'proceed to q(\d+)', guidance_text)
-        if q_matches:
-            q_num = int(q_matches[0])
-            if q_num <= len(self.conversation_flow):
-                return self.conversation_flow[q_num - 1]['question']
-        
-        # Check for "skip question 2" - means go to question 3
-        skip_matches = re.findall(r'skip question (\d+)', guidance_text)
-        if skip_matches:
-            skip_num = int(skip_matches[0])
-            next_q_num = skip_num + 1
-            if next_q_num <= len(self.conversation_flow):
-                return self.conversation_flow[next_q_num - 1]['question']
-        
-        # Check for "go to Q5"
-        go_matches = re.findall(r'go to q(\d+)', guidance_text)
-        if go_matches:
-            q_num = int(go_matches[0])
+        # "proceed to Q4", then "skip question 2" (meaning Q3), then "go to Q5"
+        for q_num in directives:
             if q_num <= len(self.conversation_flow):
                 return self.conversation_flow[q_num - 1]['question']
         
@@ -708,277 +906,7 @@ class EvangelismScriptFollower:
 
     def analyze_response_intelligence(self, spoken_text, current_question):
         """Use intelligence to analyze their response and determine the right next question"""
-        spoken_lower = spoken_text.lower()
-        question_lower = current_question.lower()
-        
-        # Question 1: "What do you think happens to us after we die?"
-        if "what do you think happens to us after we die" in question_lower:
-            if any(word in spoken_lower for word in ['heaven', 'hell', 'god', 'jesus', 'christ', 'afterlife']):
-                # They believe in heaven/hell - follow the script guidance
-                return {
-                    'matched_response': 'Heaven and hell',
-                    'next_question': 'Do you think you will go to heaven and why?',  # Ask the follow-up question as per script
-                    'guidance': ['They believe in heaven and hell. Ask if they think they will go to heaven and why and SKIP question 2.'],
-                    'confidence': 90
-                }
-            elif any(word in spoken_lower for word in ['reincarnation', 'rebirth', 'come back', 'born again']):
-                return {
-                    'matched_response': 'Reincarnation',
-                    'next_question': self.get_question_by_number(2),  # Go to Q2
-                    'guidance': ['They mentioned reincarnation. Go straight to the next question.'],
-                    'confidence': 90
-                }
-            else:
-                return {
-                    'matched_response': 'Not sure',
-                    'next_question': self.get_question_by_number(2),  # Go to Q2
-                    'guidance': ['They are not sure. Go straight to the next question (Q2).'],
-                    'confidence': 85
-                }
-        
-        # Follow-up question: "Do you think you will go to heaven and why?"
-        elif "do you think you will go to heaven and why" in question_lower:
-            if any(word in spoken_lower for word in ['jesus', 'christ', 'died for my sins', 'paid for my sins', 'because jesus']):
-                # They say because Jesus died for their sins
-                return {
-                    'matched_response': 'Because Jesus died for my sins',
-                    'next_question': 'Based on how you\'ve lived your life, do you deserve to go to Heaven or Hell after you die?',
-                    'guidance': ['They said because Jesus died for my sins. Ask: "Based on how you\'ve lived your life, do you deserve to go to Heaven or Hell after you die?"'],
-                    'confidence': 90
-                }
-            else:
-                # They give some other reason - proceed to Q3 (good person question)
-                return {
-                    'matched_response': 'Other reason',
-                    'next_question': self.get_question_by_number(3),  # Go to Q3
-                    'guidance': ['They gave a reason other than Jesus. Proceed to question 3.'],
-                    'confidence': 90
-                }
-
-        # Follow-up question: "Based on how you've lived your life, do you deserve to go to Heaven or Hell after you die?"
-        elif "based on how you've lived your life" in question_lower:
-            if any(word in spoken_lower for word in ['heaven', 'good', 'deserve heaven']):
-                # They say Heaven - proceed to Q4
-                return {
-                    'matched_response': 'Heaven',
-                    'next_question': self.get_question_by_number(4),  # Go to Q4
-                    'guidance': ['They said Heaven. Proceed to question 4.'],
-                    'confidence': 90
-                }
-            elif any(word in spoken_lower for word in ['hell', 'bad', 'deserve hell']):
-                # They say Hell - proceed to Q17
-                return {
-                    'matched_response': 'Hell',
-                    'next_question': self.get_question_by_number(17),  # Go to Q17
-                    'guidance': ['They said Hell. Proceed to question 17.'],
-                    'confidence': 90
-                }
-
-        # Question 2: "Do you believe there's a God?"
-        elif "do you believe there's a god" in question_lower:
-            if any(word in spoken_lower for word in ['yes', 'yeah', 'yep', 'believe', 'god', 'creator', 'jesus', 'christ', 'heaven']):
-                return {
-                    'matched_response': 'Yes',
-                    'next_question': self.get_question_by_number(3),  # Go to Q3
-                    'guidance': ['They believe in God. Proceed to the next question.'],
-                    'confidence': 90
-                }
-            elif any(word in spoken_lower for word in ['no', 'nope', 'nah', 'dont', "don't", 'not', 'believe']):
-                return {
-                    'matched_response': 'No',
-                    'next_question': '2b. Building Analogy: "Would you agree that the building I\'m sitting in had a builder, or did it just appear by itself?"',
-                    'guidance': [
-                        'If they say no, ask: "Would you agree that the building I\'m sitting in had a builder, or did it just appear by itself?"',
-                        'This building is evidence that it needed a builder. In the same way, the universe is evidence that it needed a Creator.',
-                        'Wait for their answer, then if they still refuse to believe, go to Q5.'
-                    ],
-                    'confidence': 90
-                }
-            elif any(word in spoken_lower for word in ['not sure', 'dont know', "don't know", 'unsure', 'maybe']):
-                return {
-                    'matched_response': 'Not sure',
-                    'next_question': self.get_question_by_number(3),  # Go to Q3 (as per script guidance)
-                    'guidance': ['They are not sure about God. Proceed to the next question.'],
-                    'confidence': 90
-                }
-        
-        # Question 2b: Building Analogy
-        elif "building analogy" in question_lower or "building i'm sitting in" in question_lower:
-            if any(word in spoken_lower for word in ['yes', 'yeah', 'yep', 'agree', 'builder', 'had a builder']):
-                return {
-                    'matched_response': 'Yes',
-                    'next_question': self.get_question_by_number(3),  # Go to Q3
-                    'guidance': [
-                        'If they agree, say: "This building is evidence that it needed a builder. In the same way, when we look at the universe we know it had a beginning therefore it had to have a creator for it. The universe is proof of a universe maker. Buildings need builders, creation needs a creator agree?"',
-                        'Now proceed to Q3 since they understand the concept of a creator.'
-                    ],
-                    'confidence': 90
-                }
-            elif any(word in spoken_lower for word in ['no', 'nope', 'nah', 'dont', "don't", 'not', 'disagree']):
-                return {
-                    'matched_response': 'No',
-                    'next_question': self.get_question_by_number(5),  # Go to Q5
-                    'guidance': [
-                        'If they still refuse to believe, go to Q5.',
-                        'They are not cooperating with the building analogy, so move on to other questions.'
-                    ],
-                    'confidence': 90
-                }
-        
-        # Question 3: "Since we know there is a God, it matters how we live. So, do you think you are a good person?"
-        elif "are a good person" in question_lower:
-            if any(word in spoken_lower for word in ['yes', 'yeah', 'yep', 'good', 'decent', 'moral']):
-                return {
-                    'matched_response': 'Yes',
-                    'next_question': self.get_question_by_number(4),  # Go to Q4
-                    'guidance': ['They think they are a good person. Proceed to question 4.'],
-                    'confidence': 90
-                }
-            elif any(word in spoken_lower for word in ['no', 'nope', 'nah', 'not', 'bad', 'sinner']):
-                return {
-                    'matched_response': 'No',
-                    'next_question': self.get_question_by_number(7),  # Go to Q7 (as per script)
-                    'guidance': ['They admit they are not a good person. Thank them for honesty and move to question 7.'],
-                    'confidence': 90
-                }
-        
-        # Question 4: "Have you ever told a lie?"
-        elif "told a lie" in question_lower:
-            if any(word in spoken_lower for word in ['yes', 'yeah', 'yep', 'lied', 'lie', 'lies']):
-                return {
-                    'matched_response': 'Yes',
-                    'next_question': self.get_question_by_number(5),  # Go to Q5
-                    'guidance': ['They admit to lying. What do you call someone who lies? A liar.'],
-                    'confidence': 90
-                }
-            elif any(word in spoken_lower for word in ['no', 'nope', 'nah', 'never', 'not']):
-                return {
-                    'matched_response': 'No',
-                    'next_question': self.get_question_by_number(5),  # Still go to Q5
-                    'guidance': ['They say they never lied. You could say they are telling a lie right now.'],
-                    'confidence': 90
-                }
-        
-        # Question 5: "Have you ever used bad language?"
-        elif "used bad language" in question_lower:
-            if any(word in spoken_lower for word in ['yes', 'yeah', 'yep', 'swear', 'curse', 'bad language']):
-                return {
-                    'matched_response': 'Yes',
-                    'next_question': self.get_question_by_number(6),  # Go to Q6
-                    'guidance': ['They admit to using bad language. What do you call someone who uses bad language? A blasphemer.'],
-                    'confidence': 90
-                }
-            elif any(word in spoken_lower for word in ['no', 'nope', 'nah', 'never', 'not']):
-                return {
-                    'matched_response': 'No',
-                    'next_question': self.get_question_by_number(6),  # Still go to Q6
-                    'guidance': ['They say they never used bad language. Continue to question 6.'],
-                    'confidence': 90
-                }
-        
-        # Question 6: "Have you ever been angry or disrespected someone?"
-        elif "angry or disrespected" in question_lower:
-            if any(word in spoken_lower for word in ['yes', 'yeah', 'yep', 'angry', 'disrespected', 'mad']):
-                return {
-                    'matched_response': 'Yes',
-                    'next_question': self.get_question_by_number(7),  # Go to Q7
-                    'guidance': ['They admit to being angry or disrespectful. What do you call someone who gets angry or disrespects others?'],
-                    'confidence': 90
-                }
-            elif any(word in spoken_lower for word in ['no', 'nope', 'nah', 'never', 'not']):
-                return {
-                    'matched_response': 'No',
-                    'next_question': self.get_question_by_number(7),  # Still go to Q7
-                    'guidance': ['They say they never been angry or disrespectful. Continue to question 7.'],
-                    'confidence': 90
-                }
-        
-        # Question 7: "We've all done these things and so if God was to judge you based on these things would you be innocent or guilty?"
-        elif "innocent or guilty" in question_lower:
-            if any(word in spoken_lower for word in ['guilty', 'guilt']):
-                return {
-                    'matched_response': 'Guilty',
-                    'next_question': self.get_question_by_number(8),  # Go to Q8
-                    'guidance': ['They admit they are guilty. Proceed to question 8.'],
-                    'confidence': 90
-                }
-            elif any(word in spoken_lower for word in ['innocent', 'not guilty']):
-                return {
-                    'matched_response': 'Innocent',
-                    'next_question': self.get_question_by_number(8),  # Still go to Q8
-                    'guidance': ['If they say innocent, give them the definition: Innocent means you\'ve never done anything wrong your whole life, and guilty means you\'ve done at least one bad thing - so which one would you be?'],
-                    'confidence': 90
-                }
-        
-        # Question 8: "So would we deserve a reward or punishment?"
-        elif "reward or punishment" in question_lower:
-            if any(word in spoken_lower for word in ['punishment', 'punish']):
-                return {
-                    'matched_response': 'Punishment',
-                    'next_question': self.get_question_by_number(9),  # Go to Q9
-                    'guidance': ['They understand they deserve punishment. Proceed to question 9.'],
-                    'confidence': 90
-                }
-            elif any(word in spoken_lower for word in ['reward', 'good things']):
-                return {
-                    'matched_response': 'Reward',
-                    'next_question': self.get_question_by_number(9),  # Still go to Q9
-                    'guidance': ['If they say Reward (some do) ask, "Would a policeman give me a bunch of flowers for speeding OR a penalty notice?" If they say Reward, ask them what country would give flowers for speeding…'],
-                    'confidence': 90
-                }
-        
-        # Question 9: "Does that sound like a place in Heaven or Hell?"
-        elif "heaven or hell" in question_lower:
-            if any(word in spoken_lower for word in ['hell', 'bad place']):
-                return {
-                    'matched_response': 'Hell',
-                    'next_question': self.get_question_by_number(10),  # Go to Q10
-                    'guidance': ['They understand it sounds like Hell. Proceed to question 10.'],
-                    'confidence': 90
-                }
-            elif any(word in spoken_lower for word in ['heaven', 'good place']):
-                return {
-                    'matched_response': 'Heaven',
-                    'next_question': self.get_question_by_number(10),  # Still go to Q10
-                    'guidance': ['If they say Heaven, ask them "Does heaven sound like punishment or would it be hell?" You could also ask them if a Judge would send a criminal to Disneyland or Prison'],
-                    'confidence': 90
-                }
-        
-        # Question 10: "So how do you think you could avoid your Hell punishment?"
-        elif "avoid your hell punishment" in question_lower:
-            if any(word in spoken_lower for word in ['not sure', 'dont know', "don't know", 'unsure']):
-                return {
-                    'matched_response': 'Not sure',
-                    'next_question': self.get_question_by_number(11),  # Go to Q11
-                    'guidance': ['They are not sure how to avoid Hell punishment. Proceed to question 11.'],
-                    'confidence': 90
-                }
-            elif any(word in spoken_lower for word in ['good things', 'good deeds', 'be good', 'do good']):
-                return {
-                    'matched_response': 'Do good things',
-                    'next_question': self.get_question_by_number(11),  # Go to Q11
-                    'guidance': ['If they answer do good things, "Imagine if you did 5 serious crimes today and then tomorrow you did no more crimes and instead did 10 good things, would the police ignore your crimes?"'],
-                    'confidence': 90
-                }
-            elif any(word in spoken_lower for word in ['forgiveness', 'prayer', 'ask for forgiveness', 'pray']):
-                return {
-                    'matched_response': 'Ask for forgiveness/prayer',
-                    'next_question': self.get_question_by_number(11),  # Go to Q11
-                    'guidance': ['If they answer ask for forgiveness/prayer, "Imagine you break a serious law in society and standing before the judge you ask for forgiveness. Will the judge let you go free?" {wait for an answer}'],
-                    'confidence': 90
-                }
-            elif any(word in spoken_lower for word in ['repent', 'repentance']):
-                return {
-                    'matched_response': 'Repent',
-                    'next_question': self.get_question_by_number(11),  # Go to Q11
-                    'guidance': ['If they say Repent, ask them what they mean by repent. If they say: "Ask for forgiveness", refer to the analogy above.'],
-                    'confidence': 90
-                }
-        
-        # Continue with more questions... (I'll add the rest in the next update)
-        
-        # Default fallback
-        return None
+        return RESPONSE_PLAN.evaluate(current_question, Utterance.of(spoken_text), self.get_question_by_number)
 
     def get_question_by_number(self, question_number):
         """Get a specific question by number"""
@@ -995,6 +923,9 @@ class EvangelismScriptFollower:
         if len(audio_text) < 2:
             return None
         
+        # A new utterance supersedes any warming still in progress
+        self.speculation.cancel()
+        
         # Add to phrase buffer
         self.phrase_buffer.append(audio_text)
         
@@ -1006,16 +937,23 @@ class EvangelismScriptFollower:
             logger.info(f"Current question: {current_item['question']}")
             logger.info(f"Available responses: {current_item['responses']}")
         
-        # Find best match
-        match = self.find_best_match(audio_text)
-        
+        # Find best match, normalizing the text once for every stage
+        match = self.find_best_match(Utterance(audio_text))
+        return self.record_match(audio_text, match)
+
+    def record_match(self, audio_text, match):
+        """Log a match and add it to the response history"""
         if match:
             logger.info(f"Match found: {match}")
             # Log the interaction
             self.log_interaction(audio_text, match)
             
             # Add to response history
-            self.response_history.append(match)
+            graph = self.get_conversation_graph()
+            self.response_history.append(match, graph)
+            
+            # Warm the questions the conversation is likely to reach next
+            self.speculation.schedule(graph.number_ids.get(match.get('question_number')))
             
             return match
         else:
@@ -1160,6 +1098,11 @@ def create_evangelism_speech_component():
     """
     return html_code
 
+@st.cache_resource
+def load_shared_script():
+    """Load the evangelism script once per process; every session's follower shares it"""
+    return SharedScript.of(EvangelismScriptFollower())
+
 def main():
     st.set_page_config(
         page_title="Evangelism Script Follower",
@@ -1172,7 +1115,7 @@ def main():
 
     # Initialize session state
     if 'script_follower' not in st.session_state:
-        st.session_state.script_follower = EvangelismScriptFollower()
+        st.session_state.script_follower = EvangelismScriptFollower(load_shared_script())
 
     if 'is_listening' not in st.session_state:
         st.session_state.is_listening = False
@@ -2,6 +2,7 @@ import streamlit as st
 import speech_recognition as sr
 import threading
 import time
+import copy
 import re
 import os
 import json
@@ -14,11 +15,21 @@ import pandas as pd
 import numpy as np
 from collections import deque
 import queue
-import io
-import PyPDF2
 import logging
 import streamlit.components.v1 as components
 
+from conversation_context import CheckpointChain, context_delta, context_snapshot, new_conversation_context, restore_context
+from conversation_graph import DEFAULT_QUESTION_WINDOW, QuestionWindowStats, graph_for
+from keyword_automaton import KeywordAutomaton
+from match_cache import FlowVersion, MatchCache
+from pdf_loader import extract_pdf_text
+from response_history import HISTORY_RENDER_LIMIT, ResponseHistory
+from response_rules import QuestionRules, ResponsePlan, rule
+from script_index import ratio_upper_bounds
+from shared_script import SharedScript
+from speculation import SpeculativeWarmer
+from utterance import Utterance
+
 # Configure logging
 def setup_logging():
     """Setup logging for enhanced evangelism app"""
@@ -36,31 +47,115 @@ def setup_logging():
 
 logger = setup_logging()
 
+# Answers the intelligent matcher recognises, per question; first firing rule wins
+BUILDING_ANALOGY_QUESTION = '2b. Building Analogy: "Would you agree that the building I\'m sitting in had a builder, or did it just appear by itself?"'
+BUILDING_ANALOGY = 'Building analogy: "Would you agree that the building I\'m sitting in had a builder, or did it just appear by itself?"'
+RESPONSE_RULES = [
+    QuestionRules('death', ["what do you think happens to us after we die"], [
+        rule('Heaven and hell', 3, ['They believe in heaven and hell. Ask if they think they will go to heaven and why.'],
+             any_of=['heaven', 'hell', 'god', 'jesus', 'christ', 'afterlife'],
+             analogies=[], scripture=[], context_update={'beliefs': ['heaven_hell']}),
+        rule('Reincarnation', 2, ['They mentioned reincarnation. Go straight to the next question.'],
+             any_of=['reincarnation', 'rebirth', 'come back', 'born again'],
+             analogies=[], scripture=[], context_update={'beliefs': ['reincarnation']}),
+        rule('Not sure', 2, ['They are not sure. Go straight to the next question (Q2).'], confidence=85,
+             analogies=[], scripture=[], context_update={'beliefs': ['uncertain']})
+    ]),
+    QuestionRules('god', ["do you believe there's a god", "believe there's a god"], [
+        # Explicit "no" first to avoid false positives
+        rule('No', BUILDING_ANALOGY_QUESTION, [
+            'If they say no, ask: "Would you agree that the building I\'m sitting in had a builder, or did it just appear by itself?"',
+            'This building is evidence that it needed a builder. In the same way, the universe is evidence that it needed a Creator.',
+            'Wait for their answer, then if they still refuse to believe, go to Q5.'
+        ], any_of=['no', 'nope', 'nah'], unless=['not sure', 'dont know'],
+             analogies=[BUILDING_ANALOGY], scripture=[], context_update={'beliefs': ['god_denial']}),
+        # Specific "Yes" matching, avoiding false positives like "believe in Hindi"
+        rule('Yes', 3, ['They believe in God. Proceed to the next question.'],
+             any_of=['yes', 'yeah', 'yep', 'i believe in god', 'believe in god', 'i believe in jesus', 'believe in jesus'],
+             all_of=[['believe'], ['god', 'creator', 'jesus', 'christ', 'almighty', 'lord']],
+             analogies=[], scripture=[], context_update={'beliefs': ['god_exists']}),
+        # Other religions/beliefs that are NOT Christianity
+        rule('Other religion/belief', BUILDING_ANALOGY_QUESTION, [
+            'They mentioned a different belief system. Use the building analogy to establish the concept of a creator.',
+            'Ask: "Would you agree that the building I\'m sitting in had a builder, or did it just appear by itself?"'
+        ], any_of=['hindu', 'hindi', 'buddhist', 'buddhism', 'muslim', 'islam', 'jewish', 'judaism', 'atheist', 'agnostic'],
+             analogies=[BUILDING_ANALOGY], scripture=[], context_update={'beliefs': ['other_religion']}),
+        rule('Not sure', 3, ['They are not sure about God. Proceed to the next question.'],
+             analogies=[], scripture=[], context_update={'beliefs': ['god_uncertain']})
+    ]),
+    QuestionRules('good_person', ["are a good person"], [
+        # Explicit "no" first to avoid false positives
+        rule('No', 7, ['They admit they are not a good person. Thank them for honesty and move to question 7.'],
+             any_of=['no', 'nope', 'nah'], unless=['not sure', 'dont know'],
+             analogies=[], scripture=[], context_update={'beliefs': ['self_bad']}),
+        rule('Yes', 4, ['They think they are a good person. Proceed to question 4.'],
+             any_of=['yes', 'yeah', 'yep', 'good', 'decent', 'moral'],
+             analogies=[], scripture=[], context_update={'beliefs': ['self_good']}),
+        rule('Not sure', 4, ['They are not sure. Proceed to question 4.'], confidence=85,
+             analogies=[], scripture=[], context_update={'beliefs': ['self_uncertain']})
+    ])
+]
+RESPONSE_PLAN = ResponsePlan(RESPONSE_RULES)
+# Spoken variants of the yes / no / not sure response patterns
+RESPONSE_VARIATIONS = {
+    'yes': ['yeah', 'yep', 'sure', 'okay', 'correct', 'right', 'absolutely'],
+    'no': ['nope', 'nah', 'wrong', 'incorrect', 'not really'],
+    'not sure': ['unsure', 'maybe', 'i don\'t know', 'dunno', 'uncertain', 'i dont know']
+}
+RESPONSE_VARIANT_KEYWORDS = KeywordAutomaton(dict(RESPONSE_VARIATIONS, **{
+    'said i dont know': ['i dont know'],
+    'said not sure': ['not sure']
+}))
+# Phrases introducing a name, and words revealing a belief, in the order they are checked
+NAME_PATTERNS = ['my name is', 'i\'m', 'i am', 'call me']
+BELIEF_WORDS = {
+    'heaven': ['heaven', 'paradise'],
+    'hell': ['hell', 'punishment'],
+    'god': ['god', 'creator'],
+    'jesus': ['jesus', 'christ']
+}
+CONTEXT_KEYWORDS = KeywordAutomaton(dict(BELIEF_WORDS, **{pattern: [pattern] for pattern in NAME_PATTERNS}))
+
 class EnhancedEvangelismScriptFollower:
-    def __init__(self):
+    def __init__(self, script=None):
         self.recognizer = sr.Recognizer()
         self.script_data = {}
         self.conversation_flow = []
         self.current_position = 0
+        self.match_cache = MatchCache()
+        self.flow_version = FlowVersion()
+        self.conversation_graph = None
+        self.question_window = DEFAULT_QUESTION_WINDOW
+        self.question_window_stats = QuestionWindowStats()
         self.is_listening = False
         self.results_queue = queue.Queue()
         self.current_phrase = ""
         self.phrase_buffer = deque(maxlen=10)
-        self.response_history = deque(maxlen=20)
+        self.response_history = ResponseHistory()
         self.confidence_threshold = 25  # Lowered for better matching
         self.response_delay = 0.02
-        self.conversation_context = {
-            'person_name': None,
-            'beliefs': [],
-            'responses': [],
-            'current_topic': None,
-            'script_progress': 0
-        }
-
-        # Load the evangelism script
-        self.load_evangelism_script()
+        self.conversation_context = new_conversation_context()
+        # Context as last written to the interaction log, so each line records only what changed
+        self.logged_context = {}
+        # State before each processed utterance, for stepping back after a mis-advance
+        self.checkpoints = CheckpointChain()
+        # Guards the match cache, which the speculative warmer fills from its own thread
+        self.match_lock = threading.RLock()
+        self.speculation = SpeculativeWarmer(self)
+
+        # Load the evangelism script, unless the process already shares one
+        if script is None:
+            self.load_evangelism_script()
+        else:
+            self.use_shared_script(script)
         logger.info("EnhancedEvangelismScriptFollower initialized")
 
+    def use_shared_script(self, script):
+        """Follow a script loaded once for the whole process instead of loading a private copy"""
+        self.conversation_flow = script.conversation_flow
+        self.conversation_graph = script.conversation_graph
+        self.flow_version = script.flow_version()
+
     def load_evangelism_script(self):
         """Load and parse the evangelism script with enhanced parsing"""
         try:
@@ -75,14 +170,10 @@ class EnhancedEvangelismScriptFollower:
             script_file = "needgodscript.pdf"
             if os.path.exists(script_file):
                 with open(script_file, 'rb') as file:
-                    pdf_reader = PyPDF2.PdfReader(file)
-                    text = ""
-                    for page in pdf_reader.pages:
-                        text += page.extract_text() + "\n"
-                    
-                    self.conversation_flow = self.parse_evangelism_script_enhanced(text)
-                    logger.info(f"Enhanced evangelism script loaded with {len(self.conversation_flow)} conversation points")
-                    return
+                    source = file.read()
+                self.conversation_flow = self.parse_evangelism_script_enhanced(extract_pdf_text(source))
+                logger.info(f"Enhanced evangelism script loaded with {len(self.conversation_flow)} conversation points")
+                return
 
             # If local file fails, try GitHub
             script_content = self.load_script_from_github()
@@ -188,21 +279,21 @@ class EnhancedEvangelismScriptFollower:
     def extract_enhanced_keywords(self, text):
         """Extract enhanced keywords with context awareness"""
         stop_words = {'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by', 'is', 'are', 'was', 'were', 'be', 'been', 'have', 'has', 'had', 'do', 'does', 'did', 'will', 'would', 'could', 'should', 'may', 'might', 'can', 'must'}
-        words = re.findall(r'\b\w+\b', text.lower())
-        keywords = [word for word in words if word not in stop_words and len(word) > 2]
+        utterance = Utterance.of(text)
+        keywords = [word for word in utterance.tokens if word not in stop_words and len(word) > 2]
         
         # Add contextual keywords
-        if 'heaven' in text.lower():
+        if 'heaven' in utterance:
             keywords.extend(['heaven', 'paradise', 'eternal life'])
-        if 'hell' in text.lower():
+        if 'hell' in utterance:
             keywords.extend(['hell', 'punishment', 'eternal death'])
-        if 'god' in text.lower():
+        if 'god' in utterance:
             keywords.extend(['god', 'creator', 'lord', 'almighty'])
-        if 'jesus' in text.lower():
+        if 'jesus' in utterance:
             keywords.extend(['jesus', 'christ', 'savior', 'messiah'])
-        if 'sin' in text.lower():
+        if 'sin' in utterance:
             keywords.extend(['sin', 'wrong', 'bad', 'evil'])
-        if 'die' in text.lower() or 'death' in text.lower():
+        if 'die' in utterance or 'death' in utterance:
             keywords.extend(['die', 'death', 'afterlife'])
         
         return list(set(keywords))
@@ -368,11 +459,7 @@ class EnhancedEvangelismScriptFollower:
                     pdf_content = base64.b64decode(content)
                     
                     # Parse PDF content
-                    pdf_reader = PyPDF2.PdfReader(io.BytesIO(pdf_content))
-                    text = ""
-                    for page in pdf_reader.pages:
-                        text += page.extract_text() + "\n"
-                    return text
+                    return extract_pdf_text(pdf_content)
         except Exception as e:
             logger.error(f"Error loading from GitHub: {e}")
         return None
@@ -382,15 +469,87 @@ class EnhancedEvangelismScriptFollower:
         if not self.conversation_flow:
             return None
         
-        spoken_lower = spoken_text.lower()
+        utterance = Utterance.of(spoken_text)
+        spoken_lower = utterance.lower
         
         # Update conversation context
-        self.update_conversation_context(spoken_text)
+        self.update_conversation_context(utterance)
+        
+        with self.match_lock:
+            cache_key = self.match_key(spoken_lower, self.current_position)
+            found, cached = self.match_cache.lookup(cache_key)
+            self.speculation.record_lookup(cache_key, found)
+            if found:
+                # Replay the position move the match made when it was first computed
+                match, self.current_position = cached
+                # Copies all the way down, so callers never change a cached match
+                match = copy.deepcopy(match)
+                if match and 'timestamp' in (match.get('context_update') or {}):
+                    match['context_update']['timestamp'] = datetime.now().isoformat()
+                return match
+            match = self.match_conversation_flow(utterance)
+            self.match_cache.store(cache_key, (copy.deepcopy(match), self.current_position))
+            return match
+
+    def match_key(self, spoken_lower, position):
+        """Match cache key of an utterance at a position under the current script and settings"""
+        return (spoken_lower, self.flow_version.of(self.conversation_flow),
+                self.confidence_threshold, position, self.question_window)
+
+    def preview_follower(self, position):
+        """Shallow copy of the follower placed at position, whose matching leaves the follower where it was"""
+        preview = copy.copy(self)
+        preview.current_position = position
+        preview.question_window_stats = QuestionWindowStats()
+        # Progress as update_conversation_context would record it at that position
+        preview.conversation_context = dict(self.conversation_context,
+                                             script_progress=(position + 1) / len(self.conversation_flow) * 100)
+        return preview
+
+    def preview_match(self, spoken_text, position):
+        """Match spoken_text as if at position, returning (match, new position) and leaving the follower where it was"""
+        preview = self.preview_follower(position)
+        match = preview.match_conversation_flow(Utterance.of(spoken_text))
+        return match, preview.current_position
+
+    def warm_question(self, node_id):
+        """Resolve a question's rules and window ahead of time and return its scripted answers"""
+        flow = self.conversation_flow
+        if node_id >= len(flow):
+            return []
+        RESPONSE_PLAN.question_for(flow[node_id]['question'])
+        self.get_conversation_graph().window_ids(node_id, self.question_window)
+        return list(flow[node_id].get('response_patterns', []))
+
+    def warm_match(self, spoken_text, position, generation):
+        """Make sure the match for spoken_text at position is in the match cache
+
+        Returns (key, whether it was computed), or (None, False) when warming
+        run generation was superseded before the match could be stored.
+        """
+        spoken_lower = Utterance.of(spoken_text).lower
+        with self.match_lock:
+            cache_key = self.match_key(spoken_lower, position)
+            if cache_key in self.match_cache.entries:
+                return cache_key, False
+            preview = self.preview_follower(position)
+        # Match on the snapshot without the lock, so a new utterance never waits for warming
+        match = preview.match_conversation_flow(Utterance.of(spoken_text))
+        with self.match_lock:
+            if generation != self.speculation.generation:
+                return None, False
+            self.match_cache.store(cache_key, (match, preview.current_position))
+        return cache_key, True
+
+    def match_conversation_flow(self, spoken_text):
+        """Match an utterance against the current question and the flow (uncached, context already updated)"""
+        utterance = Utterance.of(spoken_text)
+        spoken_lower = utterance.lower
         
         # FIRST: Use enhanced intelligence to analyze the response
         if self.current_position < len(self.conversation_flow):
             current_item = self.conversation_flow[self.current_position]
-            intelligent_match = self.analyze_response_enhanced(spoken_text, current_item)
+            intelligent_match = self.analyze_response_enhanced(utterance, current_item)
             if intelligent_match:
                 logger.info(f"Enhanced intelligent match found: {intelligent_match}")
                 # Update current position based on intelligent match
@@ -402,8 +561,9 @@ class EnhancedEvangelismScriptFollower:
             current_item = self.conversation_flow[self.current_position]
             
             # Check response patterns for current question
+            variant_groups = utterance.groups_in(RESPONSE_VARIANT_KEYWORDS)
             for pattern in current_item.get('response_patterns', []):
-                if self.match_response_pattern(spoken_lower, pattern):
+                if self.match_response_pattern(utterance, pattern, variant_groups):
                     # Move to next question after getting a response
                     self.current_position = min(self.current_position + 1, len(self.conversation_flow) - 1)
                     next_q = self.get_next_question()
@@ -422,208 +582,112 @@ class EnhancedEvangelismScriptFollower:
                     }
         
         # THIRD: Check if this is a question being asked
-        for item in self.conversation_flow:
-            question_lower = item['question'].lower()
-            if fuzz.ratio(spoken_lower, question_lower) > self.confidence_threshold:
-                self.current_position = item['question_number'] - 1
-                return {
-                    'type': 'question_asked',
-                    'question_number': item['question_number'],
-                    'question': item['question'],
-                    'matched_response': 'Question asked',
-                    'guidance': ['Waiting for response...'],
-                    'analogies': [],
-                    'scripture': [],
-                    'confidence': fuzz.ratio(spoken_lower, question_lower),
-                    'next_question': None,
-                    'context_update': None
-                }
+        asked = self.find_asked_question(spoken_lower)
+        if asked is not None:
+            node_id, ratio = asked
+            item = self.conversation_flow[node_id]
+            self.current_position = item['question_number'] - 1
+            return {
+                'type': 'question_asked',
+                'question_number': item['question_number'],
+                'question': item['question'],
+                'matched_response': 'Question asked',
+                'guidance': ['Waiting for response...'],
+                'analogies': [],
+                'scripture': [],
+                'confidence': ratio,
+                'next_question': None,
+                'context_update': None
+            }
         
         return None
 
-    def match_response_pattern(self, spoken_text, pattern):
+    def find_asked_question(self, spoken_lower):
+        """Find the question being asked: the best question near the current position, else the first in the flow"""
+        graph = self.get_conversation_graph()
+        question_lowers = graph.question_lowers
+        threshold = self.confidence_threshold
+        window_ids = graph.window_ids(self.current_position, self.question_window)
+        scored = 0
+        
+        # Questions around the current position and the ones it leads to
+        best_id, best_ratio = None, threshold
+        for node_id in window_ids:
+            # Skip questions whose length alone rules out beating the best so far
+            if ratio_upper_bounds(len(spoken_lower), len(question_lowers[node_id])) <= best_ratio:
+                continue
+            scored += 1
+            ratio = fuzz.ratio(spoken_lower, question_lowers[node_id])
+            if ratio > best_ratio:
+                best_id, best_ratio = node_id, ratio
+        if best_id is not None:
+            self.question_window_stats.record('window', scored)
+            return best_id, best_ratio
+        
+        # Nothing nearby cleared the threshold: first question in the rest of the flow that does
+        in_window = set(window_ids)
+        for node_id, question_lower in enumerate(question_lowers):
+            if node_id in in_window:
+                continue
+            if ratio_upper_bounds(len(spoken_lower), len(question_lower)) <= threshold:
+                continue
+            scored += 1
+            ratio = fuzz.ratio(spoken_lower, question_lower)
+            if ratio > threshold:
+                self.question_window_stats.record('global', scored)
+                return node_id, ratio
+        self.question_window_stats.record(None, scored)
+        return None
+
+    def match_response_pattern(self, spoken_text, pattern, variant_groups=None):
         """Enhanced pattern matching with fuzzy logic"""
         if pattern in spoken_text:
             return True
         
         # Check for variations
-        variations = {
-            'yes': ['yeah', 'yep', 'sure', 'okay', 'correct', 'right', 'absolutely'],
-            'no': ['nope', 'nah', 'wrong', 'incorrect', 'not really'],
-            'not sure': ['unsure', 'maybe', 'i don\'t know', 'dunno', 'uncertain', 'i dont know']
-        }
-        
-        for key, variants in variations.items():
-            if key in pattern and any(variant in spoken_text for variant in variants):
+        if variant_groups is None:
+            variant_groups = Utterance.of(spoken_text).groups_in(RESPONSE_VARIANT_KEYWORDS)
+        for key in RESPONSE_VARIATIONS:
+            if key in pattern and key in variant_groups:
                 return True
         
         # Special case for "i dont know" matching "not sure"
-        if 'not sure' in pattern and 'i dont know' in spoken_text:
+        if 'not sure' in pattern and 'said i dont know' in variant_groups:
             return True
-        if 'i dont know' in pattern and 'not sure' in spoken_text:
+        if 'i dont know' in pattern and 'said not sure' in variant_groups:
             return True
         
         return False
 
     def analyze_response_enhanced(self, spoken_text, current_item):
         """Enhanced response analysis with context awareness"""
-        spoken_lower = spoken_text.lower()
-        question_lower = current_item['question'].lower()
-        
-        # Enhanced analysis for each question type
-        if "what do you think happens to us after we die" in question_lower:
-            result = self.analyze_death_question(spoken_lower, current_item)
-            if result:
-                result['type'] = 'intelligent_analysis'
-            return result
-        elif "do you believe there's a god" in question_lower or "believe there's a god" in question_lower:
-            result = self.analyze_god_question(spoken_lower, current_item)
-            if result:
-                result['type'] = 'intelligent_analysis'
-            return result
-        elif "are a good person" in question_lower:
-            result = self.analyze_good_person_question(spoken_lower, current_item)
-            if result:
-                result['type'] = 'intelligent_analysis'
-            return result
-        # Add more question-specific analysis...
-        
-        return None
+        result = RESPONSE_PLAN.evaluate(current_item['question'], Utterance.of(spoken_text), self.get_question_by_number)
+        if result:
+            result['type'] = 'intelligent_analysis'
+        return result
 
     def analyze_death_question(self, spoken_lower, current_item):
         """Analyze responses to the death question"""
-        if any(word in spoken_lower for word in ['heaven', 'hell', 'god', 'jesus', 'christ', 'afterlife']):
-            return {
-                'matched_response': 'Heaven and hell',
-                'next_question': self.get_question_by_number(3),
-                'guidance': ['They believe in heaven and hell. Ask if they think they will go to heaven and why.'],
-                'analogies': [],
-                'scripture': [],
-                'confidence': 90,
-                'context_update': {'beliefs': ['heaven_hell']}
-            }
-        elif any(word in spoken_lower for word in ['reincarnation', 'rebirth', 'come back', 'born again']):
-            return {
-                'matched_response': 'Reincarnation',
-                'next_question': self.get_question_by_number(2),
-                'guidance': ['They mentioned reincarnation. Go straight to the next question.'],
-                'analogies': [],
-                'scripture': [],
-                'confidence': 90,
-                'context_update': {'beliefs': ['reincarnation']}
-            }
-        else:
-            return {
-                'matched_response': 'Not sure',
-                'next_question': self.get_question_by_number(2),
-                'guidance': ['They are not sure. Go straight to the next question (Q2).'],
-                'analogies': [],
-                'scripture': [],
-                'confidence': 85,
-                'context_update': {'beliefs': ['uncertain']}
-            }
+        return RESPONSE_PLAN.evaluate_rules('death', spoken_lower, self.get_question_by_number)
 
     def analyze_god_question(self, spoken_lower, current_item):
         """Analyze responses to the God question"""
-        # Check for explicit "no" first to avoid false positives
-        if any(word in spoken_lower for word in ['no', 'nope', 'nah']) and not any(word in spoken_lower for word in ['not sure', 'dont know']):
-            return {
-                'matched_response': 'No',
-                'next_question': '2b. Building Analogy: "Would you agree that the building I\'m sitting in had a builder, or did it just appear by itself?"',
-                'guidance': [
-                    'If they say no, ask: "Would you agree that the building I\'m sitting in had a builder, or did it just appear by itself?"',
-                    'This building is evidence that it needed a builder. In the same way, the universe is evidence that it needed a Creator.',
-                    'Wait for their answer, then if they still refuse to believe, go to Q5.'
-                ],
-                'analogies': [
-                    'Building analogy: "Would you agree that the building I\'m sitting in had a builder, or did it just appear by itself?"'
-                ],
-                'scripture': [],
-                'confidence': 90,
-                'context_update': {'beliefs': ['god_denial']}
-            }
-        # More specific matching for "Yes" - avoid false positives like "believe in Hindi"
-        elif (any(word in spoken_lower for word in ['yes', 'yeah', 'yep']) or 
-              ('believe' in spoken_lower and any(word in spoken_lower for word in ['god', 'creator', 'jesus', 'christ', 'almighty', 'lord'])) or
-              any(word in spoken_lower for word in ['i believe in god', 'believe in god', 'i believe in jesus', 'believe in jesus'])):
-            return {
-                'matched_response': 'Yes',
-                'next_question': self.get_question_by_number(3),
-                'guidance': ['They believe in God. Proceed to the next question.'],
-                'analogies': [],
-                'scripture': [],
-                'confidence': 90,
-                'context_update': {'beliefs': ['god_exists']}
-            }
-        # Check for other religions/beliefs that are NOT Christianity
-        elif any(word in spoken_lower for word in ['hindu', 'hindi', 'buddhist', 'buddhism', 'muslim', 'islam', 'jewish', 'judaism', 'atheist', 'agnostic']):
-            return {
-                'matched_response': 'Other religion/belief',
-                'next_question': '2b. Building Analogy: "Would you agree that the building I\'m sitting in had a builder, or did it just appear by itself?"',
-                'guidance': [
-                    'They mentioned a different belief system. Use the building analogy to establish the concept of a creator.',
-                    'Ask: "Would you agree that the building I\'m sitting in had a builder, or did it just appear by itself?"'
-                ],
-                'analogies': [
-                    'Building analogy: "Would you agree that the building I\'m sitting in had a builder, or did it just appear by itself?"'
-                ],
-                'scripture': [],
-                'confidence': 90,
-                'context_update': {'beliefs': ['other_religion']}
-            }
-        else:
-            return {
-                'matched_response': 'Not sure',
-                'next_question': self.get_question_by_number(3),
-                'guidance': ['They are not sure about God. Proceed to the next question.'],
-                'analogies': [],
-                'scripture': [],
-                'confidence': 90,
-                'context_update': {'beliefs': ['god_uncertain']}
-            }
+        return RESPONSE_PLAN.evaluate_rules('god', spoken_lower, self.get_question_by_number)
 
     def analyze_good_person_question(self, spoken_lower, current_item):
         """Analyze responses to the good person question"""
-        # Check for explicit "no" first to avoid false positives
-        if any(word in spoken_lower for word in ['no', 'nope', 'nah']) and not any(word in spoken_lower for word in ['not sure', 'dont know']):
-            return {
-                'matched_response': 'No',
-                'next_question': self.get_question_by_number(7),
-                'guidance': ['They admit they are not a good person. Thank them for honesty and move to question 7.'],
-                'analogies': [],
-                'scripture': [],
-                'confidence': 90,
-                'context_update': {'beliefs': ['self_bad']}
-            }
-        elif any(word in spoken_lower for word in ['yes', 'yeah', 'yep', 'good', 'decent', 'moral']):
-            return {
-                'matched_response': 'Yes',
-                'next_question': self.get_question_by_number(4),
-                'guidance': ['They think they are a good person. Proceed to question 4.'],
-                'analogies': [],
-                'scripture': [],
-                'confidence': 90,
-                'context_update': {'beliefs': ['self_good']}
-            }
-        else:
-            return {
-                'matched_response': 'Not sure',
-                'next_question': self.get_question_by_number(4),
-                'guidance': ['They are not sure. Proceed to question 4.'],
-                'analogies': [],
-                'scripture': [],
-                'confidence': 85,
-                'context_update': {'beliefs': ['self_uncertain']}
-            }
+        return RESPONSE_PLAN.evaluate_rules('good_person', spoken_lower, self.get_question_by_number)
 
     def update_conversation_context(self, spoken_text):
         """Update conversation context with new information"""
-        spoken_lower = spoken_text.lower()
+        utterance = Utterance.of(spoken_text)
+        spoken_lower = utterance.lower
+        found = utterance.groups_in(CONTEXT_KEYWORDS)
+        self.conversation_context['turns'] += 1
         
         # Extract person's name if mentioned
-        name_patterns = ['my name is', 'i\'m', 'i am', 'call me']
-        for pattern in name_patterns:
-            if pattern in spoken_lower:
+        for pattern in NAME_PATTERNS:
+            if pattern in found:
                 # Extract name after the pattern
                 name_part = spoken_lower.split(pattern)[-1].strip().split()[0]
                 if name_part and len(name_part) > 1:
@@ -631,14 +695,9 @@ class EnhancedEvangelismScriptFollower:
                     break
         
         # Update beliefs based on responses
-        if any(word in spoken_lower for word in ['heaven', 'paradise']):
-            self.conversation_context['beliefs'].append('heaven')
-        if any(word in spoken_lower for word in ['hell', 'punishment']):
-            self.conversation_context['beliefs'].append('hell')
-        if any(word in spoken_lower for word in ['god', 'creator']):
-            self.conversation_context['beliefs'].append('god')
-        if any(word in spoken_lower for word in ['jesus', 'christ']):
-            self.conversation_context['beliefs'].append('jesus')
+        for belief in BELIEF_WORDS:
+            if belief in found:
+                self.conversation_context['beliefs'].record(belief, self.conversation_context['turns'])
         
         # Update script progress
         self.conversation_context['script_progress'] = (self.current_position + 1) / len(self.conversation_flow) * 100
@@ -647,19 +706,15 @@ class EnhancedEvangelismScriptFollower:
         """Update current position based on match result"""
         next_q_text = match.get('next_question')
         if next_q_text and next_q_text != "End of script reached":
-            # Try to find the next question in the flow
-            for i, item in enumerate(self.conversation_flow):
-                if item['question'] == next_q_text:
-                    self.current_position = i
-                    return
-                # Also check for question number references
-                if 'q' in next_q_text.lower():
-                    q_match = re.search(r'q(\d+(?:\.\d+)?)', next_q_text.lower())
-                    if q_match:
-                        target_q_num = float(q_match.group(1))
-                        if item.get('question_number') == target_q_num:
-                            self.current_position = i
-                            return
+            # First question with this text or the "qN" number it references
+            next_id = self.get_conversation_graph().first_match(next_q_text)
+            if next_id is not None:
+                self.current_position = next_id
+
+    def get_conversation_graph(self):
+        """Return the compiled conversation graph, recompiling it when the flow is replaced"""
+        self.conversation_graph = graph_for(self.conversation_flow, self.conversation_graph)
+        return self.conversation_graph
 
     def get_context_update(self, current_item, matched_response):
         """Get context update information"""
@@ -691,8 +746,14 @@ class EnhancedEvangelismScriptFollower:
         if len(audio_text) < 2:
             return None
         
+        # A new utterance supersedes any warming still in progress
+        self.speculation.cancel()
+        self.checkpoints.push(self.current_position, self.conversation_context, self.response_history.head)
+        
         # Add to phrase buffer
         self.phrase_buffer.append(audio_text)
+        # Lowercased, tokenized and keyword-scanned once for every matching stage
+        utterance = Utterance(audio_text)
         
         # Debug logging
         logger.info(f"Processing audio text: '{audio_text}'")
@@ -703,7 +764,7 @@ class EnhancedEvangelismScriptFollower:
             logger.info(f"Available response patterns: {current_item.get('response_patterns', [])}")
         
         # Find best match with enhanced algorithm
-        match = self.find_best_match_enhanced(audio_text)
+        match = self.find_best_match_enhanced(utterance)
         
         if match:
             logger.info(f"Enhanced match found: {match}")
@@ -711,7 +772,11 @@ class EnhancedEvangelismScriptFollower:
             self.log_interaction(audio_text, match)
             
             # Add to response history
-            self.response_history.append(match)
+            graph = self.get_conversation_graph()
+            self.response_history.append(match, graph)
+            
+            # Warm the questions the conversation is likely to reach next
+            self.speculation.schedule(graph.number_ids.get(match.get('question_number')))
             
             return match
         else:
@@ -719,6 +784,26 @@ class EnhancedEvangelismScriptFollower:
         
         return None
 
+    def rewind(self, turns=1):
+        """Step the conversation back by up to turns utterances; returns how many were undone"""
+        undone = min(turns, len(self.checkpoints))
+        checkpoint = self.checkpoints.pop(turns)
+        if checkpoint is None:
+            return 0
+        logger.info(f"Rewinding {undone} turn(s): position {self.current_position} -> {checkpoint.position}")
+        self.current_position = checkpoint.position
+        self.conversation_context = restore_context(checkpoint, self.conversation_context)
+        self.response_history.truncate(checkpoint.history_head)
+        self.speculation.schedule()
+        return undone
+
+    def context_changes(self):
+        """Context entries changed since the last logged interaction"""
+        snapshot = context_snapshot(self.conversation_context)
+        changes = context_delta(self.logged_context, snapshot)
+        self.logged_context = snapshot
+        return changes
+
     def log_interaction(self, spoken, match):
         """Log the interaction for analysis"""
         log_entry = {
@@ -727,7 +812,7 @@ class EnhancedEvangelismScriptFollower:
             'match_type': match.get('type', 'unknown'),
             'question_number': match.get('question_number', 0),
             'confidence': match.get('confidence', 0),
-            'context': self.conversation_context.copy()
+            'context': self.context_changes()
         }
         
         # Log to file
@@ -868,6 +953,11 @@ def create_enhanced_evangelism_speech_component():
     """
     return html_code
 
+@st.cache_resource
+def load_shared_script():
+    """Load the enhanced evangelism script once per process; every session's follower shares it"""
+    return SharedScript.of(EnhancedEvangelismScriptFollower())
+
 def main():
     st.set_page_config(
         page_title="Enhanced Evangelism Script Follower",
@@ -880,7 +970,7 @@ def main():
 
     # Initialize session state
     if 'script_follower' not in st.session_state:
-        st.session_state.script_follower = EnhancedEvangelismScriptFollower()
+        st.session_state.script_follower = EnhancedEvangelismScriptFollower(load_shared_script())
 
     if 'is_listening' not in st.session_state:
         st.session_state.is_listening = False
@@ -959,8 +1049,10 @@ def main():
         # Display response history
         if st.session_state.script_follower.response_history:
             st.subheader("📚 Enhanced Conversation History")
-            for i, response in enumerate(reversed(list(st.session_state.script_follower.response_history))):
-                with st.expander(f"Response {len(st.session_state.script_follower.response_history) - i}: {response['matched_response'][:50]}..."):
+            history = st.session_state.script_follower.response_history
+            # Only the latest entries are resolved and rendered
+            for i, response in enumerate(history.recent(HISTORY_RENDER_LIMIT)):
+                with st.expander(f"Response {len(history) - i}: {response['matched_response'][:50]}..."):
                     st.write(f"**Confidence:** {response['confidence']}%")
                     st.write(f"**Question #{response['question_number']}:** {response['question']}")
                     st.write(f"**Guidance:** {response['guidance'][0] if response['guidance'] else 'No specific guidance'}")
@@ -983,22 +1075,34 @@ def main():
             context = st.session_state.script_follower.conversation_context
             st.write(f"**Person's name:** {context['person_name'] or 'Not provided'}")
             st.write(f"**Identified beliefs:** {', '.join(context['beliefs']) if context['beliefs'] else 'None yet'}")
+            cache_stats = st.session_state.script_follower.match_cache.stats()
+            st.write(f"**Match cache:** {cache_stats['hits']} hits, {cache_stats['misses']} misses, {cache_stats['evictions']} evictions ({cache_stats['hit_rate']:.0f}% hit rate)")
+            window_stats = st.session_state.script_follower.question_window_stats.stats()
+            st.write(f"**Question lookup:** {window_stats['window_hit_rate']:.0f}% found within ±{st.session_state.script_follower.question_window} questions, {window_stats['global_hits']} needed the whole flow, {window_stats['questions_per_lookup']:.1f} questions scored per lookup")
+            speculation_stats = st.session_state.script_follower.speculation.stats()
+            st.write(f"**Speculation:** {speculation_stats['nodes_warmed']} questions warmed, {speculation_stats['matches_precomputed']} answers precomputed, {speculation_stats['hit_rate']:.0f}% of utterances answered from warmed entries")
 
         with col2:
             st.subheader("Enhanced Performance Settings")
             confidence = st.slider("Confidence Threshold", 20, 95, st.session_state.script_follower.confidence_threshold)
             st.session_state.script_follower.confidence_threshold = confidence
+            window = st.slider("Question Window", 0, 10, st.session_state.script_follower.question_window)
+            st.session_state.script_follower.question_window = window
 
             # Reset position button
             if st.button("🔄 Reset to Beginning"):
                 st.session_state.script_follower.current_position = 0
-                st.session_state.script_follower.conversation_context = {
-                    'person_name': None,
-                    'beliefs': [],
-                    'responses': [],
-                    'current_topic': None,
-                    'script_progress': 0
-                }
+                st.session_state.script_follower.conversation_context = new_conversation_context()
+                st.session_state.script_follower.checkpoints.clear()
+                st.rerun()
+
+            # Step back after a mis-advance
+            available = len(st.session_state.script_follower.checkpoints)
+            turns = st.number_input("Turns to step back", min_value=1, max_value=max(available, 1), value=1)
+            if st.button(f"⏪ Step Back ({available} available)", disabled=not available):
+                st.session_state.script_follower.rewind(int(turns))
+                if 'latest_response' in st.session_state:
+                    del st.session_state.latest_response
                 st.rerun()
 
             # Clear response history button
@@ -1010,7 +1114,7 @@ def main():
 
             # Show conversation context
             if st.button("📊 Show Full Context"):
-                st.json(st.session_state.script_follower.conversation_context)
+                st.json(context_snapshot(st.session_state.script_follower.conversation_context))
 
 if __name__ == "__main__":
     main()
@@ -9,16 +9,23 @@ import requests
 import base64
 from datetime import datetime
 from pathlib import Path
-from fuzzywuzzy import fuzz, process
 import pandas as pd
 import numpy as np
 from collections import deque
 import queue
 import io
-import PyPDF2
 import logging
 import streamlit.components.v1 as components
 
+from match_budget import MatchBudget, summarize_timings
+from match_cache import MatchCache
+from pdf_loader import iter_pdf_lines
+from phrase_matcher import IncrementalPhraseMatcher
+from script_cache import ScriptCache
+from script_index import CandidateRanking, ScriptIndex, ScriptIndexBuilder, index_for, top_k_lines
+from script_stream import iter_speaker_blocks
+from shared_script import SharedScript
+
 # Configure logging
 def setup_logging():
     """Setup logging for cloud deployment"""
@@ -37,15 +44,22 @@ def setup_logging():
 
 logger = setup_logging()
 
+# Bump when parse_script_text changes so compiled scripts cached on disk are rebuilt
+SCRIPT_PARSER_VERSION = 1
+
 class SmartScriptFollower:
-    def __init__(self):
+    def __init__(self, script=None):
         # Initialize with speech recognition
         self.recognizer = sr.Recognizer()
         self.script_data = {}
+        self.search_index = None
+        self.match_cache = MatchCache()
+        self.match_timings = deque(maxlen=100)
         self.is_listening = False
         self.results_queue = queue.Queue()
         self.current_phrase = ""
         self.phrase_buffer = deque(maxlen=3)  # Shorter buffer for faster response
+        self.phrase_matcher = IncrementalPhraseMatcher(self.phrase_buffer)
         self.confidence_threshold = 60  # Lower threshold for more matches
         self.response_delay = 0.02  # Ultra-fast response time
         
@@ -56,15 +70,25 @@ class SmartScriptFollower:
         # Ensure directories exist
         os.makedirs(self.data_path, exist_ok=True)
         os.makedirs(self.log_path, exist_ok=True)
+        self.script_cache = ScriptCache(os.path.join(self.data_path, 'compiled'))
         
-        # Load the script automatically
-        self.load_script_automatically()
+        # Load the script automatically and build its search index, unless the process already shares one
+        if script is None:
+            self.load_script_automatically()
+        else:
+            self.use_shared_script(script)
+        self.get_search_index()
         
         # Response history for display
         self.response_history = deque(maxlen=10)
         
         logger.info("SmartScriptFollower initialized with automatic script loading")
     
+    def use_shared_script(self, script):
+        """Follow a script loaded once for the whole process instead of loading a private copy"""
+        self.script_data = script.script_data
+        self.search_index = script.search_index
+    
     def load_script_automatically(self):
         """Load the needgodscript.pdf automatically"""
         try:
@@ -72,19 +96,15 @@ class SmartScriptFollower:
             script_file = "needgodscript.pdf"
             if os.path.exists(script_file):
                 with open(script_file, 'rb') as file:
-                    pdf_reader = PyPDF2.PdfReader(file)
-                    text = ""
-                    for page in pdf_reader.pages:
-                        text += page.extract_text() + "\n"
-                    
-                    self.script_data = self.parse_script_text(text)
-                    logger.info(f"Script loaded from local file with {len(self.script_data)} lines")
-                    return
+                    source = file.read()
+                self.script_data = self.load_compiled_script(source, lambda: iter_pdf_lines(source))
+                logger.info(f"Script loaded from local file with {len(self.script_data)} lines")
+                return
             
             # If local file fails, try to load from GitHub
             script_content = self.load_script_from_github()
             if script_content:
-                self.script_data = self.parse_script_text(script_content)
+                self.script_data = self.load_compiled_script(script_content, lambda: script_content.split('\n'))
                 logger.info(f"Script loaded from GitHub with {len(self.script_data)} lines")
                 return
             
@@ -141,6 +161,19 @@ class SmartScriptFollower:
             }
         }
     
+    def load_compiled_script(self, source, read_lines):
+        """Parsed and indexed script for the source bytes, from the compiled-script cache when it has them"""
+        cached = self.script_cache.load('smart', SCRIPT_PARSER_VERSION, source)
+        if cached is not None:
+            try:
+                return ScriptIndex.from_payload(*cached).script_data
+            except Exception as e:
+                # Arrays that pass the header check but do not fit together: re-parse and overwrite
+                self.script_cache.reject('smart', SCRIPT_PARSER_VERSION, source, e)
+        script_data = self.parse_script_lines(read_lines())
+        self.script_cache.store('smart', SCRIPT_PARSER_VERSION, source, *index_for(script_data).to_payload())
+        return script_data
+    
     def load_script_from_github(self):
         """Load script from GitHub repository"""
         try:
@@ -157,51 +190,18 @@ class SmartScriptFollower:
     
     def parse_script_text(self, text):
         """Parse script text into optimized format for fast matching"""
-        script_data = {}
-        lines = text.split('\n')
-        
-        current_speaker = None
-        current_line = ""
-        line_number = 0
-        
-        for line in lines:
-            line = line.strip()
-            if not line:
-                continue
-                
-            line_number += 1
-            
-            # Check if line starts with a speaker name
-            if re.match(r'^[A-Z][A-Z\s]+:', line) or re.match(r'^[A-Z][A-Z\s]+$', line):
-                if current_speaker and current_line:
-                    # Store with multiple searchable formats
-                    clean_line = current_line.strip()
-                    script_data[clean_line] = {
-                        'speaker': current_speaker,
-                        'response': clean_line,
-                        'keywords': self.extract_keywords(clean_line),
-                        'line_number': line_number - 1,
-                        'timestamp': datetime.now().isoformat(),
-                        'search_terms': self.create_search_terms(clean_line)
-                    }
-                current_speaker = line.replace(':', '').strip()
-                current_line = ""
-            else:
-                current_line += " " + line
-        
-        # Add the last line
-        if current_speaker and current_line:
-            clean_line = current_line.strip()
-            script_data[clean_line] = {
-                'speaker': current_speaker,
-                'response': clean_line,
-                'keywords': self.extract_keywords(clean_line),
-                'line_number': line_number,
-                'timestamp': datetime.now().isoformat(),
-                'search_terms': self.create_search_terms(clean_line)
-            }
+        return self.parse_script_lines(text.split('\n'))
+    
+    def parse_script_lines(self, lines):
+        """Parse script lines as they stream in (e.g. page by page from a PDF) straight into the search index"""
+        builder = ScriptIndexBuilder()
+        for speaker, block, line_number in iter_speaker_blocks(lines):
+            # Store with multiple searchable formats
+            clean_line = block.strip()
+            builder.add_line(clean_line, speaker, line_number, self.extract_keywords(clean_line))
         
-        return script_data
+        # Dict-style access still works through the index's read-only view
+        return builder.build().script_data
     
     def create_search_terms(self, text):
         """Create multiple search terms for faster matching"""
@@ -225,44 +225,125 @@ class SmartScriptFollower:
         keywords = [word for word in words if word not in stop_words and len(word) > 2]
         return keywords
     
-    def find_best_match_ultra_fast(self, spoken_text):
-        """Ultra-fast script matching optimized for real-time use"""
+    def get_search_index(self):
+        """Return the search index for the loaded script, rebuilding it when the script changes"""
+        self.search_index = index_for(self.script_data, self.search_index)
+        return self.search_index
+    
+    def find_best_match_ultra_fast(self, spoken_text, phrase_state=None):
+        """Ultra-fast script matching optimized for real-time use; repeated phrases are answered from the match cache"""
         if not spoken_text or len(spoken_text.strip()) < 2:
             return None, 0
         
+        search_index = self.get_search_index()
+        cache_key = (spoken_text.lower(), search_index.content_hash, self.confidence_threshold)
+        found, result = self.match_cache.lookup(cache_key)
+        if not found:
+            result = self.compute_best_match(spoken_text, phrase_state)
+            self.match_cache.store(cache_key, result)
+        return result
+    
+    def find_top_k(self, spoken_text, k=5, min_score=None):
+        """Return the k best candidate lines, ranked, with the score each matching pass gave them"""
+        if not spoken_text or len(spoken_text.strip()) < 2:
+            return []
+        
+        min_score = self.confidence_threshold if min_score is None else min_score
+        search_index = self.get_search_index()
+        cache_key = (spoken_text.lower(), search_index.content_hash, self.confidence_threshold, k, min_score)
+        found, result = self.match_cache.lookup(cache_key)
+        if not found:
+            result = self.rank_candidates(spoken_text, k, min_score)
+            self.match_cache.store(cache_key, result)
+        return result
+    
+    def find_best_match_timed(self, spoken_text, budget=None, phrase_state=None):
+        """Deadline-aware matching: passes run in cost order until the budget (default response_delay) runs out
+
+        Returns the match as (line, data) or (None, 0) with its score, a
+        partial flag set when a pass was cut by the budget, and per-pass
+        timings in milliseconds.
+        """
+        budget = MatchBudget(self.response_delay if budget is None else budget)
+        result = {'match': (None, 0), 'score': 0, 'pass': None}
+        if spoken_text and len(spoken_text.strip()) >= 2:
+            search_index = self.get_search_index()
+            cache_key = (spoken_text.lower(), search_index.content_hash, self.confidence_threshold, 1, self.confidence_threshold)
+            found, candidates = self.match_cache.lookup(cache_key)
+            if not found:
+                candidates = self.rank_candidates(spoken_text, 1, self.confidence_threshold, phrase_state, budget)
+                if not budget.partial:
+                    self.match_cache.store(cache_key, candidates)  # Cut-short results are not reusable
+            if candidates:
+                best = candidates[0]
+                result = {'match': (best['line'], best['data']), 'score': best['score'], 'pass': best['pass']}
+        result.update(budget.report())
+        self.match_timings.append(result)
+        return result
+    
+    def compute_best_match(self, spoken_text, phrase_state=None):
+        """Ultra-fast script matching optimized for real-time use (uncached)"""
+        candidates = self.rank_candidates(spoken_text, 1, self.confidence_threshold, phrase_state)
+        if not candidates:
+            return None, 0
+        return candidates[0]['line'], candidates[0]['data']
+    
+    def rank_candidates(self, spoken_text, k, min_score, phrase_state=None, budget=None):
+        """Run the matching passes once in cost order, keeping the k best lines of each pass (uncached)"""
         spoken_lower = spoken_text.lower()
-        best_match = None
-        best_score = 0
+        ranking = CandidateRanking(('substring', 'word_overlap', 'fuzzy'))
+        budget = MatchBudget() if budget is None else budget
         
-        # First pass: exact substring matching (fastest)
-        for script_line, data in self.script_data.items():
-            if spoken_lower in script_line.lower():
-                score = 95  # High score for exact substring match
-                if score > best_score:
-                    best_score = score
-                    best_match = (script_line, data)
+        search_index = self.get_search_index()
+        # The phrase buffer's incremental state answers the first two passes when it is current
+        if phrase_state is not None and (phrase_state.index is not search_index or phrase_state.phrase != spoken_text):
+            phrase_state = None
         
-        # Second pass: search terms matching
-        if best_score < 80:
-            spoken_words = set(re.findall(r'\b\w+\b', spoken_lower))
-            for script_line, data in self.script_data.items():
-                search_terms = data['search_terms']
-                matches = len(spoken_words.intersection(set(search_terms)))
-                if matches > 0:
-                    score = min(90, matches * 20)  # Higher score for word matches
-                    if score > best_score:
-                        best_score = score
-                        best_match = (script_line, data)
+        # First pass: exact substring matching via the suffix array (fastest, always runs)
+        budget.start_pass('substring', required=True)
+        if phrase_state is not None:
+            containing_lines = phrase_state.containing_lines
+        else:
+            containing_lines = search_index.lines_containing(spoken_lower)
+        for line_id in containing_lines[:k]:
+            ranking.add('substring', line_id, 95)  # High score for exact substring match
         
-        # Third pass: fuzzy matching (slower but more accurate)
-        if best_score < self.confidence_threshold:
-            for script_line, data in self.script_data.items():
-                score = fuzz.ratio(spoken_lower, script_line.lower())
-                if score > best_score:
-                    best_score = score
-                    best_match = (script_line, data)
+        # Second pass: search terms matching (bitset overlap counts for every line at once)
+        if ranking.best_score() < 80 and budget.start_pass('word_overlap'):
+            if phrase_state is not None:
+                overlap_counts = phrase_state.term_overlap_counts()
+            else:
+                overlap_counts = search_index.term_overlap_counts(set(re.findall(r'\b\w+\b', spoken_lower)))
+            scores = np.minimum(90, overlap_counts * 20)  # Higher score for word matches
+            for line_id in top_k_lines(scores, k):
+                ranking.add('word_overlap', int(line_id), int(scores[line_id]))
         
-        return best_match if best_score >= self.confidence_threshold else (None, 0)
+        # Third pass: fuzzy matching, skipping lines whose length bound cannot reach the kth best
+        if ranking.best_score() < self.confidence_threshold and budget.start_pass('fuzzy'):
+            kth_score = ranking.kth_score(k)
+            floor = min_score if kth_score is None else max(min_score, kth_score + 1)
+            earlier_lines = list(ranking.scores)
+            for line_id, score in search_index.top_fuzzy_lines(spoken_lower, k, floor, budget):
+                ranking.add('fuzzy', line_id, score)
+            if k > 1 and earlier_lines:
+                # Runner-ups from the earlier passes may score higher here, below the kth-best bar
+                for line_id, score in zip(earlier_lines, search_index.fuzzy_scores(spoken_lower, earlier_lines, min_score)[0]):
+                    if score >= min_score:
+                        ranking.add('fuzzy', line_id, int(score))
+        
+        budget.end_pass()
+        
+        candidates = []
+        for line_id, score, pass_name, pass_scores in ranking.top(k, min_score):
+            script_line, data = search_index.entry(line_id)
+            candidates.append({
+                'line': script_line,
+                'data': data,
+                'score': score,
+                'pass': pass_name,
+                'pass_scores': dict(pass_scores)
+            })
+        return candidates
     
     def start_listening(self):
         """Start the listening process"""
@@ -284,11 +365,15 @@ class SmartScriptFollower:
         
         # Convert to string and clean
         audio_text = str(audio_text).strip()
-        self.phrase_buffer.append(audio_text)
-        self.current_phrase = " ".join(list(self.phrase_buffer))
+        self.phrase_matcher.append(audio_text, self.get_search_index())
+        self.current_phrase = self.phrase_matcher.phrase
         
-        # Find best match using ultra-fast algorithm
-        match, score = self.find_best_match_ultra_fast(self.current_phrase)
+        # Find best match within the response-time budget
+        timed = self.find_best_match_timed(self.current_phrase, phrase_state=self.phrase_matcher)
+        match = timed['match'] if timed['match'][0] is not None else None
+        score = timed['score']
+        if timed['partial']:
+            logger.info(f"Match cut short after {timed['elapsed_ms']:.1f}ms (cut: {', '.join(timed['cut_passes'])})")
         
         # Log interaction
         self.log_interaction(self.current_phrase, match, score)
@@ -308,7 +393,7 @@ class SmartScriptFollower:
             self.response_history.append(response)
             
             # Clear buffer after successful match for faster response
-            self.phrase_buffer.clear()
+            self.phrase_matcher.clear()
             self.current_phrase = ""
             
             return response
@@ -444,6 +529,11 @@ def create_smart_speech_component():
     """
     return html_code
 
+@st.cache_resource
+def load_shared_script():
+    """Load the script and its search index once per process; every session's follower shares it"""
+    return SharedScript.of(SmartScriptFollower())
+
 def main():
     st.set_page_config(
         page_title="Smart Script Follower",
@@ -456,7 +546,7 @@ def main():
     
     # Initialize session state with smart follower
     if 'script_follower' not in st.session_state:
-        st.session_state.script_follower = SmartScriptFollower()
+        st.session_state.script_follower = SmartScriptFollower(load_shared_script())
     
     if 'is_listening' not in st.session_state:
         st.session_state.is_listening = False
@@ -539,9 +629,13 @@ def main():
         with col1:
             st.subheader("Script Statistics")
             st.write(f"**Total lines:** {len(st.session_state.script_follower.script_data)}")
-            speakers = set(data['speaker'] for data in st.session_state.script_follower.script_data.values())
+            speakers = st.session_state.script_follower.get_search_index().speakers
             st.write(f"**Speakers:** {len(speakers)}")
             st.write(f"**Speaker list:** {', '.join(speakers)}")
+            cache_stats = st.session_state.script_follower.match_cache.stats()
+            st.write(f"**Match cache:** {cache_stats['hits']} hits, {cache_stats['misses']} misses, {cache_stats['evictions']} evictions ({cache_stats['hit_rate']:.0f}% hit rate)")
+            timing_stats = summarize_timings(st.session_state.script_follower.match_timings)
+            st.write(f"**Match latency:** p95 {timing_stats['p95_ms']:.1f}ms, max {timing_stats['max_ms']:.1f}ms, {timing_stats['partial']} of {timing_stats['count']} cut by the budget")
         
         with col2:
             st.subheader("Performance Settings")
@@ -0,0 +1,150 @@
+"""Bounded conversation context: belief counters, per-utterance log deltas and rewind checkpoints"""
+from collections import deque, namedtuple
+
+# Turns an operator can step back through
+DEFAULT_CHECKPOINT_DEPTH = 200
+
+
+class BeliefState:
+    """Count, first and last utterance turn of each belief mentioned, one entry per distinct belief
+
+    Reads like the old list of beliefs (membership, iteration in first-seen
+    order, len) but repeated mentions only bump a counter.
+    """
+    __slots__ = ('entries', 'frozen')
+
+    def __init__(self):
+        self.entries = {}
+        self.frozen = ()
+
+    @classmethod
+    def thaw(cls, frozen):
+        """Rebuild a BeliefState from freeze() output"""
+        state = cls()
+        for belief, count, first_seen, last_seen in frozen:
+            state.entries[belief] = [count, first_seen, last_seen]
+        state.frozen = frozen
+        return state
+
+    def freeze(self):
+        """Immutable copy of the counters, shared until the next mention"""
+        if self.frozen is None:
+            self.frozen = tuple((belief,) + tuple(entry) for belief, entry in self.entries.items())
+        return self.frozen
+
+    def record(self, belief, turn):
+        """Count a mention of belief at the given utterance turn"""
+        self.frozen = None
+        entry = self.entries.get(belief)
+        if entry is None:
+            self.entries[belief] = [1, turn, turn]
+        else:
+            entry[0] += 1
+            entry[2] = turn
+
+    def count(self, belief):
+        """Number of utterances that mentioned belief"""
+        entry = self.entries.get(belief)
+        return entry[0] if entry else 0
+
+    def __contains__(self, belief):
+        return belief in self.entries
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __repr__(self):
+        return f'BeliefState({self.to_dict()!r})'
+
+    def to_dict(self):
+        """JSON-friendly copy of the counters"""
+        return {belief: {'count': count, 'first_seen': first_seen, 'last_seen': last_seen}
+                for belief, (count, first_seen, last_seen) in self.entries.items()}
+
+
+def new_conversation_context():
+    """Empty context for a new conversation"""
+    return {
+        'person_name': None,
+        'beliefs': BeliefState(),
+        'responses': [],
+        'current_topic': None,
+        'script_progress': 0,
+        'turns': 0
+    }
+
+
+def context_snapshot(conversation_context):
+    """JSON-friendly copy of a conversation context"""
+    snapshot = dict(conversation_context)
+    beliefs = snapshot.get('beliefs')
+    if isinstance(beliefs, BeliefState):
+        snapshot['beliefs'] = beliefs.to_dict()
+    return snapshot
+
+
+def context_delta(previous, current):
+    """Entries of the current snapshot that differ from the previous one; beliefs are compared one by one"""
+    delta = {}
+    for key, value in current.items():
+        if key == 'beliefs' and isinstance(value, dict):
+            old_beliefs = previous.get('beliefs') or {}
+            changed = {belief: entry for belief, entry in value.items() if old_beliefs.get(belief) != entry}
+            if changed:
+                delta['beliefs'] = changed
+        elif previous.get(key) != value:
+            delta[key] = value
+    return delta
+
+
+class ConversationCheckpoint(namedtuple('ConversationCheckpoint',
+                                        'position person_name beliefs current_topic script_progress turns history_head')):
+    """Immutable conversation state before one utterance; beliefs are shared with earlier checkpoints while unchanged"""
+    __slots__ = ()
+
+
+class CheckpointChain:
+    """Bounded stack of checkpoints, one per processed utterance"""
+
+    def __init__(self, max_depth=DEFAULT_CHECKPOINT_DEPTH):
+        self.checkpoints = deque(maxlen=max_depth)
+
+    def __len__(self):
+        return len(self.checkpoints)
+
+    def clear(self):
+        """Drop every checkpoint"""
+        self.checkpoints.clear()
+
+    def push(self, position, conversation_context, history_head):
+        """Record the state before an utterance"""
+        self.checkpoints.append(ConversationCheckpoint(
+            position,
+            conversation_context['person_name'],
+            conversation_context['beliefs'].freeze(),
+            conversation_context['current_topic'],
+            conversation_context['script_progress'],
+            conversation_context.get('turns', 0),
+            history_head
+        ))
+
+    def pop(self, turns=1):
+        """Remove the latest turns checkpoints and return the oldest one removed (None if there are none)"""
+        checkpoint = None
+        for _ in range(min(turns, len(self.checkpoints))):
+            checkpoint = self.checkpoints.pop()
+        return checkpoint
+
+
+def restore_context(checkpoint, conversation_context):
+    """Conversation context as it was at checkpoint"""
+    restored = dict(conversation_context)
+    restored['person_name'] = checkpoint.person_name
+    restored['beliefs'] = BeliefState.thaw(checkpoint.beliefs)
+    restored['current_topic'] = checkpoint.current_topic
+    restored['script_progress'] = checkpoint.script_progress
+    restored['turns'] = checkpoint.turns
+    return restored
@@ -0,0 +1,154 @@
+"""Conversation flow compiled into a graph of question nodes with hashed lookups"""
+import re
+from collections import namedtuple
+
+# "q4", "q17", "q2.5" anywhere in a question reference
+QUESTION_REFERENCE = re.compile(r'q(\d+(?:\.\d+)?)')
+# Guidance directives naming the question to jump to, in the order they are honoured
+PROCEED_DIRECTIVE = re.compile(r'proceed to q(\d+)')
+SKIP_QUESTION_DIRECTIVE = re.compile(r'skip question (\d+)')
+GO_TO_DIRECTIVE = re.compile(r'go to q(\d+)')
+SKIP_TO_DIRECTIVE = re.compile(r'skip to q(\d+)')
+# Question the intelligent matchers point at for people who do not believe in a creator
+BUILDING_ANALOGY = 'building analogy'
+# Questions either side of the current position scored before the whole flow
+DEFAULT_QUESTION_WINDOW = 2
+
+
+class QuestionNode(namedtuple('QuestionNode', 'node_id number question guidance_text directives successors')):
+    """One question of the flow; node_id is its position in conversation_flow"""
+    __slots__ = ()
+
+
+def guidance_directives(guidance_text):
+    """Question numbers the guidance sends the conversation to: proceed to, skip question (the one after), go to"""
+    directives = []
+    for number in PROCEED_DIRECTIVE.findall(guidance_text)[:1]:
+        directives.append(int(number))
+    for number in SKIP_QUESTION_DIRECTIVE.findall(guidance_text)[:1]:
+        directives.append(int(number) + 1)
+    for number in GO_TO_DIRECTIVE.findall(guidance_text)[:1]:
+        directives.append(int(number))
+    return tuple(directives)
+
+
+def graph_for(conversation_flow, cached_graph=None):
+    """Return the ConversationGraph of conversation_flow, reusing cached_graph while the flow is unchanged"""
+    if cached_graph is not None and cached_graph.flow is conversation_flow:
+        return cached_graph
+    return ConversationGraph(conversation_flow)
+
+
+class ConversationGraph:
+    """Question nodes with text->id and number->id maps and edges from next_questions and guidance"""
+
+    def __init__(self, conversation_flow):
+        self.flow = conversation_flow
+        self.text_ids = {}
+        self.number_ids = {}
+        self.analogy_id = None
+        self.resolved = {}
+        self.windows = {}
+        self.question_lowers = [item['question'].lower() for item in conversation_flow]
+
+        for node_id, item in enumerate(conversation_flow):
+            question = item['question']
+            # The first question wins, as with a scan of the flow
+            self.text_ids.setdefault(question, node_id)
+            number = item.get('question_number')
+            if number is not None:
+                self.number_ids.setdefault(number, node_id)
+            if self.analogy_id is None and BUILDING_ANALOGY in question.lower():
+                self.analogy_id = node_id
+
+        self.nodes = []
+        for node_id, item in enumerate(conversation_flow):
+            guidance_text = ' '.join(item.get('guidance') or []).lower()
+            directives = guidance_directives(guidance_text)
+            targets = list(item.get('next_questions') or [])
+            targets.extend(directives)
+            targets.extend(int(number) for number in SKIP_TO_DIRECTIVE.findall(guidance_text))
+            successors = []
+            for number in targets:
+                target_id = self.number_ids.get(number)
+                if target_id is not None and target_id not in successors:
+                    successors.append(target_id)
+            self.nodes.append(QuestionNode(node_id, item.get('question_number'), item['question'],
+                                           guidance_text, directives, tuple(successors)))
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def referenced_id(self, text):
+        """Node id of the question number referenced as "qN" in text, if any"""
+        reference = QUESTION_REFERENCE.search(text.lower())
+        if reference:
+            return self.number_ids.get(float(reference.group(1)))
+        return None
+
+    def resolve(self, next_question):
+        """Node id for a next-question string: exact text, then the building analogy, then a "qN" reference"""
+        try:
+            return self.resolved[next_question]
+        except KeyError:
+            pass
+        node_id = self.text_ids.get(next_question)
+        if node_id is None and BUILDING_ANALOGY in next_question.lower():
+            node_id = self.analogy_id
+        if node_id is None:
+            node_id = self.referenced_id(next_question)
+        self.resolved[next_question] = node_id
+        return node_id
+
+    def first_match(self, next_question):
+        """Node id of the first question whose text equals next_question or whose number it references"""
+        candidates = [node_id for node_id in (self.text_ids.get(next_question), self.referenced_id(next_question))
+                      if node_id is not None]
+        return min(candidates) if candidates else None
+
+    def successors(self, node_id):
+        """Node ids the question can lead to"""
+        return self.nodes[node_id].successors
+
+    def window_ids(self, position, window):
+        """Node ids within window of position plus the position's successors, in flow order (memoized)"""
+        key = (position, window)
+        if key not in self.windows:
+            node_ids = set(range(max(0, position - window), min(len(self.nodes), position + window + 1)))
+            if 0 <= position < len(self.nodes):
+                node_ids.update(self.successors(position))
+            self.windows[key] = sorted(node_ids)
+        return self.windows[key]
+
+
+class QuestionWindowStats:
+    """Counts how often a spoken question was found in the window, needed the whole flow, or was not found"""
+
+    def __init__(self):
+        self.lookups = 0
+        self.window_hits = 0
+        self.global_hits = 0
+        self.misses = 0
+        self.questions_scored = 0
+
+    def record(self, outcome, questions_scored):
+        """Count one lookup; outcome is 'window', 'global' or None"""
+        self.lookups += 1
+        self.questions_scored += questions_scored
+        if outcome == 'window':
+            self.window_hits += 1
+        elif outcome == 'global':
+            self.global_hits += 1
+        else:
+            self.misses += 1
+
+    def stats(self):
+        """Return the counters for display and logging"""
+        return {
+            'lookups': self.lookups,
+            'window_hits': self.window_hits,
+            'global_hits': self.global_hits,
+            'misses': self.misses,
+            'window_hit_rate': self.window_hits / self.lookups * 100 if self.lookups else 0.0,
+            'questions_per_lookup': self.questions_scored / self.lookups if self.lookups else 0.0
+        }
@@ -0,0 +1,102 @@
+"""Aho-Corasick automaton reporting every keyword of a question in one pass over the utterance"""
+from collections import deque, namedtuple
+
+
+class KeywordHit(namedtuple('KeywordHit', 'keyword groups start end whole_word')):
+    """One keyword occurrence; whole_word is True when it is not part of a longer word"""
+    __slots__ = ()
+
+
+def is_word_char(char):
+    """Check whether a character continues a word"""
+    return char.isalnum() or char == '_'
+
+
+class KeywordAutomaton:
+    """Keyword groups compiled into one trie with failure links
+
+    groups maps a group name to its keywords (the keyword and its spoken
+    variants). A keyword may sit in several groups. Matching walks the text
+    once, so the cost depends on the utterance length, not on the number of
+    keywords.
+    """
+
+    def __init__(self, groups):
+        self.keywords = []
+        self.keyword_groups = []
+        keyword_ids = {}
+        transitions = [{}]
+        outputs = [[]]
+
+        for group, keywords in groups.items():
+            for keyword in keywords:
+                if keyword not in keyword_ids:
+                    keyword_ids[keyword] = len(self.keywords)
+                    self.keywords.append(keyword)
+                    self.keyword_groups.append([])
+                    state = 0
+                    for char in keyword:
+                        if char not in transitions[state]:
+                            transitions[state][char] = len(transitions)
+                            transitions.append({})
+                            outputs.append([])
+                        state = transitions[state][char]
+                    outputs[state].append(keyword_ids[keyword])
+                keyword_id = keyword_ids[keyword]
+                if group not in self.keyword_groups[keyword_id]:
+                    self.keyword_groups[keyword_id].append(group)
+
+        # Breadth-first failure links; each state also reports the keywords of its failure chain
+        fail = [0] * len(transitions)
+        queue = deque(transitions[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in transitions[state].items():
+                queue.append(next_state)
+                fallback = fail[state]
+                while fallback and char not in transitions[fallback]:
+                    fallback = fail[fallback]
+                if state:
+                    fail[next_state] = transitions[fallback].get(char, 0)
+                outputs[next_state].extend(outputs[fail[next_state]])
+
+        self.transitions = transitions
+        self.fail = fail
+        self.outputs = [tuple(keyword_ids_out) for keyword_ids_out in outputs]
+        self.keyword_groups = [tuple(keyword_groups) for keyword_groups in self.keyword_groups]
+        self.state_groups = [frozenset(group for keyword_id in keyword_ids_out for group in self.keyword_groups[keyword_id])
+                             for keyword_ids_out in self.outputs]
+
+    def states(self, text):
+        """Yield (end offset, state) for each character of text"""
+        transitions = self.transitions
+        fail = self.fail
+        state = 0
+        for end, char in enumerate(text, 1):
+            while state and char not in transitions[state]:
+                state = fail[state]
+            state = transitions[state].get(char, 0)
+            yield end, state
+
+    def hits(self, text):
+        """Every keyword occurrence in text, in order of where it ends"""
+        found = []
+        for end, state in self.states(text):
+            for keyword_id in self.outputs[state]:
+                keyword = self.keywords[keyword_id]
+                start = end - len(keyword)
+                whole_word = ((start == 0 or not is_word_char(text[start - 1])) and
+                              (end == len(text) or not is_word_char(text[end])))
+                found.append(KeywordHit(keyword, self.keyword_groups[keyword_id], start, end, whole_word))
+        return found
+
+    def groups_in(self, text, whole_words=False):
+        """Names of the groups with a keyword anywhere in text (or only as whole words)"""
+        if whole_words:
+            return {group for hit in self.hits(text) if hit.whole_word for group in hit.groups}
+        found = set()
+        state_groups = self.state_groups
+        for _, state in self.states(text):
+            if state_groups[state]:
+                found.update(state_groups[state])
+        return found
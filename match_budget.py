@@ -0,0 +1,81 @@
+"""Per-utterance latency budget for the cascading matchers"""
+import time
+
+import numpy as np
+
+
+class MatchBudget:
+    """Deadline for one match, recording how long each pass took and which passes were cut
+
+    A budget of None never runs out, so the cascade runs to completion and
+    only the timings are collected.
+    """
+
+    def __init__(self, budget=None):
+        self.budget = budget
+        self.started = time.perf_counter()
+        self.deadline = None if budget is None else self.started + budget
+        self.pass_timings = {}
+        self.cut_passes = []
+        self.current_pass = None
+        self.pass_started = None
+
+    @property
+    def partial(self):
+        """True when a pass was skipped or stopped early because the budget ran out"""
+        return bool(self.cut_passes)
+
+    def expired(self):
+        """Check whether the deadline has passed"""
+        return self.deadline is not None and time.perf_counter() >= self.deadline
+
+    def start_pass(self, pass_name, required=False):
+        """Start timing a pass; returns False (and records the cut) when no time is left for it"""
+        self.end_pass()
+        if not required and self.expired():
+            self.cut_passes.append(pass_name)
+            return False
+        self.current_pass = pass_name
+        self.pass_started = time.perf_counter()
+        return True
+
+    def end_pass(self):
+        """Stop timing the running pass, if any"""
+        if self.current_pass is not None:
+            elapsed = time.perf_counter() - self.pass_started
+            self.pass_timings[self.current_pass] = self.pass_timings.get(self.current_pass, 0.0) + elapsed
+            self.current_pass = None
+
+    def interrupt(self):
+        """Stop the running pass before it finished its candidates"""
+        if self.current_pass is not None:
+            self.cut_passes.append(self.current_pass)
+        self.end_pass()
+
+    def elapsed(self):
+        """Seconds since the budget started"""
+        return time.perf_counter() - self.started
+
+    def report(self):
+        """Return the timings in milliseconds with the partial flag, for results and logs"""
+        self.end_pass()
+        return {
+            'budget_ms': None if self.budget is None else self.budget * 1000,
+            'elapsed_ms': self.elapsed() * 1000,
+            'pass_timings_ms': {name: seconds * 1000 for name, seconds in self.pass_timings.items()},
+            'cut_passes': list(self.cut_passes),
+            'partial': self.partial
+        }
+
+
+def summarize_timings(reports):
+    """Summarize recent match reports for the statistics panel"""
+    if not reports:
+        return {'count': 0, 'p95_ms': 0.0, 'max_ms': 0.0, 'partial': 0}
+    elapsed = np.array([report['elapsed_ms'] for report in reports])
+    return {
+        'count': len(reports),
+        'p95_ms': float(np.percentile(elapsed, 95)),
+        'max_ms': float(elapsed.max()),
+        'partial': sum(1 for report in reports if report['partial'])
+    }
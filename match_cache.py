@@ -0,0 +1,78 @@
+"""Bounded LRU cache of match results for phrases that are spoken over and over"""
+import hashlib
+import json
+from collections import OrderedDict
+
+# Distinct (phrase, script, state) results kept per follower
+DEFAULT_MATCH_CACHE_SIZE = 512
+
+
+def flow_content_hash(conversation_flow):
+    """Hash a conversation flow's content so an identical reload keeps its cache entries"""
+    payload = json.dumps(conversation_flow, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+class MatchCache:
+    """LRU map of match keys to results, with hit/miss/eviction counters"""
+
+    def __init__(self, max_size=DEFAULT_MATCH_CACHE_SIZE):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def lookup(self, key):
+        """Return (found, result); a found entry becomes the most recently used"""
+        try:
+            result = self.entries[key]
+        except KeyError:
+            self.misses += 1
+            return False, None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return True, result
+
+    def store(self, key, result):
+        """Cache a result, evicting the least recently used entries beyond max_size"""
+        self.entries[key] = result
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        """Drop all entries (counters are kept)"""
+        self.entries.clear()
+
+    def stats(self):
+        """Return the cache counters for display and logging"""
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self.entries),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups * 100 if lookups else 0.0
+        }
+
+
+class FlowVersion:
+    """Content hash of a follower's conversation flow, recomputed only when the flow object is replaced"""
+
+    def __init__(self, conversation_flow=None, content_hash=None):
+        # A flow shared with other followers arrives with its hash already computed
+        self.flow = conversation_flow
+        self.content_hash = content_hash
+
+    def of(self, conversation_flow):
+        """Return the content hash of conversation_flow"""
+        if conversation_flow is not self.flow:
+            self.flow = conversation_flow
+            self.content_hash = flow_content_hash(conversation_flow)
+        return self.content_hash
@@ -0,0 +1,106 @@
+"""PDF text extraction, streamed page by page and fanned out across a process pool for large scripts"""
+import io
+import logging
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import PyPDF2
+
+from script_stream import iter_text_lines
+
+logger = logging.getLogger(__name__)
+
+
+def configured_workers(value):
+    """Worker count for a PDF_EXTRACT_WORKERS setting: one per CPU when unset or not a number, and at least 1"""
+    try:
+        workers = int(value)
+    except (TypeError, ValueError):
+        if value:
+            logger.warning(f"Ignoring PDF_EXTRACT_WORKERS={value!r}, using one worker per CPU")
+        workers = os.cpu_count() or 1
+    return max(1, workers)
+
+
+# Worker processes for page extraction; 1 extracts every page in the calling process
+PDF_EXTRACT_WORKERS = configured_workers(os.getenv('PDF_EXTRACT_WORKERS'))
+
+# Below this many pages starting the pool costs more than it saves
+PARALLEL_MIN_PAGES = 16
+
+# Pages per pool task, and tasks queued per worker; together they bound the text held in memory
+PAGES_PER_TASK = 4
+TASKS_IN_FLIGHT_PER_WORKER = 2
+
+# The PDF each pool worker opened once in its initializer
+worker_reader = None
+
+
+def pdf_bytes(pdf):
+    """Raw bytes of a PDF given as bytes, a path or a file-like object (e.g. a Streamlit upload)"""
+    if isinstance(pdf, (bytes, bytearray, memoryview)):
+        return bytes(pdf)
+    if isinstance(pdf, (str, os.PathLike)):
+        with open(pdf, 'rb') as f:
+            return f.read()
+    if hasattr(pdf, 'seek'):
+        pdf.seek(0)
+    return pdf.read()
+
+
+def open_worker_reader(source):
+    """Pool initializer: parse the PDF once per worker process"""
+    global worker_reader
+    worker_reader = PyPDF2.PdfReader(io.BytesIO(source))
+
+
+def extract_page_range(start, stop):
+    """Text of pages [start, stop) of the worker's PDF, one entry per page"""
+    return [worker_reader.pages[page_number].extract_text() for page_number in range(start, stop)]
+
+
+def page_ranges(page_count, pages_per_range):
+    """Contiguous (start, stop) ranges of at most pages_per_range pages covering page_count pages"""
+    return [(start, min(start + pages_per_range, page_count)) for start in range(0, page_count, pages_per_range)]
+
+
+def iter_pages_parallel(source, page_count, workers):
+    """Yield the text of each page in order while a pool of workers extracts the pages after it"""
+    ranges = deque(page_ranges(page_count, PAGES_PER_TASK))
+    in_flight = deque()
+    with ProcessPoolExecutor(max_workers=min(workers, len(ranges)), initializer=open_worker_reader,
+                             initargs=(source,)) as pool:
+        while ranges or in_flight:
+            while ranges and len(in_flight) < workers * TASKS_IN_FLIGHT_PER_WORKER:
+                in_flight.append(pool.submit(extract_page_range, *ranges.popleft()))
+            yield from in_flight.popleft().result()
+
+
+def iter_pdf_pages(pdf, workers=None):
+    """Yield the text of each page of a PDF in order; large PDFs are extracted ahead by worker processes"""
+    source = pdf_bytes(pdf)
+    workers = PDF_EXTRACT_WORKERS if workers is None else workers
+    reader = PyPDF2.PdfReader(io.BytesIO(source))
+    page_count = len(reader.pages)
+    done = 0
+    if workers > 1 and page_count >= PARALLEL_MIN_PAGES:
+        try:
+            for page_text in iter_pages_parallel(source, page_count, workers):
+                yield page_text
+                done += 1
+            logger.info(f"Extracted {page_count} PDF pages with {workers} workers")
+        except Exception as e:
+            logger.warning(f"Parallel PDF extraction failed after {done} pages, extracting the rest serially: {e}")
+    for page_number in range(done, page_count):
+        yield reader.pages[page_number].extract_text()
+
+
+def iter_pdf_lines(pdf, workers=None):
+    """Yield the lines of a PDF's text page by page, never holding the whole text"""
+    return iter_text_lines(iter_pdf_pages(pdf, workers))
+
+
+def extract_pdf_text(pdf, workers=None):
+    """Text of every page of a PDF, each followed by a newline"""
+    return "".join(page_text + "\n" for page_text in iter_pdf_pages(pdf, workers))
@@ -0,0 +1,110 @@
+"""Incremental match state for the rolling phrase buffer"""
+from collections import Counter, deque
+from itertools import chain
+
+import numpy as np
+
+from script_index import WORD_TOKEN
+
+
+class IncrementalPhraseMatcher:
+    """Per-line match state for the joined phrase buffer, updated as utterances come and go
+
+    Appending an utterance only narrows the substring candidates (a longer
+    phrase can only occur in lines that held the shorter one) and counts its
+    words. An utterance pushed out of the full buffer uncounts its words
+    again, and clear() just drops the state. Nothing kept here grows with
+    the script: per-line overlap counts are summed from the buffer words'
+    postings when a match asks for them.
+    """
+
+    def __init__(self, phrase_buffer, extract_keywords=None):
+        self.phrase_buffer = phrase_buffer
+        self.extract_keywords = extract_keywords
+        self.index = None
+        self.reset_state()
+
+    def reset_state(self):
+        """Forget all per-utterance and per-line state"""
+        self.utterances = deque()
+        self.utterance_words = deque()
+        self.utterance_keywords = deque()
+        self.word_counts = Counter()
+        self.containing_lines = []
+        self.phrase = ''
+        self.phrase_lower = ''
+
+    def clear(self):
+        """Empty the phrase buffer after a match"""
+        self.phrase_buffer.clear()
+        self.reset_state()
+
+    def append(self, utterance, index):
+        """Append an utterance to the buffer and update the state for the new joined phrase"""
+        if index is not self.index or not self.in_sync():
+            # New script, or the buffer was changed behind our back: replay it
+            self.index = index
+            self.reset_state()
+            for buffered in self.phrase_buffer:
+                self.add_utterance(buffered, narrow=False)
+
+        evicting = self.phrase_buffer.maxlen is not None and len(self.phrase_buffer) == self.phrase_buffer.maxlen
+        if evicting:
+            dropped = self.utterances.popleft()
+            for word in self.utterance_words.popleft():
+                self.remove_word(word)
+            if self.extract_keywords:
+                self.utterance_keywords.popleft()
+            self.phrase = self.phrase[len(dropped) + 1:]
+            self.phrase_lower = self.phrase_lower[len(dropped.lower()) + 1:]
+        self.phrase_buffer.append(utterance)
+        self.add_utterance(utterance, narrow=not evicting)
+
+    def in_sync(self):
+        """Check the buffer still holds exactly the utterances folded into the state"""
+        return (len(self.utterances) == len(self.phrase_buffer) and
+                all(ours is theirs for ours, theirs in zip(self.utterances, self.phrase_buffer)))
+
+    def add_utterance(self, utterance, narrow):
+        """Fold one utterance into the joined phrase, word counts and substring candidates"""
+        self.utterances.append(utterance)
+        utterance_lower = utterance.lower()
+        narrow = narrow and bool(self.phrase)
+        self.phrase = self.phrase + ' ' + utterance if self.phrase else utterance
+        self.phrase_lower = self.phrase_lower + ' ' + utterance_lower if self.phrase_lower else utterance_lower
+
+        words = set(WORD_TOKEN.findall(utterance_lower))
+        self.utterance_words.append(words)
+        for word in words:
+            self.add_word(word)
+        if self.extract_keywords:
+            self.utterance_keywords.append(self.extract_keywords(utterance))
+
+        if narrow:
+            lower_lines = self.index.lower_lines
+            self.containing_lines = [line_id for line_id in self.containing_lines
+                                     if self.phrase_lower in lower_lines[line_id]]
+        else:
+            self.containing_lines = self.index.lines_containing(self.phrase_lower)
+
+    def add_word(self, word):
+        """Count an occurrence of a word in the buffer"""
+        self.word_counts[word] += 1
+
+    def remove_word(self, word):
+        """Uncount a word; the last occurrence leaving the buffer forgets it"""
+        self.word_counts[word] -= 1
+        if self.word_counts[word] == 0:
+            del self.word_counts[word]
+
+    def term_overlap_counts(self):
+        """Per-line count of buffer words among the line's search terms"""
+        postings = [self.index.postings(word) for word in self.word_counts]
+        if not postings:
+            return np.zeros(len(self.index), dtype=np.int64)
+        return np.bincount(np.concatenate(postings), minlength=len(self.index)).astype(np.int64, copy=False)
+
+    @property
+    def keywords(self):
+        """Keywords of the joined phrase, in order"""
+        return list(chain.from_iterable(self.utterance_keywords))
@@ -0,0 +1,98 @@
+"""Compact conversation history: small records resolved to full responses only when shown"""
+import time
+from collections import deque, namedtuple
+from datetime import datetime
+from itertools import islice
+
+# Matches kept per session, and how many of the latest the UI renders
+DEFAULT_HISTORY_SIZE = 500
+HISTORY_RENDER_LIMIT = 20
+
+
+class HistoryEntry(namedtuple('HistoryEntry', 'node_id response_id confidence timestamp')):
+    """One match: the question node, the interned response, its confidence and when it happened"""
+    __slots__ = ()
+
+
+class ResponseHistory:
+    """Bounded history of matches for one compiled script
+
+    Each distinct response (matched answer, guidance, analogies, scripture,
+    next question) is stored once and entries refer to it by id, so a long
+    history costs a few small tuples rather than copies of the guidance
+    lists. Question text is read from the conversation graph when an entry
+    is resolved. Recording against another graph (a new script) starts a
+    new history.
+    """
+
+    def __init__(self, max_size=DEFAULT_HISTORY_SIZE):
+        self.entries = deque(maxlen=max_size)
+        self.graph = None
+        self.responses = []
+        self.response_ids = {}
+        # Entries ever appended; a checkpoint's head is this count at the time
+        self.head = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __bool__(self):
+        return bool(self.entries)
+
+    def clear(self):
+        """Forget all entries and interned responses"""
+        self.entries.clear()
+        self.responses = []
+        self.response_ids = {}
+        self.head = 0
+
+    def append(self, match, graph):
+        """Record a match dict as a compact entry"""
+        if graph is not self.graph:
+            self.clear()
+            self.graph = graph
+        response = (
+            match.get('type'),
+            match.get('question_number'),
+            match.get('matched_response'),
+            tuple(match.get('guidance') or ()),
+            tuple(match.get('analogies') or ()),
+            tuple(match.get('scripture') or ()),
+            match.get('next_question')
+        )
+        response_id = self.response_ids.get(response)
+        if response_id is None:
+            response_id = len(self.responses)
+            self.response_ids[response] = response_id
+            self.responses.append(response)
+        node_id = graph.number_ids.get(match.get('question_number'))
+        self.entries.append(HistoryEntry(node_id, response_id, match.get('confidence', 0), time.time()))
+        self.head += 1
+
+    def truncate(self, head):
+        """Drop the entries appended after head, as far as they are still held"""
+        while self.head > head and self.entries:
+            self.entries.pop()
+            self.head -= 1
+        self.head = min(self.head, head)
+
+    def resolve(self, entry):
+        """Full response dict of an entry"""
+        match_type, question_number, matched_response, guidance, analogies, scripture, next_question = self.responses[entry.response_id]
+        question = self.graph.nodes[entry.node_id].question if entry.node_id is not None else None
+        return {
+            'type': match_type,
+            'question_number': question_number,
+            'question': question,
+            'matched_response': matched_response,
+            'guidance': list(guidance),
+            'analogies': list(analogies),
+            'scripture': list(scripture),
+            'confidence': entry.confidence,
+            'next_question': next_question,
+            'timestamp': datetime.fromtimestamp(entry.timestamp).isoformat()
+        }
+
+    def recent(self, limit=HISTORY_RENDER_LIMIT):
+        """Resolved responses of the latest entries, newest first"""
+        return [self.resolve(entry) for entry in islice(reversed(self.entries), limit)]
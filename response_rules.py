@@ -0,0 +1,109 @@
+"""Declarative response rules per question, compiled into a keyword-automaton evaluation plan"""
+import copy
+from collections import namedtuple
+
+from keyword_automaton import KeywordAutomaton
+from utterance import Utterance
+
+
+class ResponseRule(namedtuple('ResponseRule', 'matched_response next_question guidance confidence any_of all_of unless details')):
+    """One possible answer to a question
+
+    The rule fires when a keyword of any_of is spoken, or every keyword set
+    of all_of has a spoken keyword, and no keyword of unless is spoken. A
+    rule with neither any_of nor all_of always fires (the fallback).
+    next_question is a question number, or the literal question text.
+    """
+    __slots__ = ()
+
+
+def rule(matched_response, next_question, guidance, confidence=90, any_of=(), all_of=(), unless=(), **details):
+    """Build a ResponseRule; extra keyword arguments are copied into every result"""
+    return ResponseRule(matched_response, next_question, tuple(guidance), confidence,
+                        tuple(any_of), tuple(tuple(keywords) for keywords in all_of), tuple(unless), details)
+
+
+class QuestionRules(namedtuple('QuestionRules', 'name question_phrases rules')):
+    """Rules for the question whose text contains one of question_phrases, in priority order"""
+    __slots__ = ()
+
+
+class CompiledQuestion:
+    """A question's rules with all of their keywords in one automaton"""
+
+    def __init__(self, question_rules):
+        self.name = question_rules.name
+        self.rules = question_rules.rules
+        groups = {}
+        for rule_id, response_rule in enumerate(self.rules):
+            groups[('any', rule_id)] = response_rule.any_of
+            groups[('unless', rule_id)] = response_rule.unless
+            for part, keywords in enumerate(response_rule.all_of):
+                groups[('all', rule_id, part)] = keywords
+        self.automaton = KeywordAutomaton(groups)
+
+    def match(self, spoken):
+        """First rule that fires for the utterance (text or Utterance), found with a single scan of it"""
+        hits = Utterance.of(spoken).groups_in(self.automaton)
+        for rule_id, response_rule in enumerate(self.rules):
+            if ('unless', rule_id) in hits:
+                continue
+            if not response_rule.any_of and not response_rule.all_of:
+                return response_rule
+            if ('any', rule_id) in hits:
+                return response_rule
+            if response_rule.all_of and all(('all', rule_id, part) in hits for part in range(len(response_rule.all_of))):
+                return response_rule
+        return None
+
+
+class ResponsePlan:
+    """Rule table compiled once; questions are dispatched by phrase in table order"""
+
+    def __init__(self, rule_table):
+        self.questions = [CompiledQuestion(question_rules) for question_rules in rule_table]
+        self.phrases = [question_rules.question_phrases for question_rules in rule_table]
+        self.by_name = {question.name: question for question in self.questions}
+        self.dispatch = {}
+
+    def question_for(self, question_text):
+        """Compiled rules of the first table entry whose phrase occurs in the question (memoized)"""
+        try:
+            return self.dispatch[question_text]
+        except KeyError:
+            pass
+        question_lower = question_text.lower()
+        found = None
+        for question, phrases in zip(self.questions, self.phrases):
+            if any(phrase in question_lower for phrase in phrases):
+                found = question
+                break
+        self.dispatch[question_text] = found
+        return found
+
+    def evaluate(self, question_text, spoken, question_by_number):
+        """Result dict of the first firing rule for the question, or None"""
+        question = self.question_for(question_text)
+        if question is None:
+            return None
+        return self.result(question.match(spoken), question_by_number)
+
+    def evaluate_rules(self, name, spoken, question_by_number):
+        """Result dict of the first firing rule of a named table entry, or None"""
+        return self.result(self.by_name[name].match(spoken), question_by_number)
+
+    def result(self, response_rule, question_by_number):
+        """Build a fresh result dict for a fired rule"""
+        if response_rule is None:
+            return None
+        next_question = response_rule.next_question
+        if isinstance(next_question, int):
+            next_question = question_by_number(next_question)
+        result = {
+            'matched_response': response_rule.matched_response,
+            'next_question': next_question,
+            'guidance': list(response_rule.guidance),
+            'confidence': response_rule.confidence
+        }
+        result.update(copy.deepcopy(response_rule.details))
+        return result
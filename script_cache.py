@@ -0,0 +1,194 @@
+"""Compiled-script cache on disk, keyed by the content of the source script and the parser that read it"""
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import tempfile
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Layout of the cache files themselves; bump when the stored fields change
+SCRIPT_CACHE_FORMAT = 2
+
+# File signature, then the little-endian byte length of the JSON header that follows it
+MAGIC = b'SCRIPTC\x00'
+HEADER_LENGTH = struct.Struct('<Q')
+
+# Every array starts on a boundary this size, so mapped views are aligned for any dtype
+ALIGNMENT = 64
+
+
+def source_digest(source):
+    """SHA-256 of the source script's bytes (a str is hashed as UTF-8)"""
+    if isinstance(source, str):
+        source = source.encode('utf-8')
+    return hashlib.sha256(source).hexdigest()
+
+
+def aligned(offset):
+    """offset rounded up to the next ALIGNMENT boundary"""
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def pack_strings(strings):
+    """String table for a list of strings: their UTF-8 bytes end to end, and code-point offsets into them"""
+    data = np.frombuffer(''.join(strings).encode('utf-8'), dtype=np.uint8)
+    offsets = np.cumsum([0] + [len(string) for string in strings], dtype=np.int64)
+    return data, offsets
+
+
+def unpack_strings(data, offsets):
+    """The strings of a pack_strings() table, decoded in one pass"""
+    text = str(memoryview(data), 'utf-8')
+    bounds = offsets.tolist()
+    return [text[start:stop] for start, stop in zip(bounds, bounds[1:])]
+
+
+def write_script_file(f, meta, arrays):
+    """Write meta and arrays in the mappable layout: header, then each array's raw bytes at an aligned offset
+
+    The JSON header records every array's dtype, shape and offset from the
+    start of the data section, which itself starts aligned after the header.
+    """
+    layout = {}
+    offset = 0
+    contiguous = {}
+    for name, values in arrays.items():
+        values = np.ascontiguousarray(values)
+        if values.dtype.hasobject:
+            raise TypeError(f'array {name} holds Python objects')
+        contiguous[name] = values
+        layout[name] = [values.dtype.str, list(values.shape), offset]
+        offset = aligned(offset + values.nbytes)
+    header = json.dumps({'meta': meta, 'arrays': layout}).encode('utf-8')
+    f.write(MAGIC + HEADER_LENGTH.pack(len(header)) + header)
+    position = len(MAGIC) + HEADER_LENGTH.size + len(header)
+    data_start = aligned(position)
+    f.write(bytes(data_start - position))
+    for name, values in contiguous.items():
+        f.write(values.tobytes())
+        f.write(bytes(aligned(values.nbytes) - values.nbytes))
+
+
+def open_script_file(path):
+    """Map a write_script_file() file read-only; the arrays are zero-copy views of the mapping
+
+    Every process that opens the same file shares its pages through the OS
+    page cache, and nothing is read until an array is touched. The mapping
+    stays open for as long as any of the views does.
+    """
+    with open(path, 'rb') as f:
+        mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if mapping[:len(MAGIC)] != MAGIC:
+        raise ValueError(f'{path} is not a compiled script')
+    position = len(MAGIC) + HEADER_LENGTH.size
+    header_length, = HEADER_LENGTH.unpack(mapping[len(MAGIC):position])
+    header = json.loads(mapping[position:position + header_length].decode('utf-8'))
+    data_start = aligned(position + header_length)
+    arrays = {}
+    for name, (dtype, shape, offset) in header['arrays'].items():
+        dtype = np.dtype(dtype)
+        count = int(np.prod(shape, dtype=np.int64))
+        if dtype.hasobject:
+            raise ValueError(f'array {name} in {path} holds Python objects')
+        if count == 0:
+            arrays[name] = np.zeros(shape, dtype=dtype)
+            continue
+        arrays[name] = np.frombuffer(mapping, dtype=dtype, count=count, offset=data_start + offset).reshape(shape)
+    return header['meta'], arrays
+
+
+class ScriptCache:
+    """Parsed scripts stored as memory-mapped files of a JSON header plus raw numpy arrays
+
+    A file is named after the parser, its version and the SHA-256 of the
+    source, so editing the script or bumping a parser version simply misses
+    and the caller rebuilds. load() maps the file instead of reading it, so
+    the arrays it returns are views of pages shared by every process. Callers
+    that decode strings out of them (ScriptIndex.from_payload) still pay for
+    that per process. Nothing is unpickled, and a file that cannot be read is
+    treated as a miss.
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self.bytes_mapped = 0
+
+    def path_for(self, parser, parser_version, digest):
+        """File holding parser's output for the source with this digest"""
+        return os.path.join(self.cache_dir, f'{parser}-v{parser_version}-f{SCRIPT_CACHE_FORMAT}-{digest}.bin')
+
+    def load(self, parser, parser_version, source):
+        """Return the cached (meta, arrays) for source, or None to rebuild"""
+        digest = source_digest(source)
+        path = self.path_for(parser, parser_version, digest)
+        if not os.path.exists(path):
+            self.misses += 1
+            return None
+        try:
+            meta, arrays = open_script_file(path)
+            if meta.get('digest') != digest:
+                raise ValueError(f'digest mismatch in {path}')
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable compiled script {path}: {e}")
+            self.errors += 1
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.bytes_mapped += os.path.getsize(path)
+        logger.info(f"Compiled script mapped from {path}")
+        return meta, arrays
+
+    def reject(self, parser, parser_version, source, error):
+        """Count a loaded entry the caller could not rebuild from as a miss, and delete it"""
+        path = self.path_for(parser, parser_version, source_digest(source))
+        logger.warning(f"Discarding compiled script {path} that could not be restored: {error}")
+        self.hits -= 1
+        self.misses += 1
+        self.errors += 1
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+    def store(self, parser, parser_version, source, meta, arrays=None):
+        """Write a compiled script for source; failures are logged and otherwise ignored"""
+        digest = source_digest(source)
+        path = self.path_for(parser, parser_version, digest)
+        meta = dict(meta, digest=digest, parser=parser, parser_version=parser_version)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            # Write beside the final name and rename, so readers never see a partial file and
+            # processes still mapping the old file keep reading it
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    write_script_file(f, meta, arrays or {})
+                os.replace(tmp_path, path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+        except (OSError, TypeError, ValueError) as e:
+            logger.warning(f"Could not write compiled script {path}: {e}")
+            self.errors += 1
+            return None
+        logger.info(f"Compiled script stored at {path}")
+        return path
+
+    def stats(self):
+        """Return the cache counters for display and logging"""
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'errors': self.errors,
+            'bytes_mapped': self.bytes_mapped,
+            'hit_rate': self.hits / lookups * 100 if lookups else 0.0
+        }
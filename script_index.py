@@ -0,0 +1,523 @@
+"""Search indexes built once per parsed script for fast real-time matching"""
+import hashlib
+import heapq
+import re
+import sys
+from array import array
+from collections import namedtuple
+from collections.abc import Mapping
+from datetime import datetime
+
+import numpy as np
+from rapidfuzz import fuzz as rapid_fuzz
+from rapidfuzz import process as rapid_process
+
+from script_cache import pack_strings, unpack_strings
+
+# Joins lowercased lines in the suffix array text so matches never span two lines
+LINE_SEPARATOR = '\x00'
+
+# Search terms that can equal a spoken word (single \w+ tokens)
+WORD_TERM = re.compile(r'\w+')
+
+# Tokenizer for line words, as in the followers' create_search_terms
+WORD_TOKEN = re.compile(r'\b\w+\b')
+
+# Lines in the first batched call while walking candidates in upper-bound order
+FUZZY_CHUNK_SIZE = 32
+
+
+def ratio_upper_bounds(phrase_length, line_lengths):
+    """Highest fuzz.ratio reachable from the string lengths alone (indel distance >= length gap)"""
+    total = phrase_length + np.asarray(line_lengths)
+    bounds = np.floor(200.0 * np.minimum(phrase_length, line_lengths) / np.maximum(total, 1) + 0.5 + 1e-7)
+    return np.where(total == 0, 100, bounds).astype(np.int64)
+
+
+if hasattr(np, 'bitwise_count'):
+    def popcount(bits):
+        """Count set bits per element of a uint64 array"""
+        return np.bitwise_count(bits)
+else:
+    POPCOUNT_TABLE = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+    def popcount(bits):
+        """Count set bits per element of a uint64 array"""
+        bits = np.ascontiguousarray(bits)
+        return POPCOUNT_TABLE[bits.view(np.uint8)].reshape(bits.shape + (8,)).sum(axis=-1)
+
+
+def top_k_lines(scores, k):
+    """Ids of the k highest positive scores, ties broken by line order, without sorting every line"""
+    if k == 1:
+        line_id = int(np.argmax(scores)) if len(scores) else 0
+        return np.array([line_id] if len(scores) and scores[line_id] > 0 else [], dtype=np.int64)
+    lines = np.flatnonzero(scores > 0)
+    if lines.size > k:
+        kth = np.partition(scores[lines], lines.size - k)[lines.size - k]
+        above = lines[scores[lines] > kth]
+        tied = lines[scores[lines] == kth][:k - above.size]
+        lines = np.concatenate([above, tied])
+    return lines[np.lexsort((lines, -scores[lines]))]
+
+
+class CandidateRanking:
+    """Per-pass scores of candidate lines, ranked by best score, then earliest pass, then line order
+
+    A later pass only outranks an earlier one with a strictly higher score,
+    and ties within a pass go to the earlier line, just like the single-best
+    cascades that keep the first line reaching the top score.
+    """
+
+    def __init__(self, passes):
+        self.passes = passes
+        self.scores = {}
+        self.leaders = []  # Cached top entries, cleared whenever a score is added
+
+    def add(self, pass_name, line_id, score):
+        """Record a line's score from one pass"""
+        pass_scores = self.scores.setdefault(line_id, dict.fromkeys(self.passes))
+        pass_scores[pass_name] = score
+        self.leaders = []
+
+    def rank_key(self, line_id):
+        """Sort key: highest score, earliest pass reaching it, lowest line id"""
+        pass_scores = self.scores[line_id]
+        best = max(score for score in pass_scores.values() if score is not None)
+        first_pass = next(i for i, name in enumerate(self.passes) if pass_scores[name] == best)
+        return -best, first_pass, line_id
+
+    def top(self, k, min_score=0):
+        """Return the k best (line_id, score, pass_name, pass_scores) tuples scoring at least min_score"""
+        if len(self.leaders) < min(k, len(self.scores)):
+            self.leaders = [(line_id,) + self.rank_key(line_id)
+                            for line_id in heapq.nsmallest(k, self.scores, key=self.rank_key)]
+        ranked = []
+        for line_id, neg_score, first_pass, _ in self.leaders[:k]:
+            if -neg_score < min_score:
+                break
+            ranked.append((line_id, -neg_score, self.passes[first_pass], self.scores[line_id]))
+        return ranked
+
+    def best_score(self):
+        """Score of the current top candidate (0 when there is none)"""
+        top = self.top(1)
+        return top[0][1] if top else 0
+
+    def kth_score(self, k):
+        """Score of the kth best candidate, or None while there are fewer than k"""
+        top = self.top(k)
+        return top[-1][1] if len(top) == k else None
+
+
+class ScriptLine(namedtuple('ScriptLine', ['text', 'lower', 'length', 'speaker', 'line_number',
+                                           'token_ids', 'keyword_ids', 'term_ids'])):
+    """One immutable parsed script line; the id arrays index ScriptIndex.words"""
+    __slots__ = ()
+
+
+class ScriptLineData(Mapping):
+    """Read-only script_data dict of one line; its search terms are rebuilt only when read"""
+
+    KEYS = ('speaker', 'response', 'keywords', 'line_number', 'timestamp', 'search_terms')
+
+    def __init__(self, index, line_id):
+        self.index = index
+        self.line_id = line_id
+        self.terms = None
+
+    def __getitem__(self, key):
+        line = self.index.lines[self.line_id]
+        if key == 'speaker':
+            return line.speaker
+        if key == 'response':
+            return line.text
+        if key == 'keywords':
+            return [self.index.words[word_id] for word_id in line.keyword_ids]
+        if key == 'line_number':
+            return line.line_number
+        if key == 'timestamp':
+            return self.index.timestamp
+        if key == 'search_terms':
+            if self.terms is None:
+                self.terms = self.index.search_terms(self.line_id)
+            return self.terms
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(self.KEYS)
+
+    def __len__(self):
+        return len(self.KEYS)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class ScriptDataView(Mapping):
+    """Read-only dict-of-dicts view of a ScriptIndex for code written against script_data dicts"""
+
+    def __init__(self, index):
+        self.index = index
+
+    def __getitem__(self, text):
+        return self.index.line_data(self.index.line_ids[text])
+
+    def __iter__(self):
+        return (line.text for line in self.index.lines)
+
+    def __len__(self):
+        return len(self.index.lines)
+
+
+class ScriptIndexBuilder:
+    """Collects parsed lines, interning their words into one shared word table"""
+
+    def __init__(self):
+        self.words = []
+        self.word_ids = {}
+        self.lines = []
+        self.positions = {}
+
+    def intern_words(self, words):
+        """Return the ids of words as a compact array, adding new words to the table"""
+        ids = array('I')
+        for word in words:
+            word_id = self.word_ids.get(word)
+            if word_id is None:
+                word_id = len(self.words)
+                word = sys.intern(word)
+                self.words.append(word)
+                self.word_ids[word] = word_id
+            ids.append(word_id)
+        return ids
+
+    def add_line(self, text, speaker, line_number, keywords, search_terms=None):
+        """Add a line; a repeated text replaces the earlier line in place, like a dict key
+
+        The line's own words are its indexed terms unless search_terms is
+        given, in which case its single-word terms are indexed instead.
+        """
+        lower = text.lower()
+        token_ids = self.intern_words(WORD_TOKEN.findall(lower))
+        if search_terms is None:
+            term_ids = array('I', sorted(set(token_ids)))
+        else:
+            term_ids = self.intern_words(sorted(set(term for term in search_terms if WORD_TERM.fullmatch(term))))
+        line = ScriptLine(text, lower, len(lower), sys.intern(speaker) if speaker else speaker,
+                          line_number, token_ids, self.intern_words(keywords), term_ids)
+        if text in self.positions:
+            self.lines[self.positions[text]] = line
+        else:
+            self.positions[text] = len(self.lines)
+            self.lines.append(line)
+
+    def build(self, source=None):
+        """Build the ScriptIndex over the collected lines"""
+        return ScriptIndex(self.lines, self.words, self.word_ids, source)
+
+
+def index_for(script_data, cached_index=None):
+    """Return the ScriptIndex behind script_data, reusing cached_index while the script is unchanged"""
+    if isinstance(script_data, ScriptDataView):
+        return script_data.index
+    if cached_index is not None and cached_index.script_data is script_data:
+        return cached_index
+    return ScriptIndex.from_script_data(script_data)
+
+
+class ScriptIndex:
+    """Immutable ScriptLine records plus precomputed lookup structures, built once per script"""
+
+    def __init__(self, lines, words, word_ids, source=None, prebuilt=None):
+        self.lines = tuple(lines)
+        self.words = words
+        self.word_ids = word_ids
+        self.line_ids = {line.text: line_id for line_id, line in enumerate(self.lines)}
+        # Structures restored from the compiled-script cache skip their build step
+        prebuilt = prebuilt or {}
+        self.timestamp = prebuilt.get('timestamp') or datetime.now().isoformat()
+        self.content_hash = prebuilt.get('content_hash') or self.build_content_hash()
+        # Plain dicts the index was built from are kept so lookups return their original entries
+        self.script_data = source if source is not None else ScriptDataView(self)
+
+        self.speakers = {line.speaker for line in self.lines}
+        self.lower_lines = [line.lower for line in self.lines]
+        self.line_lengths = np.array([line.length for line in self.lines], dtype=np.int64)
+        if 'posting_offsets' in prebuilt:
+            self.posting_offsets, self.posting_lines = prebuilt['posting_offsets'], prebuilt['posting_lines']
+        else:
+            self.posting_offsets, self.posting_lines = self.build_postings(self.lines, len(words))
+        if 'term_bits' in prebuilt:
+            self.vocabulary, self.term_bits = self.build_vocabulary(), prebuilt['term_bits']
+        else:
+            self.vocabulary, self.term_bits = self.build_term_bitsets()
+
+        # Suffix array over all lowercased lines for substring lookups
+        self.text = LINE_SEPARATOR.join(self.lower_lines)
+        self.line_starts = np.cumsum([0] + [len(line) + 1 for line in self.lower_lines[:-1]])
+        if 'suffix_array' in prebuilt:
+            self.suffix_array = prebuilt['suffix_array']
+        else:
+            self.suffix_array = self.build_suffix_array(self.text)
+
+    @classmethod
+    def from_script_data(cls, script_data):
+        """Build an index over a plain script_data dict (sample scripts and older parsers)"""
+        builder = ScriptIndexBuilder()
+        for text, data in script_data.items():
+            builder.add_line(text, data.get('speaker'), data.get('line_number'),
+                             data.get('keywords', []), data.get('search_terms', []))
+        return builder.build(source=script_data)
+
+    @classmethod
+    def from_payload(cls, meta, arrays):
+        """Rebuild an index from to_payload() output without re-parsing or re-sorting anything
+
+        The postings, bitsets, suffix array and per-line id arrays stay views
+        of the given arrays (of a mapped compiled-script file, usually); each
+        line's ids are a read-only memoryview slice. Words, speakers and line
+        texts are decoded into Python strings, and the lines, lookup dicts and
+        joined text are rebuilt, so this still takes time and private memory
+        in proportion to the number of lines.
+        """
+        words = [sys.intern(word) for word in unpack_strings(arrays['words'], arrays['word_offsets'])]
+        word_ids = {word: word_id for word_id, word in enumerate(words)}
+        id_lists = {}
+        for field in ('token_ids', 'keyword_ids', 'term_ids'):
+            ids, bounds = memoryview(arrays[field]), arrays[field + '_offsets'].tolist()
+            id_lists[field] = [ids[start:stop] for start, stop in zip(bounds, bounds[1:])]
+        speakers = [sys.intern(speaker) for speaker in unpack_strings(arrays['speakers'], arrays['speaker_offsets'])]
+        texts = unpack_strings(arrays['line_texts'], arrays['line_text_offsets'])
+        lines = []
+        for line_id, (text, speaker_id, line_number) in enumerate(zip(texts, arrays['speaker_ids'].tolist(),
+                                                                      arrays['line_numbers'].tolist())):
+            lower = text.lower()
+            lines.append(ScriptLine(text, lower, len(lower), speakers[speaker_id] if speaker_id >= 0 else None,
+                                    line_number if line_number >= 0 else None,
+                                    id_lists['token_ids'][line_id], id_lists['keyword_ids'][line_id],
+                                    id_lists['term_ids'][line_id]))
+        prebuilt = {name: arrays[name] for name in ('posting_offsets', 'posting_lines', 'term_bits', 'suffix_array')}
+        prebuilt['timestamp'] = meta['timestamp']
+        prebuilt['content_hash'] = meta['content_hash']
+        return cls(lines, words, word_ids, prebuilt=prebuilt)
+
+    def to_payload(self):
+        """JSON header and numpy arrays holding everything needed to rebuild this index
+
+        Strings go into string tables rather than the header, so the header
+        stays small whatever the size of the script. Speakers and line
+        numbers that are None are stored as -1.
+        """
+        meta = {
+            'timestamp': self.timestamp,
+            'content_hash': self.content_hash
+        }
+        speakers = sorted({line.speaker for line in self.lines if line.speaker is not None})
+        speaker_ids = {speaker: speaker_id for speaker_id, speaker in enumerate(speakers)}
+        arrays = {
+            'posting_offsets': self.posting_offsets,
+            'posting_lines': self.posting_lines,
+            'term_bits': self.term_bits,
+            'suffix_array': self.suffix_array,
+            'speaker_ids': np.array([speaker_ids.get(line.speaker, -1) for line in self.lines], dtype=np.int32),
+            'line_numbers': np.array([-1 if line.line_number is None else line.line_number for line in self.lines],
+                                     dtype=np.int64)
+        }
+        arrays['words'], arrays['word_offsets'] = pack_strings(self.words)
+        arrays['speakers'], arrays['speaker_offsets'] = pack_strings(speakers)
+        arrays['line_texts'], arrays['line_text_offsets'] = pack_strings([line.text for line in self.lines])
+        for field in ('token_ids', 'keyword_ids', 'term_ids'):
+            id_lists = [getattr(line, field) for line in self.lines]
+            arrays[field] = np.concatenate([np.frombuffer(ids, dtype=np.uint32) for ids in id_lists]
+                                           or [np.zeros(0, dtype=np.uint32)])
+            arrays[field + '_offsets'] = np.cumsum([0] + [len(ids) for ids in id_lists], dtype=np.int64)
+        return meta, arrays
+
+    def __len__(self):
+        return len(self.lines)
+
+    def build_content_hash(self):
+        """Hash the lines and word table so caches are keyed by script content, not object identity"""
+        digest = hashlib.sha1()
+        for line in self.lines:
+            digest.update(repr((line.text, line.speaker, line.line_number, line.token_ids,
+                                line.keyword_ids, line.term_ids)).encode('utf-8'))
+        digest.update(LINE_SEPARATOR.join(self.words).encode('utf-8'))
+        return digest.hexdigest()
+
+    @staticmethod
+    def build_postings(lines, word_count):
+        """Build the inverted index as CSR arrays: lines of word w are posting_lines[offsets[w]:offsets[w + 1]]"""
+        term_ids = np.concatenate([np.frombuffer(line.term_ids, dtype=np.uint32) for line in lines]
+                                  or [np.zeros(0, dtype=np.uint32)])
+        line_ids = np.repeat(np.arange(len(lines), dtype=np.int32), [len(line.term_ids) for line in lines])
+        order = np.argsort(term_ids, kind='stable')  # Stable keeps each posting list in line order
+        offsets = np.zeros(word_count + 1, dtype=np.int64)
+        np.cumsum(np.bincount(term_ids, minlength=word_count), out=offsets[1:])
+        return offsets, line_ids[order]
+
+    def postings(self, word):
+        """Return the ascending ids of lines having word among their search terms"""
+        word_id = self.word_ids.get(word)
+        if word_id is None:
+            return self.posting_lines[:0]
+        return self.posting_lines[self.posting_offsets[word_id]:self.posting_offsets[word_id + 1]]
+
+    def build_vocabulary(self):
+        """Map each word that is some line's search term to its bitset column, in sorted order"""
+        counts = np.diff(self.posting_offsets)
+        words = sorted(word for word_id, word in enumerate(self.words) if counts[word_id])
+        return {word: column for column, word in enumerate(words)}
+
+    def build_term_bitsets(self):
+        """Pack each line's single-word terms into a row of a uint64 bitset matrix"""
+        vocabulary = self.build_vocabulary()
+        term_bits = np.zeros((len(self.lines), (len(vocabulary) + 63) // 64), dtype=np.uint64)
+        for word, column in vocabulary.items():
+            term_bits[self.postings(word), column >> 6] |= np.uint64(1 << (column & 63))
+        return vocabulary, term_bits
+
+    @staticmethod
+    def build_suffix_array(text):
+        """Build a suffix array by prefix doubling over the text's code points"""
+        n = len(text)
+        if n == 0:
+            return np.zeros(0, dtype=np.int32)
+        rank = np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32).astype(np.int64)
+        suffix_array = np.argsort(rank, kind='stable')
+        k = 1
+        while True:
+            # Rank suffixes by their first 2k characters using the ranks of the first k
+            second = np.full(n, -1, dtype=np.int64)
+            second[:n - k] = rank[k:]
+            suffix_array = np.lexsort((second, rank))
+            first_sorted = rank[suffix_array]
+            second_sorted = second[suffix_array]
+            changed = np.ones(n, dtype=bool)
+            changed[1:] = (first_sorted[1:] != first_sorted[:-1]) | (second_sorted[1:] != second_sorted[:-1])
+            new_rank = np.cumsum(changed) - 1
+            rank = np.empty(n, dtype=np.int64)
+            rank[suffix_array] = new_rank
+            if new_rank[-1] == n - 1 or k >= n:
+                break
+            k *= 2
+        return suffix_array.astype(np.int32 if n < 2 ** 31 else np.int64)
+
+    def suffix_bound(self, phrase, upper):
+        """Binary search the suffix array for the first suffix whose prefix is >= (or > when upper) the phrase"""
+        text = self.text
+        suffix_array = self.suffix_array
+        m = len(phrase)
+        lo, hi = 0, len(suffix_array)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start = int(suffix_array[mid])
+            prefix = text[start:start + m]
+            if prefix < phrase or (upper and prefix == phrase):
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def lines_containing(self, phrase):
+        """Return ascending ids of lines whose lowercased text contains the phrase"""
+        if not phrase or LINE_SEPARATOR in phrase:
+            return [line_id for line_id, line in enumerate(self.lower_lines) if phrase in line]
+        lo = self.suffix_bound(phrase, upper=False)
+        hi = self.suffix_bound(phrase, upper=True)
+        if lo >= hi:
+            return []
+        line_ids = np.searchsorted(self.line_starts, self.suffix_array[lo:hi], side='right') - 1
+        return np.unique(line_ids).tolist()
+
+    def term_overlap_counts(self, spoken_words):
+        """Count the search terms each line shares with the spoken words (vectorized AND + popcount)"""
+        columns = np.array([self.vocabulary[word] for word in spoken_words if word in self.vocabulary], dtype=np.int64)
+        if columns.size == 0:
+            return np.zeros(len(self.lines), dtype=np.int64)
+        query = np.zeros(self.term_bits.shape[1], dtype=np.uint64)
+        np.bitwise_or.at(query, columns >> 6, np.left_shift(np.uint64(1), (columns & 63).astype(np.uint64)))
+        touched = np.flatnonzero(query)
+        return popcount(self.term_bits[:, touched] & query[touched]).sum(axis=1, dtype=np.int64)
+
+    def fuzzy_scores(self, spoken_phrases, line_ids=None, min_score=0):
+        """Score phrases against lines in one vectorized call, returning an int array (phrases x lines)
+
+        Scores equal fuzz.ratio(phrase, script_line.lower()): the same indel
+        similarity, computed in float64 and rounded half-to-even like fuzzywuzzy.
+        """
+        if isinstance(spoken_phrases, str):
+            spoken_phrases = [spoken_phrases]
+        choices = self.lower_lines if line_ids is None else [self.lower_lines[i] for i in line_ids]
+        if not choices:
+            return np.zeros((len(spoken_phrases), 0), dtype=np.int64)
+        # Scores below the cutoff come back as 0; keep it a point low so rounding is unaffected
+        scores = rapid_process.cdist(spoken_phrases, choices, scorer=rapid_fuzz.ratio,
+                                     dtype=np.float64, score_cutoff=max(0, min_score - 1))
+        return np.rint(scores).astype(np.int64)
+
+    def top_fuzzy_lines(self, spoken_phrase, k, min_score, budget=None):
+        """Return up to k (line_id, score) pairs with the top fuzzy scores >= min_score, best first
+
+        Same result as scoring every line, but lines are visited by their
+        length-only upper bound: lines that cannot reach min_score (or the kth
+        best score found so far) are never scored, and the search stops once no
+        remaining line can beat or tie the kth best. With a MatchBudget the
+        search also stops between chunks once the budget has run out.
+        """
+        bounds = ratio_upper_bounds(len(spoken_phrase), self.line_lengths)
+        candidates = np.flatnonzero(bounds >= min_score)
+        if candidates.size == 0 or k < 1:
+            return []
+        # Highest bound first, line order within a bound so ties resolve like a full scan
+        order = candidates[np.argsort(-bounds[candidates], kind='stable')]
+        top = []  # Min-heap of (score, -line_id): top[0] is the kth best so far
+        start, chunk_size = 0, FUZZY_CHUNK_SIZE
+        while start < order.size:
+            if len(top) == k:
+                # Stop once nothing left can beat or tie the kth best (this includes perfect scores)
+                kth_score, kth_line = top[0][0], -top[0][1]
+                next_line = order[start]
+                next_bound = bounds[next_line]
+                if next_bound < kth_score or (next_bound == kth_score and next_line > kth_line):
+                    break
+            if budget is not None and budget.expired():
+                budget.interrupt()
+                break
+            cutoff = max(min_score, top[0][0]) if len(top) == k else min_score
+            chunk = order[start:start + chunk_size]
+            scores = self.fuzzy_scores(spoken_phrase, chunk, min_score=cutoff)[0]
+            for position in np.flatnonzero(scores >= cutoff):
+                item = (int(scores[position]), -int(chunk[position]))
+                if len(top) < k:
+                    heapq.heappush(top, item)
+                elif item > top[0]:
+                    heapq.heapreplace(top, item)
+            # Small first chunks give an early kth best to prune against; later chunks grow to amortize calls
+            start += chunk_size
+            chunk_size *= 2
+        return [(-neg_line, score) for score, neg_line in sorted(top, reverse=True)]
+
+    def best_fuzzy_line(self, spoken_phrase, min_score):
+        """Return (line_id, score) of the first line with the top fuzzy score, if it reaches min_score"""
+        top = self.top_fuzzy_lines(spoken_phrase, 1, min_score)
+        return top[0] if top else (None, 0)
+
+    def line_data(self, line_id):
+        """The legacy script_data dict for a line, built on demand"""
+        return ScriptLineData(self, line_id)
+
+    def search_terms(self, line_id):
+        """Rebuild a line's search terms (full text plus 1-3 word phrases) from its token ids"""
+        line = self.lines[line_id]
+        words = [self.words[word_id] for word_id in line.token_ids]
+        terms = {line.lower}
+        for n in (1, 2, 3):
+            terms.update(' '.join(words[i:i + n]) for i in range(len(words) - n + 1))
+        return list(terms)
+
+    def entry(self, line_id):
+        """Return the (script_line, data) pair for a line id"""
+        text = self.lines[line_id].text
+        return text, self.script_data[text]
@@ -0,0 +1,39 @@
+"""Streaming script ingestion: page texts to lines to speaker blocks, without joining the whole script"""
+import re
+
+# A line in capitals, optionally ending in a colon, names the speaker of the lines after it
+SPEAKER_LINE = re.compile(r'^[A-Z][A-Z\s]+:')
+SPEAKER_ONLY_LINE = re.compile(r'^[A-Z][A-Z\s]+$')
+
+
+def iter_text_lines(page_texts):
+    """Yield the lines of page texts as if they were joined with a newline after each page and split"""
+    for page_text in page_texts:
+        yield from page_text.split('\n')
+    yield ''
+
+
+def iter_speaker_blocks(lines):
+    """Group script lines into (speaker, text, line_number) blocks as they stream in
+
+    text is the block's lines each prefixed with a space, as the parsers have
+    always built it, and line_number counts non-blank lines up to the block's
+    last one.
+    """
+    current_speaker = None
+    parts = []
+    line_number = 0
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        line_number += 1
+        if SPEAKER_LINE.match(line) or SPEAKER_ONLY_LINE.match(line):
+            if current_speaker and parts:
+                yield current_speaker, ''.join(parts), line_number - 1
+            current_speaker = line.replace(':', '').strip()
+            parts = []
+        else:
+            parts.append(' ' + line)
+    if current_speaker and parts:
+        yield current_speaker, ''.join(parts), line_number
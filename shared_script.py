@@ -0,0 +1,32 @@
+"""Script state loaded once per process and shared read-only by every session's follower"""
+from conversation_graph import graph_for
+from match_cache import FlowVersion, flow_content_hash
+from script_index import index_for
+
+
+class SharedScript:
+    """A parsed script with its search index or conversation graph, built once and never mutated
+
+    Each app caches one instance per process with st.cache_resource and hands
+    it to every session's follower, so a new operator costs only the
+    follower's own position, buffers, context and history. The only writes
+    after construction are the graph's pure lookup memos.
+    """
+
+    def __init__(self, script_data=None, conversation_flow=None, conversation_graph=None):
+        self.script_data = script_data
+        self.search_index = index_for(script_data) if script_data else None
+        self.conversation_flow = conversation_flow
+        self.conversation_graph = graph_for(conversation_flow, conversation_graph) if conversation_flow else None
+        self.flow_hash = flow_content_hash(conversation_flow) if conversation_flow else None
+
+    @classmethod
+    def of(cls, script_follower):
+        """Take the script a freshly constructed follower has loaded, with the graph it restored or built"""
+        return cls(script_data=getattr(script_follower, 'script_data', None) or None,
+                   conversation_flow=getattr(script_follower, 'conversation_flow', None) or None,
+                   conversation_graph=getattr(script_follower, 'conversation_graph', None))
+
+    def flow_version(self):
+        """A follower's own FlowVersion, seeded with the shared flow's hash"""
+        return FlowVersion(self.conversation_flow, self.flow_hash)
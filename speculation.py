@@ -0,0 +1,105 @@
+"""Speculative warming of the questions a conversation is likely to reach next"""
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+def candidate_ids(graph, position, answered_id=None):
+    """Questions the next utterance is likely to concern: the current one, then where the answered one leads"""
+    anchor = answered_id if answered_id is not None else position
+    ids = [position]
+    for node_id in graph.successors(anchor) + (anchor + 1,):
+        if node_id not in ids:
+            ids.append(node_id)
+    return [node_id for node_id in ids if 0 <= node_id < len(graph)]
+
+
+class SpeculativeWarmer:
+    """Precompute matcher state for the likely next questions after each match
+
+    For every candidate question the warmer resolves its rule table and
+    question window and runs the question's scripted answers through the
+    follower, storing the results (with their rendered guidance) in the
+    follower's match cache. A follow-up utterance that repeats a scripted
+    answer is then a cache hit. Work runs on a daemon thread, matching on a
+    copy of the follower and taking its match lock only to take that copy
+    and to store results, and stops as soon as a newer utterance arrives.
+    """
+
+    def __init__(self, script_follower, background=True):
+        self.script_follower = script_follower
+        self.background = background
+        self.generation = 0
+        self.thread = None
+        # Guards keys, so a superseded run can never add to the set of a newer one
+        self.lock = threading.Lock()
+        self.keys = set()
+        self.runs = 0
+        self.cancelled = 0
+        self.nodes_warmed = 0
+        self.matches_precomputed = 0
+        self.lookups = 0
+        self.hits = 0
+
+    def cancel(self):
+        """Stop any warming in progress; called before a new utterance is matched"""
+        self.generation += 1
+
+    def schedule(self, answered_id=None):
+        """Warm the questions reachable from the follower's current position"""
+        with self.lock:
+            self.cancel()
+            self.keys = set()
+            generation = self.generation
+        graph = self.script_follower.get_conversation_graph()
+        node_ids = candidate_ids(graph, self.script_follower.current_position, answered_id)
+        if not node_ids:
+            return
+        self.runs += 1
+        if self.background:
+            self.thread = threading.Thread(target=self.warm, args=(generation, node_ids), daemon=True)
+            self.thread.start()
+        else:
+            self.warm(generation, node_ids)
+
+    def wait(self, timeout=None):
+        """Block until the latest warming run has finished"""
+        if self.thread is not None:
+            self.thread.join(timeout)
+
+    def warm(self, generation, node_ids):
+        """Warm each candidate question until a newer utterance supersedes this run"""
+        for node_id in node_ids:
+            for spoken_text in self.script_follower.warm_question(node_id):
+                if generation != self.generation:
+                    self.cancelled += 1
+                    return
+                key, computed = self.script_follower.warm_match(spoken_text, node_id, generation)
+                with self.lock:
+                    if key is None or generation != self.generation:
+                        self.cancelled += 1
+                        return
+                    self.keys.add(key)
+                if computed:
+                    self.matches_precomputed += 1
+            self.nodes_warmed += 1
+        logger.info(f"Warmed questions {node_ids}")
+
+    def record_lookup(self, key, found):
+        """Count whether a match lookup was answered from a speculated entry"""
+        with self.lock:
+            self.lookups += 1
+            if found and key in self.keys:
+                self.hits += 1
+
+    def stats(self):
+        """Return the speculation counters for display and logging"""
+        return {
+            'runs': self.runs,
+            'cancelled': self.cancelled,
+            'nodes_warmed': self.nodes_warmed,
+            'matches_precomputed': self.matches_precomputed,
+            'hits': self.hits,
+            'hit_rate': self.hits / self.lookups * 100 if self.lookups else 0.0
+        }
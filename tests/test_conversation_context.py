@@ -0,0 +1,62 @@
+import pytest
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app_evangelism_enhanced import EnhancedEvangelismScriptFollower
+from conversation_context import context_delta, context_snapshot
+
+class TestConversationContext:
+    """Test suite for the bounded conversation context"""
+
+    @pytest.fixture
+    def script_follower(self):
+        """Create an enhanced script follower"""
+        return EnhancedEvangelismScriptFollower()
+
+    def test_repeated_beliefs_only_bump_counters(self, script_follower):
+        """Test that mentioning a belief again keeps one entry with its count and first/last turn"""
+        for text in ['i believe in heaven', 'heaven and god', 'maybe', 'heaven']:
+            script_follower.update_conversation_context(text)
+        beliefs = script_follower.conversation_context['beliefs']
+        assert list(beliefs) == ['heaven', 'god']
+        assert beliefs.to_dict()['heaven'] == {'count': 3, 'first_seen': 1, 'last_seen': 4}
+        assert beliefs.count('god') == 1 and 'hell' not in beliefs
+
+    def test_log_records_only_context_changes(self, script_follower):
+        """Test that each logged interaction carries just the context entries that changed"""
+        script_follower.update_conversation_context('heaven and god')
+        first = script_follower.context_changes()
+        assert set(first['beliefs']) == {'heaven', 'god'}
+        script_follower.update_conversation_context('heaven, my name is john')
+        second = script_follower.context_changes()
+        assert second['person_name'] == 'John'
+        assert list(second['beliefs']) == ['heaven']
+        assert 'script_progress' not in second
+        assert context_delta(context_snapshot(script_follower.conversation_context), script_follower.logged_context) == {}
+
+    def test_rewind_restores_position_context_and_history(self, script_follower):
+        """Test stepping back one and several turns after mis-advances"""
+        script_follower.process_audio_text('heaven and god')
+        after_first = (script_follower.current_position, list(script_follower.conversation_context['beliefs']))
+        script_follower.process_audio_text('jesus')
+        script_follower.process_audio_text('yes')
+        assert len(script_follower.response_history) == 3
+        assert script_follower.rewind() == 1
+        assert len(script_follower.response_history) == 2
+        assert script_follower.rewind() == 1
+        assert (script_follower.current_position, list(script_follower.conversation_context['beliefs'])) == after_first
+        assert script_follower.rewind(5) == 1
+        assert script_follower.current_position == 0
+        assert len(script_follower.conversation_context['beliefs']) == 0
+        assert len(script_follower.response_history) == 0
+        assert script_follower.rewind() == 0
+
+    def test_checkpoints_share_unchanged_beliefs(self, script_follower):
+        """Test that checkpoints reuse the frozen beliefs until a new mention"""
+        script_follower.process_audio_text('heaven')
+        script_follower.process_audio_text('yes')
+        script_follower.process_audio_text('no')
+        checkpoints = script_follower.checkpoints.checkpoints
+        assert checkpoints[1].beliefs is checkpoints[2].beliefs
+        assert checkpoints[0].beliefs is not checkpoints[1].beliefs
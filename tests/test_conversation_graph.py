@@ -0,0 +1,71 @@
+import pytest
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app_evangelism_enhanced import EnhancedEvangelismScriptFollower
+from conversation_graph import ConversationGraph
+
+FLOW = [
+    {'question': '1. What happens after we die?', 'question_number': 1,
+     'guidance': ['If they are not sure, skip question 2.'], 'next_questions': [2]},
+    {'question': "2. Do you believe there's a God?", 'question_number': 2,
+     'guidance': ['Proceed to Q4 when they agree.']},
+    {'question': '3. Use the building analogy', 'question_number': 3, 'guidance': []},
+    {'question': '4. Have you ever told a lie?', 'question_number': 4, 'guidance': ['Go to Q2 if unsure.']},
+]
+
+class TestConversationGraph:
+    """Test suite for the compiled conversation graph"""
+
+    @pytest.fixture
+    def graph(self):
+        """Compile the small sample flow"""
+        return ConversationGraph(FLOW)
+
+    def test_lookups_by_text_and_number(self, graph):
+        """Test that questions resolve by exact text, building analogy and qN reference"""
+        assert graph.text_ids['4. Have you ever told a lie?'] == 3
+        assert graph.resolve("2. Do you believe there's a God?") == 1
+        assert graph.resolve('Explain the building analogy to them') == 2
+        assert graph.resolve('Move on to Q4') == 3
+        assert graph.resolve('Move on') is None
+        assert graph.first_match('Back to q1') == 0
+
+    def test_edges_from_next_questions_and_guidance(self, graph):
+        """Test that edges merge next_questions with proceed/skip/go to directives"""
+        assert graph.nodes[0].directives == (3,)
+        assert graph.successors(0) == (1, 2)
+        assert graph.successors(1) == (3,)
+        assert graph.successors(2) == ()
+        assert graph.successors(3) == (1,)
+
+    def test_follower_recompiles_replaced_flow(self):
+        """Test that the follower reuses its graph until the flow is replaced"""
+        follower = EnhancedEvangelismScriptFollower()
+        graph = follower.get_conversation_graph()
+        assert follower.get_conversation_graph() is graph
+        follower.conversation_flow = FLOW
+        assert follower.get_conversation_graph() is not graph
+        follower.update_position_from_match({'next_question': 'Ask q3 next'})
+        assert follower.current_position == 2
+
+    def test_window_ids_cover_neighbours_and_successors(self, graph):
+        """Test that the window holds nearby questions plus the graph's next questions"""
+        assert graph.window_ids(0, 0) == [0, 1, 2]
+        assert graph.window_ids(3, 1) == [1, 2, 3]
+        assert graph.window_ids(1, 0) == [1, 3]
+
+    def test_asked_question_found_in_window_before_whole_flow(self):
+        """Test that nearby questions are scored first and the whole flow only when none clears"""
+        follower = EnhancedEvangelismScriptFollower()
+        follower.question_window = 0
+        follower.confidence_threshold = 60
+        follower.current_position = 3
+        node_id, ratio = follower.find_asked_question('have you ever told a lie')
+        assert node_id == 3 and ratio > follower.confidence_threshold
+        assert follower.find_asked_question("do you believe there's a god")[0] == 1
+        assert follower.find_asked_question('zzzz') is None
+        stats = follower.question_window_stats.stats()
+        assert (stats['window_hits'], stats['global_hits'], stats['misses']) == (1, 1, 1)
+        assert stats['questions_per_lookup'] < len(follower.conversation_flow)
@@ -0,0 +1,40 @@
+import pytest
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from keyword_automaton import KeywordAutomaton
+
+class TestKeywordAutomaton:
+    """Test suite for the multi-keyword automaton"""
+
+    @pytest.fixture
+    def automaton(self):
+        """Compile overlapping keyword groups"""
+        return KeywordAutomaton({
+            'no': ['no', 'nope'],
+            'unsure': ['not sure', 'dont know'],
+            'deity': ['god', 'lord'],
+            'statement': ['believe in god']
+        })
+
+    def test_groups_match_substring_checks(self, automaton):
+        """Test that group hits equal one substring check per keyword"""
+        groups = {
+            'no': ['no', 'nope'], 'unsure': ['not sure', 'dont know'],
+            'deity': ['god', 'lord'], 'statement': ['believe in god']
+        }
+        for text in ['i dont know', 'nope', 'i believe in god', 'i am not sure', 'lordy', 'yes', '']:
+            expected = {group for group, keywords in groups.items() if any(keyword in text for keyword in keywords)}
+            assert automaton.groups_in(text) == expected
+
+    def test_hits_report_positions_and_word_boundaries(self, automaton):
+        """Test that every overlapping hit is reported with its span and whole-word flag"""
+        hits = automaton.hits('i dont know god')
+        assert [(hit.keyword, hit.start, hit.end, hit.whole_word) for hit in hits] == [
+            ('no', 8, 10, False),
+            ('dont know', 2, 11, True),
+            ('god', 12, 15, True)
+        ]
+        assert hits[0].groups == ('no',)
+        assert automaton.groups_in('i dont know god', whole_words=True) == {'unsure', 'deity'}
@@ -0,0 +1,77 @@
+import pytest
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app_evangelism_enhanced import EnhancedEvangelismScriptFollower
+from app_optimized import OptimizedScriptFollower
+from match_cache import MatchCache
+
+class TestMatchCache:
+    """Test suite for the LRU match-result cache"""
+
+    @pytest.fixture
+    def script_follower(self):
+        """Create an optimized script follower with the sample script"""
+        follower = OptimizedScriptFollower()
+        follower.script_data = follower.create_sample_script()
+        return follower
+
+    def test_lru_eviction_and_counters(self):
+        """Test that the least recently used entry is evicted and counted"""
+        cache = MatchCache(max_size=2)
+        cache.store('yes', 1)
+        cache.store('no', 2)
+        assert cache.lookup('yes') == (True, 1)
+        cache.store('not sure', 3)
+        assert cache.lookup('no') == (False, None)
+        assert cache.lookup('not sure') == (True, 3)
+        assert cache.stats()['hits'] == 2
+        assert cache.stats()['misses'] == 1
+        assert cache.stats()['evictions'] == 1
+        assert len(cache) == 2
+
+    def test_repeated_phrase_served_from_cache(self, script_follower):
+        """Test that a repeated phrase returns the same match without re-running the matcher"""
+        first = script_follower.find_best_match_fast('do you believe in god')
+        assert script_follower.find_best_match_fast('Do you believe in God') == first
+        assert script_follower.match_cache.stats()['hits'] == 1
+        script_follower.confidence_threshold = 95
+        script_follower.find_best_match_fast('do you believe in god')
+        assert script_follower.match_cache.stats()['misses'] == 2
+
+    def test_replacing_script_invalidates_cache(self, script_follower):
+        """Test that a new script is matched afresh while an identical reload keeps its entries"""
+        script_follower.find_best_match_fast('hello how are you')
+        script_follower.script_data = script_follower.parse_script_text("PASTOR:\nHello, how are you?\n")
+        match = script_follower.find_best_match_fast('hello how are you')
+        assert match[0] == 'Hello, how are you?'
+        assert script_follower.match_cache.stats()['hits'] == 0
+        script_follower.script_data = script_follower.parse_script_text("PASTOR:\nHello, how are you?\n")
+        assert script_follower.find_best_match_fast('hello how are you')[0] == 'Hello, how are you?'
+        assert script_follower.match_cache.stats()['hits'] == 1
+
+    def test_cached_evangelism_match_replays_position(self):
+        """Test that a cache hit moves the conversation to the same question as the first match"""
+        follower = EnhancedEvangelismScriptFollower()
+        first = follower.find_best_match_enhanced('not sure')
+        position = follower.current_position
+        follower.current_position = 0
+        second = follower.find_best_match_enhanced('not sure')
+        assert follower.current_position == position
+        assert second['matched_response'] == first['matched_response']
+        assert follower.match_cache.stats()['hits'] == 1
+
+    def test_cache_hits_are_private_copies_of_the_same_shape(self):
+        """Test that a hit has the keys of the computed match and callers cannot change the cached entry"""
+        follower = EnhancedEvangelismScriptFollower()
+        first = follower.find_best_match_enhanced('not sure')
+        assert 'timestamp' not in first['context_update']
+        first['guidance'].append('changed by the caller')
+        first['context_update']['beliefs'].append('changed by the caller')
+        follower.current_position = 0
+        second = follower.find_best_match_enhanced('not sure')
+        assert follower.match_cache.stats()['hits'] == 1
+        assert set(second) == set(first) and set(second['context_update']) == set(first['context_update'])
+        assert 'changed by the caller' not in second['guidance']
+        assert 'changed by the caller' not in second['context_update']['beliefs']
@@ -0,0 +1,60 @@
+import pytest
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import io
+
+import PyPDF2
+
+import pdf_loader
+from pdf_loader import PARALLEL_MIN_PAGES, configured_workers, extract_pdf_text, iter_pdf_lines, iter_pdf_pages, page_ranges
+
+SCRIPT_PDF = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'needgodscript.pdf')
+
+class TestPdfLoader:
+    """Test suite for parallel PDF text extraction"""
+
+    @pytest.fixture
+    def large_pdf(self):
+        """Repeat the script's pages into a PDF big enough to use the pool"""
+        reader = PyPDF2.PdfReader(SCRIPT_PDF)
+        writer = PyPDF2.PdfWriter()
+        while len(writer.pages) < PARALLEL_MIN_PAGES:
+            for page in reader.pages:
+                writer.add_page(page)
+        buffer = io.BytesIO()
+        writer.write(buffer)
+        return buffer.getvalue()
+
+    def test_page_ranges_cover_every_page_in_order(self):
+        """Test that ranges are contiguous, bounded in size and never empty"""
+        assert page_ranges(10, 4) == [(0, 4), (4, 8), (8, 10)]
+        assert page_ranges(2, 8) == [(0, 2)]
+        assert page_ranges(0, 4) == []
+
+    def test_worker_setting_falls_back_to_cpu_count(self):
+        """Test that an unset, empty or malformed worker setting never breaks the import"""
+        cpus = os.cpu_count() or 1
+        assert configured_workers(None) == configured_workers('') == configured_workers('four') == cpus
+        assert configured_workers('3') == 3
+        assert configured_workers('0') == configured_workers('-2') == 1
+
+    def test_parallel_text_matches_serial(self, large_pdf):
+        """Test that pages extracted by the pool are reassembled in page order"""
+        serial = extract_pdf_text(large_pdf, workers=1)
+        assert extract_pdf_text(large_pdf, workers=2) == serial
+        assert extract_pdf_text(io.BytesIO(large_pdf), workers=1) == serial
+
+    def test_pool_failure_resumes_serially(self, large_pdf, monkeypatch):
+        """Test that a pool failing part way through still yields every page once, in order"""
+        serial_pages = list(iter_pdf_pages(large_pdf, workers=1))
+        def broken_pool(source, page_count, workers):
+            yield from serial_pages[:5]
+            raise OSError('worker process died')
+        monkeypatch.setattr(pdf_loader, 'iter_pages_parallel', broken_pool)
+        assert list(iter_pdf_pages(large_pdf, workers=4)) == serial_pages
+
+    def test_lines_stream_like_splitting_the_text(self, large_pdf):
+        """Test that streamed lines equal the joined text split on newlines"""
+        assert list(iter_pdf_lines(large_pdf, workers=1)) == extract_pdf_text(large_pdf, workers=1).split('\n')
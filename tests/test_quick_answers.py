@@ -0,0 +1,55 @@
+import pytest
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app_evangelism import EvangelismScriptFollower
+from app_cloud import QuickAnswerTable, apply_quick_answer, get_suggested_answers, quick_answer_table, shared_quick_answers
+from shared_script import SharedScript
+
+class TestQuickAnswers:
+    """Test suite for the precomputed quick-answer table"""
+
+    @pytest.fixture
+    def script_follower(self):
+        """Create a basic script follower"""
+        return EvangelismScriptFollower()
+
+    def test_table_holds_suggestions_for_every_question(self, script_follower):
+        """Test that suggestions are computed once per question at load"""
+        table = QuickAnswerTable(script_follower)
+        flow = script_follower.conversation_flow
+        assert len(table.suggestions) == len(flow)
+        assert table.answers_for(0) == get_suggested_answers(flow[0]['question'])
+        assert table.answers_for(len(flow)) == []
+        assert quick_answer_table(script_follower, table) is table
+        script_follower.confidence_threshold += 5
+        assert quick_answer_table(script_follower, table) is not table
+
+    def test_shared_table_serves_followers_of_the_shared_script(self, script_follower):
+        """Test that the shared table is built on its own follower and each session keeps a table it rebuilt"""
+        script = SharedScript.of(script_follower)
+        first, second = EvangelismScriptFollower(script), EvangelismScriptFollower(script)
+        shared = shared_quick_answers(script, script.flow_hash, first.confidence_threshold, first.question_window)
+        assert quick_answer_table(first, None, shared) is shared
+        assert quick_answer_table(second, None, shared) is shared
+        second.confidence_threshold += 5
+        own = quick_answer_table(second, None, shared)
+        assert own is not shared
+        assert quick_answer_table(second, own, shared) is own
+
+    def test_quick_answer_matches_processing_the_text(self, script_follower):
+        """Test that a precomputed transition gives the same match, position and history as matching"""
+        table = QuickAnswerTable(script_follower)
+        expected_follower = EvangelismScriptFollower()
+        for answer in table.answers_for(0)[:3]:
+            for follower in (script_follower, expected_follower):
+                follower.current_position = 0
+            expected = expected_follower.process_audio_text(answer)
+            response = apply_quick_answer(script_follower, table, answer)
+            assert (response is None) == (expected is None)
+            if expected:
+                assert response['next_question'] == expected['next_question']
+                assert response['guidance'] == expected['guidance']
+            assert script_follower.current_position == expected_follower.current_position
+        assert len(script_follower.response_history) == len(expected_follower.response_history)
@@ -0,0 +1,50 @@
+import pytest
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app_cloud import history_summary
+from app_evangelism_enhanced import EnhancedEvangelismScriptFollower
+
+class TestResponseHistory:
+    """Test suite for the compact response history"""
+
+    @pytest.fixture
+    def script_follower(self):
+        """Create an enhanced script follower"""
+        return EnhancedEvangelismScriptFollower()
+
+    def test_entries_resolve_to_full_responses(self, script_follower):
+        """Test that a stored entry resolves back to the match it recorded"""
+        script_follower.current_position = 3
+        match = script_follower.process_audio_text('yes')
+        history = script_follower.response_history
+        entry = history.entries[-1]
+        assert entry.node_id == 3 and entry.confidence == match['confidence']
+        response = history.recent()[0]
+        for key in ['type', 'question_number', 'question', 'matched_response', 'guidance', 'analogies', 'scripture', 'next_question']:
+            assert response[key] == match[key]
+
+    def test_repeated_responses_are_stored_once(self, script_follower):
+        """Test that many matches share interned responses and only the latest are resolved"""
+        for _ in range(300):
+            script_follower.current_position = 0
+            script_follower.process_audio_text('not sure')
+        history = script_follower.response_history
+        assert len(history) == 300
+        assert len(history.responses) == 1
+        assert len(history.recent(5)) == 5
+        script_follower.conversation_flow = list(script_follower.conversation_flow)
+        script_follower.current_position = 0
+        script_follower.process_audio_text('not sure')
+        assert len(history) == 1
+
+    def test_cloud_history_summary_lists_latest_oldest_first(self, script_follower):
+        """Test that the Cloud app's history line renders from the compact history"""
+        assert history_summary(script_follower.response_history) == ''
+        for position, text in [(0, 'not sure'), (1, 'yes'), (2, 'no'), (3, 'yes')]:
+            script_follower.current_position = position
+            script_follower.process_audio_text(text)
+        latest = script_follower.response_history.recent(3)
+        summary = history_summary(script_follower.response_history)
+        assert summary.split(' | ') == [f"Q{resp['question_number']}: {resp['matched_response']}" for resp in reversed(latest)]
@@ -0,0 +1,54 @@
+import pytest
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app_evangelism import EvangelismScriptFollower
+from response_rules import QuestionRules, ResponsePlan, rule
+
+RULES = [
+    QuestionRules('lie', ['told a lie'], [
+        rule('No', 2, ['They say they never lied.'], any_of=['no', 'never'], unless=['not sure']),
+        rule('Yes', 'Are you a liar?', ['They admit to lying.'], all_of=[['i'], ['lied', 'lie']], beliefs=['liar']),
+        rule('Not sure', 2, ['They are not sure.'], confidence=85)
+    ]),
+    QuestionRules('anything', ['lie'], [
+        rule('Yes', 3, ['Matched the second entry.'], any_of=['yes'])
+    ])
+]
+
+class TestResponseRules:
+    """Test suite for the declarative response rule plan"""
+
+    @pytest.fixture
+    def plan(self):
+        """Compile the small rule table"""
+        return ResponsePlan(RULES)
+
+    def test_first_firing_rule_wins(self, plan):
+        """Test priority, negations, conjunctions and the fallback rule"""
+        by_number = lambda number: f'Question {number}'
+        assert plan.evaluate('Have you told a lie?', 'never', by_number)['matched_response'] == 'No'
+        assert plan.evaluate('Have you told a lie?', 'not sure i lied', by_number)['matched_response'] == 'Yes'
+        result = plan.evaluate('Have you told a lie?', 'i lied', by_number)
+        assert result == {'matched_response': 'Yes', 'next_question': 'Are you a liar?',
+                          'guidance': ['They admit to lying.'], 'confidence': 90, 'beliefs': ['liar']}
+        fallback = plan.evaluate('Have you told a lie?', 'hmm', by_number)
+        assert fallback['next_question'] == 'Question 2' and fallback['confidence'] == 85
+
+    def test_questions_dispatch_in_table_order(self, plan):
+        """Test that the first entry whose phrase is in the question is used and results are fresh"""
+        by_number = lambda number: f'Question {number}'
+        assert plan.evaluate('Is that a lie?', 'yes', by_number)['next_question'] == 'Question 3'
+        assert plan.evaluate('Unknown question', 'yes', by_number) is None
+        first = plan.evaluate('Have you told a lie?', 'i lied', by_number)
+        first['beliefs'].append('changed')
+        assert plan.evaluate('Have you told a lie?', 'i lied', by_number)['beliefs'] == ['liar']
+
+    def test_follower_uses_rule_table(self):
+        """Test the basic follower's intelligent analysis through the rule table"""
+        follower = EvangelismScriptFollower()
+        result = follower.analyze_response_intelligence('I think I would be guilty', 'Would you be innocent or guilty?')
+        assert result['matched_response'] == 'Guilty'
+        assert result['next_question'] == follower.get_question_by_number(8)
+        assert follower.analyze_response_intelligence('maybe', 'Based on how you\'ve lived your life?') is None
@@ -0,0 +1,103 @@
+import pytest
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import mmap
+
+import numpy as np
+
+from app_optimized import SCRIPT_PARSER_VERSION, OptimizedScriptFollower
+from script_cache import ScriptCache, pack_strings, source_digest, unpack_strings
+from script_index import ScriptIndex, ScriptIndexBuilder
+
+SOURCE = b'%PDF stand-in bytes for the script'
+
+class TestScriptCache:
+    """Test suite for the compiled-script cache on disk"""
+
+    @pytest.fixture
+    def index(self):
+        """Build a small script index"""
+        builder = ScriptIndexBuilder()
+        builder.add_line('Hello, how are you today?', 'PERSON', 1, ['hello', 'today'])
+        builder.add_line("I'm doing well, thank you for asking.", 'RESPONSE', 2, ['doing', 'well', 'thank', 'asking'])
+        builder.add_line('Do you believe there is a God?', 'PERSON', 3, ['believe', 'god'])
+        return builder.build()
+
+    def test_index_round_trips_through_cache(self, index, tmp_path):
+        """Test that a cached index is restored with the same lines, arrays and search results"""
+        cache = ScriptCache(str(tmp_path))
+        assert cache.load('optimized', 1, SOURCE) is None
+        cache.store('optimized', 1, SOURCE, *index.to_payload())
+        restored = ScriptIndex.from_payload(*cache.load('optimized', 1, SOURCE))
+        assert restored.lines == index.lines and restored.content_hash == index.content_hash
+        assert np.array_equal(restored.suffix_array, index.suffix_array)
+        assert restored.vocabulary == index.vocabulary
+        assert list(restored.lines_containing('you')) == list(index.lines_containing('you'))
+        assert dict(restored.script_data) == dict(index.script_data)
+        assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+
+    def test_changed_source_or_parser_version_rebuilds(self, index, tmp_path):
+        """Test that a different source digest or parser version misses"""
+        cache = ScriptCache(str(tmp_path))
+        cache.store('optimized', 1, SOURCE, *index.to_payload())
+        assert cache.load('optimized', 1, SOURCE + b' edited') is None
+        assert cache.load('optimized', 2, SOURCE) is None
+        assert cache.load('smart', 1, SOURCE) is None
+
+    def test_unreadable_file_is_a_miss(self, tmp_path):
+        """Test that a corrupt cache file is ignored and counted"""
+        cache = ScriptCache(str(tmp_path))
+        cache.store('evangelism', 1, SOURCE, {'conversation_flow': [{'question': 'Q1'}]})
+        assert cache.load('evangelism', 1, SOURCE)[0]['conversation_flow'] == [{'question': 'Q1'}]
+        path = cache.path_for('evangelism', 1, source_digest(SOURCE))
+        with open(path, 'wb') as f:
+            f.write(b'not a compiled script')
+        assert cache.load('evangelism', 1, SOURCE) is None
+        assert cache.stats()['errors'] == 1
+
+    def test_unwritable_payload_is_ignored(self, tmp_path):
+        """Test that a payload the format cannot hold is logged and counted, leaving no file behind"""
+        cache = ScriptCache(str(tmp_path))
+        assert cache.store('optimized', 1, SOURCE, {'words': {'not', 'json'}}) is None
+        assert cache.store('optimized', 1, SOURCE, {}, {'lines': np.array(['a', None], dtype=object)}) is None
+        assert cache.stats()['errors'] == 2 and os.listdir(tmp_path) == []
+
+    def test_arrays_are_read_only_views_of_the_mapped_file(self, index, tmp_path):
+        """Test that loaded arrays and line ids share the file mapping instead of copying it"""
+        cache = ScriptCache(str(tmp_path))
+        cache.store('optimized', 1, SOURCE, *index.to_payload())
+        meta, arrays = cache.load('optimized', 1, SOURCE)
+        suffix_array = arrays['suffix_array']
+        assert not suffix_array.flags.writeable and not suffix_array.flags.owndata
+        base = suffix_array
+        while isinstance(base, np.ndarray):
+            base = base.base
+        assert isinstance(base.obj if isinstance(base, memoryview) else base, mmap.mmap)
+        restored = ScriptIndex.from_payload(meta, arrays)
+        assert restored.suffix_array is suffix_array
+        assert restored.lines[1].token_ids.readonly and list(restored.lines[1].token_ids) == list(index.lines[1].token_ids)
+        assert cache.stats()['bytes_mapped'] == os.path.getsize(cache.path_for('optimized', 1, source_digest(SOURCE)))
+
+    def test_string_tables_round_trip(self):
+        """Test that strings with multi-byte characters and empty strings survive packing"""
+        strings = ['héllo', '', 'naïve café', '\u2014 dash', 'plain']
+        assert unpack_strings(*pack_strings(strings)) == strings
+        assert unpack_strings(*pack_strings([])) == []
+
+    def test_unrestorable_entry_is_reparsed_and_overwritten(self, index, tmp_path):
+        """Test that arrays which pass the header check but cannot rebuild an index fall back to parsing"""
+        follower = OptimizedScriptFollower()
+        follower.script_cache = ScriptCache(str(tmp_path))
+        meta, arrays = index.to_payload()
+        del arrays['words']
+        follower.script_cache.store('optimized', SCRIPT_PARSER_VERSION, SOURCE, meta, arrays)
+        lines = ['PASTOR:', 'Do you believe there is a God?', '', 'PERSON:', 'Yes I do.', '']
+        script_data = follower.load_compiled_script(SOURCE, lambda: iter(lines))
+        assert list(script_data) == ['Do you believe there is a God?', 'Yes I do.']
+        stats = follower.script_cache.stats()
+        assert stats['errors'] == 1 and stats['hits'] == 0 and stats['misses'] == 1
+        restored = follower.load_compiled_script(SOURCE, lambda: iter(()))
+        assert list(restored) == list(script_data)
+        assert follower.script_cache.stats()['hits'] == 1
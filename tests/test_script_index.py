@@ -0,0 +1,218 @@
+import pytest
+import sys
+import os
+import re
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fuzzywuzzy import fuzz
+
+from app_optimized import OptimizedScriptFollower
+from script_index import ratio_upper_bounds
+
+SAMPLE_SCRIPT = """PASTOR:
+Hello, how are you today?
+PERSON:
+I'm doing well, thank you for asking.
+PASTOR:
+Do you believe there's a God?
+PERSON:
+Yes, I believe in God and heaven.
+PASTOR:
+Have you ever told a lie?
+"""
+
+class TestScriptIndex:
+    """Test suite for the script search index"""
+
+    @pytest.fixture
+    def script_follower(self):
+        """Create a script follower with a small parsed script"""
+        follower = OptimizedScriptFollower()
+        follower.script_data = follower.parse_script_text(SAMPLE_SCRIPT)
+        return follower
+
+    def test_term_index_posting_lists(self, script_follower):
+        """Test that posting lists hold ascending line ids for each search term"""
+        index = script_follower.get_search_index()
+        assert len(index) == len(script_follower.script_data)
+        god_lines = index.postings('god').tolist()
+        assert god_lines == sorted(god_lines)
+        assert [index.lines[i].text for i in god_lines] == [
+            "Do you believe there's a God?",
+            "Yes, I believe in God and heaven."
+        ]
+
+    def test_script_lines_are_compact_and_immutable(self, script_follower):
+        """Test that parsed lines are slotted records sharing one interned word table"""
+        index = script_follower.get_search_index()
+        line = index.lines[0]
+        assert not hasattr(line, '__dict__')
+        with pytest.raises(AttributeError):
+            line.text = 'changed'
+        assert line.lower == line.text.lower() and line.length == len(line.text)
+        assert [index.words[word_id] for word_id in line.token_ids] == ['hello', 'how', 'are', 'you', 'today']
+        assert sorted(index.search_terms(0)) == sorted(script_follower.create_search_terms(line.text))
+        assert index.words[index.word_ids['god']] is sys.intern('god')
+
+    def test_script_data_view_keeps_dict_access(self, script_follower):
+        """Test that the parsed script still reads like the old dict of dicts"""
+        script_data = script_follower.script_data
+        assert len(script_data) == 5
+        assert list(script_data) == [line.text for line in script_follower.get_search_index().lines]
+        data = script_data["Do you believe there's a God?"]
+        assert data['speaker'] == 'PASTOR'
+        assert data['response'] == "Do you believe there's a God?"
+        assert data['line_number'] == 6
+        assert set(data['speaker'] for data in script_data.values()) == {'PASTOR', 'PERSON'}
+        assert "Not in the script" not in script_data
+
+    def test_line_data_builds_search_terms_only_when_read(self, script_follower):
+        """Test that line data defers its search terms and the speakers come from the index"""
+        index = script_follower.get_search_index()
+        data = script_follower.script_data["Do you believe there's a God?"]
+        assert data.terms is None and data.get('keywords') is not None
+        assert sorted(data['search_terms']) == sorted(index.search_terms(data.line_id))
+        assert data['search_terms'] is data['search_terms']
+        assert dict(data) == data and set(data) == {'speaker', 'response', 'keywords', 'line_number', 'timestamp', 'search_terms'}
+        assert index.speakers == {'PASTOR', 'PERSON'}
+
+    def test_term_overlap_counts_from_bitsets(self, script_follower):
+        """Test that bitset overlap counts equal per-line term set intersections"""
+        index = script_follower.get_search_index()
+        spoken_words = {'believe', 'heaven', 'god', 'unknownword'}
+        counts = index.term_overlap_counts(spoken_words)
+        expected = [len(spoken_words.intersection(data['search_terms'])) for data in script_follower.script_data.values()]
+        assert counts.tolist() == expected
+        assert index.term_overlap_counts({'unknownword'}).tolist() == [0] * len(index)
+
+    def test_index_rebuilt_when_script_replaced(self, script_follower):
+        """Test that replacing script_data invalidates the index"""
+        index = script_follower.get_search_index()
+        assert script_follower.get_search_index() is index
+        script_follower.script_data = script_follower.create_sample_script()
+        assert script_follower.get_search_index() is not index
+        assert len(script_follower.get_search_index()) == 2
+
+    def test_word_overlap_pass_uses_index(self, script_follower):
+        """Test that the word-overlap pass picks the line sharing the most terms"""
+        script_follower.confidence_threshold = 30
+        match = script_follower.find_best_match_fast('believe heaven')
+        assert match[0] == "Yes, I believe in God and heaven."
+        assert script_follower.find_best_match_fast('zzz qqq') == (None, 0)
+
+    def test_lines_containing_matches_substring_scan(self, script_follower):
+        """Test that suffix array lookups agree with a substring scan"""
+        index = script_follower.get_search_index()
+        for phrase in ['you', 'believe', "there's a god", 'god?', 'e', 'heaven.', 'missing', 'lie?']:
+            expected = [i for i, line in enumerate(index.lines) if phrase in line.lower]
+            assert index.lines_containing(phrase) == expected
+
+    def test_substrings_never_span_lines(self, script_follower):
+        """Test that a phrase joining the end of one line and the start of the next is not found"""
+        index = script_follower.get_search_index()
+        assert index.lines_containing('today? i') == []
+        assert script_follower.find_best_match_fast('how are you')[0] == 'Hello, how are you today?'
+
+    def test_fuzzy_scores_match_fuzz_ratio(self, script_follower):
+        """Test that batched fuzzy scores equal per-line fuzz.ratio for each buffered phrase"""
+        index = script_follower.get_search_index()
+        phrases = ['do you believe in god', 'hello how are you', 'yes']
+        scores = index.fuzzy_scores(phrases)
+        assert scores.shape == (len(phrases), len(index))
+        for row, phrase in enumerate(phrases):
+            assert scores[row].tolist() == [fuzz.ratio(phrase, line.text.lower()) for line in index.lines]
+
+    def test_ratio_upper_bounds_never_below_score(self, script_follower):
+        """Test that the length-only bound is never lower than the real fuzz.ratio"""
+        index = script_follower.get_search_index()
+        for phrase in ['yes', 'do you believe', 'hello, how are you today? fine']:
+            bounds = ratio_upper_bounds(len(phrase), index.line_lengths)
+            assert (bounds >= index.fuzzy_scores(phrase)[0]).all()
+
+    def test_pruned_fuzzy_search_matches_full_scoring(self, script_follower):
+        """Test that pruned fuzzy search returns the same line and score as scoring every line"""
+        index = script_follower.get_search_index()
+        for phrase in ['do you believe in god', 'hello how are you', 'i told a lie', 'x']:
+            scores = index.fuzzy_scores(phrase)[0]
+            for min_score in [1, 40, 70, 100]:
+                best = int(scores.argmax())
+                expected = (best, int(scores[best])) if scores[best] >= min_score else (None, 0)
+                assert index.best_fuzzy_line(phrase, min_score) == expected
+
+    def test_top_fuzzy_lines_match_full_ranking(self, script_follower):
+        """Test that heap-selected fuzzy candidates equal sorting every line's score"""
+        index = script_follower.get_search_index()
+        for phrase in ['do you believe in god', 'hello how are you', 'i told a lie']:
+            scores = index.fuzzy_scores(phrase)[0]
+            for k, min_score in [(2, 1), (3, 40), (5, 0)]:
+                ranked = sorted(range(len(index)), key=lambda line_id: (-scores[line_id], line_id))
+                expected = [(i, int(scores[i])) for i in ranked if scores[i] >= min_score][:k]
+                assert index.top_fuzzy_lines(phrase, k, min_score) == expected
+
+    def test_find_top_k_ranks_runner_ups(self, script_follower):
+        """Test that top-k candidates are ranked, carry per-pass scores and lead with the single best match"""
+        script_follower.confidence_threshold = 30
+        candidates = script_follower.find_top_k('believe god heaven', k=3)
+        assert candidates[0]['line'] == script_follower.find_best_match_fast('believe god heaven')[0]
+        assert candidates[0]['line'] == "Yes, I believe in God and heaven."
+        assert candidates[0]['pass'] == 'word_overlap'
+        assert candidates[0]['pass_scores']['word_overlap'] == 45
+        assert candidates[1]['line'] == "Do you believe there's a God?"
+        scores = [candidate['score'] for candidate in candidates]
+        assert scores == sorted(scores, reverse=True)
+        assert all(candidate['score'] >= 30 for candidate in candidates)
+        assert script_follower.find_top_k('zzz qqq', k=3) == []
+
+    def test_timed_match_with_ample_budget_is_complete(self, script_follower):
+        """Test that a generous budget gives the full cascade's answer with per-pass timings"""
+        result = script_follower.find_best_match_timed('believe in god and heaven', budget=5)
+        assert result['match'] == script_follower.find_best_match_fast('believe in god and heaven')
+        assert result['partial'] is False
+        assert set(result['pass_timings_ms']) == {'substring'}
+        assert script_follower.match_timings[-1] is result
+
+    def test_timed_match_out_of_budget_is_partial(self, script_follower):
+        """Test that an exhausted budget returns the best result so far, flagged and not cached"""
+        result = script_follower.find_best_match_timed('believe heaven zzz', budget=0)
+        assert result['partial'] is True
+        assert result['cut_passes'] == ['word_overlap', 'fuzzy']
+        assert result['match'] == (None, 0)
+        assert len(script_follower.match_cache) == 0
+        script_follower.confidence_threshold = 30
+        assert script_follower.find_best_match_timed('believe heaven zzz', budget=5)['match'][0] == "Yes, I believe in God and heaven."
+
+    def test_process_audio_text_queues_timed_match(self, script_follower):
+        """Test that the live listener path queues the line matched within its budget"""
+        script_follower.response_delay = 5
+        script_follower.process_audio_text('Do you believe')
+        result = script_follower.results_queue.get_nowait()
+        assert result['matched_line'] == "Do you believe there's a God?"
+        assert result['confidence'] == 95
+        assert not script_follower.phrase_buffer
+
+    def test_incremental_phrase_state_matches_rejoined_phrase(self, script_follower):
+        """Test that the phrase buffer state equals matching the re-joined buffer from scratch"""
+        index = script_follower.get_search_index()
+        matcher = script_follower.phrase_matcher
+        for utterance in ['do you', 'believe', "there's a god?", 'yes', 'heaven', 'hello', 'lie']:
+            matcher.append(utterance, index)
+            phrase = ' '.join(script_follower.phrase_buffer)
+            assert matcher.phrase == phrase
+            assert matcher.containing_lines == index.lines_containing(phrase.lower())
+            words = set(re.findall(r'\b\w+\b', phrase.lower()))
+            assert matcher.term_overlap_counts().tolist() == index.term_overlap_counts(words).tolist()
+        assert len(script_follower.phrase_buffer) == script_follower.phrase_buffer.maxlen
+
+    def test_clearing_phrase_buffer_resets_state(self, script_follower):
+        """Test that clearing after a match empties the buffer and its per-line state"""
+        matcher = script_follower.phrase_matcher
+        matcher.append('Do you believe', script_follower.get_search_index())
+        matcher.clear()
+        assert not script_follower.phrase_buffer
+        assert matcher.phrase == ''
+        assert matcher.word_counts == {}
+        matcher.append('heaven', script_follower.get_search_index())
+        assert matcher.term_overlap_counts().tolist() == [0, 0, 0, 1, 0]
+
+if __name__ == "__main__":
+    pytest.main([__file__])
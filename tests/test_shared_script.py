@@ -0,0 +1,57 @@
+import pytest
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from app_evangelism import EvangelismScriptFollower
+from app_optimized import OptimizedScriptFollower
+from shared_script import SharedScript
+
+class TestSharedScript:
+    """Test suite for the process-wide shared script"""
+
+    @pytest.fixture
+    def shared(self):
+        """Load the evangelism script once"""
+        return SharedScript.of(EvangelismScriptFollower())
+
+    def test_sessions_share_flow_and_graph(self, shared):
+        """Test that followers built on a shared script reuse its flow, graph and hash"""
+        first = EvangelismScriptFollower(shared)
+        second = EvangelismScriptFollower(shared)
+        assert first.conversation_flow is second.conversation_flow is shared.conversation_flow
+        assert first.get_conversation_graph() is second.get_conversation_graph() is shared.conversation_graph
+        assert first.flow_version.of(first.conversation_flow) == shared.flow_hash
+        assert first.flow_version is not second.flow_version
+
+    def test_session_state_stays_private(self, shared):
+        """Test that position and history of one session do not leak into another"""
+        first = EvangelismScriptFollower(shared)
+        second = EvangelismScriptFollower(shared)
+        first.process_audio_text('not sure')
+        assert first.current_position != second.current_position
+        assert len(first.response_history) == 1 and len(second.response_history) == 0
+        first.conversation_flow = list(first.conversation_flow)
+        assert second.get_conversation_graph() is shared.conversation_graph
+
+    def test_optimized_sessions_share_search_index(self):
+        """Test that indexed followers share the script data and its search index"""
+        shared = SharedScript.of(OptimizedScriptFollower())
+        first = OptimizedScriptFollower(shared)
+        second = OptimizedScriptFollower(shared)
+        assert first.get_search_index() is second.get_search_index() is shared.search_index
+        assert first.script_data is shared.script_data
+
+    def test_phrase_state_does_not_grow_with_the_script(self):
+        """Test that a session's phrase buffer state holds words, not per-line arrays"""
+        shared = SharedScript.of(OptimizedScriptFollower())
+        follower = OptimizedScriptFollower(shared)
+        index = follower.get_search_index()
+        for utterance in ['do you believe', 'in god', 'today']:
+            follower.phrase_matcher.append(utterance, index)
+        state = vars(follower.phrase_matcher)
+        assert not any(isinstance(value, np.ndarray) for value in state.values())
+        expected = index.term_overlap_counts(set(follower.phrase_matcher.word_counts))
+        assert np.array_equal(follower.phrase_matcher.term_overlap_counts(), expected)
@@ -0,0 +1,119 @@
+import pytest
+import sys
+import os
+import threading
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app_evangelism import EvangelismScriptFollower
+from app_evangelism_enhanced import EnhancedEvangelismScriptFollower
+from conversation_graph import ConversationGraph
+from speculation import candidate_ids
+
+FLOW = [
+    {'question': '1. What happens after we die?', 'question_number': 1,
+     'guidance': ['If they are not sure, skip question 2.'], 'next_questions': [2]},
+    {'question': "2. Do you believe there's a God?", 'question_number': 2,
+     'guidance': ['Proceed to Q4 when they agree.']},
+    {'question': '3. Use the building analogy', 'question_number': 3, 'guidance': []},
+    {'question': '4. Have you ever told a lie?', 'question_number': 4, 'guidance': ['Go to Q2 if unsure.']},
+]
+
+class TestSpeculation:
+    """Test suite for speculative warming of the likely next questions"""
+
+    @pytest.fixture
+    def script_follower(self):
+        """Create a basic script follower"""
+        return EvangelismScriptFollower()
+
+    def test_candidates_follow_graph_edges(self):
+        """Test that candidates are the current question, then the answered question's successors"""
+        graph = ConversationGraph(FLOW)
+        assert candidate_ids(graph, 1, answered_id=0) == [1, 2]
+        assert candidate_ids(graph, 3) == [3, 1]
+        assert candidate_ids(graph, 2, answered_id=1) == [2, 3]
+
+    def test_next_scripted_answer_comes_from_warm_cache(self, script_follower):
+        """Test that after a match the next question's scripted answers are already cached"""
+        plain_follower = EvangelismScriptFollower()
+        plain_follower.speculation.schedule = lambda answered_id=None: None
+        for follower in (script_follower, plain_follower):
+            follower.process_audio_text('not sure')
+        script_follower.speculation.wait()
+        assert script_follower.speculation.stats()['nodes_warmed'] > 0
+        answer = script_follower.conversation_flow[script_follower.current_position]['responses'][0]
+        match = script_follower.process_audio_text(answer)
+        expected = plain_follower.process_audio_text(answer)
+        assert script_follower.speculation.hits == 1
+        assert match['guidance'] == expected['guidance']
+        assert script_follower.current_position == plain_follower.current_position
+
+    def test_new_utterance_cancels_warming(self, script_follower):
+        """Test that a run superseded by a newer utterance stops before storing anything more"""
+        speculation = script_follower.speculation
+        generation = speculation.generation
+        speculation.cancel()
+        speculation.warm(generation, [0, 1])
+        assert speculation.cancelled == 1 and speculation.nodes_warmed == 0
+
+    def test_run_superseded_mid_match_adds_no_keys(self, script_follower):
+        """Test that keys from a run rescheduled while it was matching never reach the new run's set"""
+        speculation = script_follower.speculation
+        speculation.background = False
+        warm_match = script_follower.warm_match
+
+        def rescheduling_warm_match(spoken_text, node_id, generation):
+            result = warm_match(spoken_text, node_id, generation)
+            speculation.cancel()
+            speculation.keys = set()
+            return result
+
+        script_follower.warm_match = rescheduling_warm_match
+        speculation.warm(speculation.generation, [0])
+        assert speculation.keys == set() and speculation.cancelled == 1
+
+    def test_warming_matches_without_holding_the_match_lock(self, script_follower):
+        """Test that the match runs unlocked and a result superseded meanwhile is not stored"""
+        speculation = script_follower.speculation
+        preview_follower = script_follower.preview_follower
+        locked_during_match = []
+
+        def recording_preview_follower(position):
+            preview = preview_follower(position)
+            compute_best_match = preview.compute_best_match
+
+            def recording_compute_best_match(utterance):
+                # The lock is reentrant, so probe it from another thread
+                free = []
+
+                def probe():
+                    free.append(script_follower.match_lock.acquire(blocking=False))
+                    if free[0]:
+                        script_follower.match_lock.release()
+
+                prober = threading.Thread(target=probe)
+                prober.start()
+                prober.join()
+                locked_during_match.append(not free[0])
+                speculation.cancel()
+                return compute_best_match(utterance)
+
+            preview.compute_best_match = recording_compute_best_match
+            return preview
+
+        script_follower.preview_follower = recording_preview_follower
+        generation = speculation.generation
+        assert script_follower.warm_match('yes', 0, generation) == (None, False)
+        assert locked_during_match == [False]
+        assert len(script_follower.match_cache.entries) == 0
+
+    def test_enhanced_preview_leaves_follower_untouched(self):
+        """Test that warming matches on a copy, keeping position, context and lookup stats"""
+        follower = EnhancedEvangelismScriptFollower()
+        follower.current_position = 2
+        context = dict(follower.conversation_context)
+        match, position = follower.preview_match('yes', 0)
+        assert match is not None and position == follower.get_conversation_graph().first_match(match['next_question'])
+        assert follower.current_position == 2
+        assert follower.conversation_context == context
+        assert follower.question_window_stats.stats()['lookups'] == 0
@@ -0,0 +1,32 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app_evangelism_enhanced import EnhancedEvangelismScriptFollower, RESPONSE_VARIANT_KEYWORDS
+from utterance import Utterance
+
+class TestUtterance:
+    """Test suite for the shared per-utterance normalization"""
+
+    def test_forms_computed_from_one_lowercase(self):
+        """Test the lowercased text, tokens, contraction-free form and n-grams"""
+        utterance = Utterance("I Don't know, maybe God")
+        assert utterance.lower == "i don't know, maybe god"
+        assert utterance.tokens == ['i', 'don', 't', 'know', 'maybe', 'god']
+        assert 'god' in utterance.token_set
+        assert utterance.normalized == 'i dont know, maybe god'
+        assert utterance.normalized_tokens == ['i', 'dont', 'know', 'maybe', 'god']
+        assert utterance.ngrams(2)[:2] == ['i don', 'don t']
+        assert "don't know" in utterance
+        assert Utterance.of(utterance) is utterance
+
+    def test_keyword_scan_shared_between_stages(self, monkeypatch):
+        """Test that stages sharing an automaton reuse one scan of the utterance"""
+        scans = []
+        original = RESPONSE_VARIANT_KEYWORDS.groups_in
+        monkeypatch.setattr(RESPONSE_VARIANT_KEYWORDS, 'groups_in', lambda text: scans.append(text) or original(text))
+        follower = EnhancedEvangelismScriptFollower()
+        utterance = Utterance('Yeah I think so')
+        assert follower.match_response_pattern(utterance, 'yes')
+        assert not follower.match_response_pattern(utterance, 'no')
+        assert scans == ['yeah i think so']
@@ -0,0 +1,85 @@
+"""One spoken utterance, normalized once and shared by every matching stage"""
+import re
+
+from script_index import WORD_TOKEN
+
+# Apostrophes dropped when normalizing contractions ("don't" -> "dont")
+APOSTROPHES = re.compile(r"['’]")
+
+
+class Utterance:
+    """Lowercased text of an utterance with its tokens, contraction-free form and n-grams
+
+    Derived forms are computed on first use and kept, so stages that need
+    the same form share the work. Keyword automaton scans are memoized too.
+    """
+    __slots__ = ('text', 'lower', '_tokens', '_token_set', '_normalized', '_normalized_tokens', '_ngrams', '_groups')
+
+    def __init__(self, text):
+        self.text = text
+        self.lower = text.lower()
+        self._tokens = None
+        self._token_set = None
+        self._normalized = None
+        self._normalized_tokens = None
+        self._ngrams = {}
+        self._groups = {}
+
+    @classmethod
+    def of(cls, text):
+        """Return text unchanged if it already is an Utterance, else wrap it"""
+        return text if isinstance(text, cls) else cls(text)
+
+    def __str__(self):
+        return self.text
+
+    def __repr__(self):
+        return f'Utterance({self.text!r})'
+
+    def __contains__(self, phrase):
+        return phrase in self.lower
+
+    @property
+    def tokens(self):
+        """Lowercased word tokens in order"""
+        if self._tokens is None:
+            self._tokens = WORD_TOKEN.findall(self.lower)
+        return self._tokens
+
+    @property
+    def token_set(self):
+        """Distinct lowercased word tokens"""
+        if self._token_set is None:
+            self._token_set = frozenset(self.tokens)
+        return self._token_set
+
+    @property
+    def normalized(self):
+        """Lowercased text with contractions closed up ("don't" and "dont" both read "dont")"""
+        if self._normalized is None:
+            self._normalized = APOSTROPHES.sub('', self.lower)
+        return self._normalized
+
+    @property
+    def normalized_tokens(self):
+        """Word tokens of the contraction-normalized text"""
+        if self._normalized_tokens is None:
+            self._normalized_tokens = WORD_TOKEN.findall(self.normalized)
+        return self._normalized_tokens
+
+    def ngrams(self, n):
+        """Space-joined runs of n consecutive tokens"""
+        if n not in self._ngrams:
+            tokens = self.tokens
+            self._ngrams[n] = [' '.join(tokens[i:i + n]) for i in range(len(tokens) - n + 1)]
+        return self._ngrams[n]
+
+    def groups_in(self, automaton):
+        """Keyword groups of automaton found in the lowercased text, scanned once per automaton"""
+        try:
+            return self._groups[id(automaton)][1]
+        except KeyError:
+            groups = automaton.groups_in(self.lower)
+            # Hold the automaton so its id cannot be reused while cached
+            self._groups[id(automaton)] = (automaton, groups)
+            return groups